@@ -1,7 +1,20 @@
 import re
+import sys
+import asyncio
+import csv
+import json
+import codecs
+import heapq
 import logging
-from typing import Dict, Optional, Tuple
+import threading
+from array import array
+from functools import lru_cache
+from itertools import chain, islice
+from operator import attrgetter, itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, AnyStr, AsyncIterator, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
 
 logger = logging.getLogger(__name__)
 
@@ -36,56 +49,497 @@ class ProviderError(ParseError):
     def __init__(self, message: str = "Provider error occurred"):
         super().__init__("provider_error", message)
 
+class CircuitOpenError(ParseError):
+    def __init__(self, message: str = "Provider unavailable"):
+        super().__init__("circuit_open", message)
+
+class RequestCancelledError(ParseError):
+    def __init__(self, message: str = "Request cancelled"):
+        super().__init__("cancelled", message)
+
+class DeadlineExceededError(RequestCancelledError):
+    def __init__(self, message: str = "Deadline exceeded"):
+        ParseError.__init__(self, "deadline_exceeded", message)
+
+class CodeFormat(NamedTuple):
+    """A taokouling delimiter format"""
+    family: str
+    opener: str
+    closer: str
+    
+    def pattern(self, max_code_length: int) -> str:
+        """Regex source capturing a code of at most max_code_length characters"""
+        opener, closer = re.escape(self.opener), re.escape(self.closer)
+        return f'{opener}([^{closer}]{{1,{max_code_length}}}){closer}'
+
+class FormatRegistry:
+    """Process-wide, copy-on-write set of taokouling formats
+    
+    The registered formats are an immutable tuple that registration replaces
+    rather than mutates, so parsers read it without locking. Each format's
+    pattern is compiled once and cached, so registering a format leaves the
+    others compiled.
+    """
+    
+    def __init__(self, formats: Iterable[Tuple[str, str, str]] = ()):
+        self._lock = threading.Lock()
+        self._formats: Tuple[CodeFormat, ...] = ()
+        for family, opener, closer in formats:
+            self.register(family, opener, closer)
+    
+    @property
+    def formats(self) -> Tuple[CodeFormat, ...]:
+        return self._formats
+    
+    def register(self, family: str, opener: str, closer: Optional[str] = None) -> CodeFormat:
+        """Register a delimiter format; the closer defaults to the opener"""
+        closer = opener if closer is None else closer
+        if not family or not opener:
+            raise ValueError("Format needs a family name and an opening delimiter")
+        if len(closer) != 1:
+            raise ValueError(f"Closing delimiter must be a single character: {closer!r}")
+        
+        code_format = CodeFormat(family, opener, closer)
+        with self._lock:
+            if any(f.family == family for f in self._formats):
+                raise ValueError(f"Format family already registered: {family}")
+            self._formats = self._formats + (code_format,)
+        
+        logger.debug(f"Registered taokouling format {family}: {opener}xxx{closer}")
+        return code_format
+
+FORMAT_REGISTRY = FormatRegistry([
+    ('yuan', '￥', '￥'),     # ￥xxx￥ format
+    ('euro', '€', '€'),      # €xxx€ format
+    ('pound', '₤', '₤'),     # ₤xxx₤ format
+    ('glottal', 'ɂ', 'ɂ'),   # ɂxxxɂ format
+    ('slash', '9/', '/'),    # 9/xxx/ format
+])
+
+@lru_cache(maxsize=None)
+def _compile_format(code_format: CodeFormat, max_code_length: int) -> re.Pattern:
+    """Compile one format's pattern; group 1 captures the code
+    
+    Formats are scanned one at a time: a pattern starting with a literal
+    gets a fast prefix search, while an alternation of all formats checks
+    every character against each opener and scans about half as fast as
+    five separate passes. Every match attempt reads at most max_code_length
+    plus the delimiter lengths, so a scan is linear in the text length
+    whatever the input looks like.
+    """
+    return re.compile(code_format.pattern(max_code_length))
+
+# Look-alike delimiters folded onto the registered ones before matching. Each
+# fold is one character for one character, so match spans still index the
+# original text.
+DELIMITER_FOLDS = {
+    '¥': '￥',   # yen sign
+    '￡': '₤',   # fullwidth pound sign
+    '£': '₤',    # pound sign
+    '９': '9',   # fullwidth digit nine
+    '／': '/',   # fullwidth solidus
+}
+
+# Zero-width and soft-hyphen characters pasted into shared text; removed
+# before matching so they can neither split a delimiter nor pad a code
+INVISIBLE_CHARS = '\u00ad\u180e\u200b\u200c\u200d\u2060\ufeff'
+
+# Applied to every extracted code: fullwidth ASCII to ASCII, ideographic
+# space to space, and invisible characters removed
+CODE_NORMALIZATION = str.maketrans({
+    **{chr(c): chr(c - 0xFEE0) for c in range(0xFF01, 0xFF5F)},
+    '\u3000': ' ',
+    **dict.fromkeys(INVISIBLE_CHARS),
+})
+
+_CODE_RE = re.compile(r'[a-zA-Z0-9\-_]+')
+
+def fold_delimiters(text: str) -> str:
+    """Replace look-alike delimiter characters with the canonical ones"""
+    # Every look-alike is non-ASCII, and isascii() is a flag check
+    if text.isascii():
+        return text
+    # Substring probes and replace run at memchr speed, where translate
+    # costs over 100 ns per character on non-ASCII text
+    for confusable, canonical in DELIMITER_FOLDS.items():
+        if confusable in text:
+            text = text.replace(confusable, canonical)
+    return text
+
+def strip_invisible(text: str) -> str:
+    """Remove INVISIBLE_CHARS from text"""
+    # Every invisible character is non-ASCII, so plain ASCII text is untouched
+    if text.isascii():
+        return text
+    for char in INVISIBLE_CHARS:
+        if char in text:
+            text = text.replace(char, '')
+    return text
+
+def normalize_codes(codes: Iterable[str]) -> list[str]:
+    """Apply CODE_NORMALIZATION to codes that are not plain ASCII"""
+    codes = list(codes)
+    # Codes are nearly always plain ASCII, so one check over all of them
+    # usually saves the per-code pass
+    if ''.join(codes).isascii():
+        return codes
+    return [code if code.isascii() else code.translate(CODE_NORMALIZATION) for code in codes]
+
+# Taobao/Tmall item references: the start of a URL, an id= / item_id=
+# query parameter, which belongs to the URL before it, or a bare id=
+# parameter pasted on its own. No branch scans ahead for a later match, so
+# one pass over the text stays linear.
+_ITEM_REF_RE = re.compile(
+    r'https?://(?P<host>[^\s/?#]+)'
+    r'|(?:(?P<query>[?&])|(?<![\w&?=/.]))(?:item_?id|id)=(?P<id>\d{6,20})(?!\d)'
+)
+_ITEM_HOSTS = ('taobao.com', 'tmall.com', 'tmall.hk')
+_SPACE_RE = re.compile(r'\s')
+
+# Share texts carry the item title in corner brackets: 「title」
+_TITLE_RE = re.compile(r'「([^」\n]{1,200})」')
+
+# Provider name of results built from the text itself, without any API call
+LOCAL_PROVIDER = "Local"
+
+def _is_item_host(host: str) -> bool:
+    try:
+        host = urlsplit('//' + host).hostname or ''
+    except ValueError:
+        return False
+    return any(host == item_host or host.endswith('.' + item_host) for item_host in _ITEM_HOSTS)
+
+def _read_chunks(stream: IO, chunk_size: int) -> Iterator[AnyStr]:
+    """Read a file object in chunks until EOF"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+class CodeMatch(NamedTuple):
+    """A taokouling code located in text"""
+    code: str
+    family: str
+    start: int
+    end: int
+
+class LocalResolution(NamedTuple):
+    """Split of a text into codes that still need a provider and local results"""
+    codes: list[str]  # codes a provider still has to resolve
+    results: list['ParseResult']  # results built from item references in the text
+    resolved_codes: list[str]  # codes answered by those results
+
+class BatchExtraction:
+    """Per-text codes and aggregate counts from TaokoulingParser.extract_codes_many"""
+    
+    def __init__(self, codes: list[list[str]], skipped: int):
+        self.codes = codes  # aligned with the input texts
+        self.skipped = skipped  # texts rejected by the delimiter prefilter
+        self.total_texts = len(codes)
+        self.texts_with_codes = sum(1 for text_codes in codes if text_codes)
+        self.total_codes = sum(map(len, codes))
+        self.unique_codes = len(set().union(*codes))
+    
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'total_texts': self.total_texts,
+            'texts_with_codes': self.texts_with_codes,
+            'skipped': self.skipped,
+            'total_codes': self.total_codes,
+            'unique_codes': self.unique_codes
+        }
+
 class TaokoulingParser:
     """Parser for extracting taokouling codes"""
     
-    # Strict regex patterns for taokouling formats
-    PATTERNS = [
-        r'￥([^￥]+)￥',  # ￥xxx￥ format
-        r'€([^€]+)€',    # €xxx€ format  
-        r'₤([^₤]+)₤',    # ₤xxx₤ format
-        r'ɂ([^ɂ]+)ɂ',    # ɂxxxɂ format
-        r'9/([^/]+)/',   # 9/xxx/ format
-    ]
+    # Real codes are about a dozen characters; anything longer is not a code
+    MAX_CODE_LENGTH = 64
     
-    def __init__(self):
-        self.compiled_patterns = [re.compile(pattern) for pattern in self.PATTERNS]
+    def __init__(self, max_code_length: int = MAX_CODE_LENGTH, registry: Optional[FormatRegistry] = None):
+        if max_code_length < 1:
+            raise ValueError("max_code_length must be positive")
+        self.max_code_length = max_code_length
+        self.registry = registry if registry is not None else FORMAT_REGISTRY
+        # Compiled on first use, so construction does no regex work
+        self._patterns: Dict[CodeFormat, re.Pattern] = {}
+        # The registry's formats with the probe character of each, rebuilt
+        # when registration replaces the formats tuple
+        self._probes: Tuple[Tuple[CodeFormat, ...], List[Tuple[str, CodeFormat]]] = ((), [])
+    
+    def _pattern(self, code_format: CodeFormat) -> re.Pattern:
+        pattern = self._patterns.get(code_format)
+        if pattern is None:
+            pattern = self._patterns[code_format] = _compile_format(code_format, self.max_code_length)
+        return pattern
+    
+    def _format_probes(self) -> List[Tuple[str, CodeFormat]]:
+        """Get each registered format with the character probed for it"""
+        # A one-character probe is far cheaper than a regex scan, and most
+        # texts contain no more than one delimiter family. Longer openers take
+        # about as long to probe as to scan for, so their closer is probed.
+        formats, probes = self._probes
+        if formats is not self.registry.formats:
+            formats = self.registry.formats
+            probes = [(f.opener if len(f.opener) == 1 else f.closer, f) for f in formats]
+            self._probes = (formats, probes)
+        return probes
+    
+    def _scanners(self, text: str) -> List[Tuple[CodeFormat, re.Pattern]]:
+        """Get the compiled patterns of the formats that may occur in text"""
+        return [(f, self._pattern(f)) for probe, f in self._format_probes() if probe in text]
+    
+    def _iter_matches(self, text: str, offset: int = 0) -> Iterator[CodeMatch]:
+        """Yield matches in text order with spans shifted by offset"""
+        text = fold_delimiters(text)
+        # Removing invisible characters never adds a delimiter, so the
+        # probes hold for the stripped text, and text no format may occur
+        # in skips the strip
+        scanners = self._scanners(text)
+        stripped = strip_invisible(text) if scanners else text
+        # Spans index the text as given, so positions in the stripped text
+        # are mapped back when any invisible character was removed
+        positions = None
+        if stripped is not text:
+            positions = [i for i, char in enumerate(text) if char not in INVISIBLE_CHARS]
+            text = stripped
+        
+        def scan(code_format: CodeFormat, pattern: re.Pattern) -> Iterator[CodeMatch]:
+            for m in pattern.finditer(text):
+                code = m.group(1)
+                if not code.isascii():
+                    code = code.translate(CODE_NORMALIZATION)
+                start, end = m.span()
+                if positions is not None:
+                    start, end = positions[start], positions[end - 1] + 1
+                yield CodeMatch(code, code_format.family, offset + start, offset + end)
+        
+        # Each format's matches come in text order, so merging them by start keeps it
+        yield from heapq.merge(*(scan(f, pattern) for f, pattern in scanners),
+                               key=attrgetter('start'))
+    
+    def extract_matches(self, text: str) -> list[CodeMatch]:
+        """Extract every taokouling occurrence from text with its family and span"""
+        if not text:
+            return []
+        
+        return list(self._iter_matches(text))
+    
+    def extract_codes_iter(self, source: Union[IO, Iterable[AnyStr]],
+                           chunk_size: int = 64 * 1024,
+                           encoding: str = 'utf-8') -> Iterator[CodeMatch]:
+        """Yield taokouling occurrences from a file object or an iterable of chunks
+        
+        Chunks may be str or bytes; bytes are decoded incrementally with
+        `encoding`. Matches are yielded in text order as soon as they are
+        final, with spans as character offsets into the whole stream. Every
+        occurrence is yielded (no de-duplication), and only a window of about
+        two maximum-length matches is carried between chunks, so memory stays
+        bounded by chunk_size whatever the input size.
+        """
+        if isinstance(source, (str, bytes)):
+            chunks = iter((source,))
+        elif hasattr(source, 'read'):
+            chunks = _read_chunks(source, chunk_size)
+        else:
+            chunks = iter(source)
+        
+        # Longest possible match: opener + code + one-character closer
+        window = self.max_code_length + max((len(f.opener) for f in self.registry.formats), default=0) + 1
+        decoder = None
+        buffer = ''
+        offset = 0  # stream position of buffer[0]
+        
+        for chunk in chunks:
+            if isinstance(chunk, bytes):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                chunk = decoder.decode(chunk)
+            if not chunk:
+                continue
+            
+            buffer += chunk
+            # A match ending at or before safe_end cannot change with more
+            # input, and no match can start before it and still be open
+            safe_end = len(buffer) - window
+            resume = 0
+            for match in self._iter_matches(buffer):
+                if match.end > safe_end:
+                    resume = max(resume, min(match.start, safe_end))
+                    break
+                yield match._replace(start=offset + match.start, end=offset + match.end)
+                resume = match.end
+            else:
+                resume = max(resume, safe_end)
+            
+            buffer = buffer[resume:]
+            offset += resume
+        
+        if decoder is not None:
+            buffer += decoder.decode(b'', final=True)
+        yield from self._iter_matches(buffer, offset)
+    
+    def _extract_codes(self, text: str) -> list[str]:
+        """Extract unique codes from non-empty text in first-seen order"""
+        text = fold_delimiters(text)
+        probed = [code_format for probe, code_format in self._format_probes() if probe in text]
+        if not probed:
+            return []
+        
+        # Removing invisible characters never adds a delimiter, so the probes still hold
+        text = strip_invisible(text)
+        found = []
+        for code_format in probed:
+            pattern = self._pattern(code_format)
+            first = pattern.search(text)
+            if first is not None:
+                found.append((pattern, first.start()))
+        
+        if not found:
+            return []
+        if len(found) == 1:
+            # The scan resumes from the first match, so the search costs nothing extra
+            pattern, start = found[0]
+            codes = pattern.findall(text, start)
+        else:
+            # Families may interleave, so merge their matches by position
+            matches = list(chain.from_iterable(pattern.finditer(text, start) for pattern, start in found))
+            matches.sort(key=re.Match.start)
+            codes = map(itemgetter(1), matches)
+        
+        # Remove duplicates while preserving first-seen order
+        return list(dict.fromkeys(normalize_codes(codes)))
     
     def extract_codes(self, text: str) -> list[str]:
         """Extract all taokouling codes from text"""
         if not text:
             return []
         
-        codes = []
-        for pattern in self.compiled_patterns:
-            matches = pattern.findall(text)
-            codes.extend(matches)
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_codes = []
-        for code in codes:
-            if code not in seen:
-                seen.add(code)
-                unique_codes.append(code)
+        unique_codes = self._extract_codes(text)
         
         logger.debug(f"Extracted {len(unique_codes)} codes from text")
         return unique_codes
     
+    def extract_codes_many(self, texts: Iterable[str]) -> 'BatchExtraction':
+        """Extract codes from many texts in one call
+        
+        Texts containing none of the opening delimiters (or their look-alikes)
+        are skipped before any regex work, which is most of them in a typical
+        message stream. An invisible character may split an opener, so texts
+        containing one are never skipped.
+        """
+        openers = tuple(f.opener for f in self.registry.formats) + tuple(DELIMITER_FOLDS) + tuple(INVISIBLE_CHARS)
+        results = []
+        skipped = 0
+        
+        for text in texts:
+            if text:
+                for opener in openers:
+                    if opener in text:
+                        results.append(self._extract_codes(text))
+                        break
+                else:
+                    results.append([])
+                    skipped += 1
+            else:
+                results.append([])
+                skipped += 1
+        
+        batch = BatchExtraction(results, skipped)
+        logger.debug(f"Extracted {batch.total_codes} codes from {batch.total_texts} texts "
+                     f"({batch.skipped} skipped by prefilter)")
+        return batch
+    
+    def extract_items(self, text: str) -> list['ParseResult']:
+        """Build results for Taobao/Tmall item URLs and ids found in text
+        
+        Results carry the LOCAL_PROVIDER name, a canonical item URL and, for
+        a single item, the 「title」 of the share text when there is one.
+        """
+        if not text or 'id=' not in text:
+            return []
+        
+        items = {}
+        url_host, url_end = None, 0
+        for m in _ITEM_REF_RE.finditer(text):
+            if m.group('host') is not None:
+                url_host, url_end = m.group('host'), m.end()
+                continue
+            if m.group('query') is None:
+                host = ''
+            else:
+                # A query parameter counts only as the first one of a URL
+                # earlier in the same run of non-whitespace text
+                host, url_host = url_host, None
+                if host is None or _SPACE_RE.search(text, url_end, m.start()):
+                    continue
+                if not _is_item_host(host):
+                    continue
+            item_id = m.group('id')
+            if item_id not in items:
+                items[item_id] = host
+        if not items:
+            return []
+        
+        # A title is only attributable when the text names a single item
+        title_match = _TITLE_RE.search(text) if len(items) == 1 else None
+        title = title_match.group(1).strip() if title_match else ''
+        
+        results = []
+        for item_id, host in items.items():
+            if 'tmall' in host.lower():
+                item_url = f"https://detail.tmall.com/item.htm?id={item_id}"
+            else:
+                item_url = f"https://item.taobao.com/item.htm?id={item_id}"
+            results.append(ParseResult(item_id, item_url, title, LOCAL_PROVIDER))
+        return results
+    
+    def resolve_local(self, text: str) -> LocalResolution:
+        """Resolve what the text already identifies and leave the rest to a provider
+        
+        Item references found in the text become local results. A lone code
+        next to a lone item is answered by it; with more of either, which
+        item a code points to is unknown, so all codes are returned for a
+        provider to resolve.
+        """
+        codes = self.extract_codes(text)
+        results = self.extract_items(text)
+        
+        if len(codes) == 1 and len(results) == 1:
+            logger.debug("Resolved code from the item reference in text")
+            return LocalResolution([], results, codes)
+        
+        return LocalResolution(codes, results, [])
+    
     def normalize_code(self, code: str) -> str:
         """Normalize and validate a taokouling code"""
         if not code:
             raise InvalidInputError("Empty code")
         
-        # Remove whitespace
+        # Fold fullwidth characters, drop invisible ones and remove whitespace
+        if not code.isascii():
+            code = code.translate(CODE_NORMALIZATION)
         code = code.strip()
         
         # Basic validation - should be alphanumeric with some allowed chars
-        if not re.match(r'^[a-zA-Z0-9\-_]+$', code):
+        if not _CODE_RE.fullmatch(code):
             raise InvalidInputError(f"Invalid code format: {code}")
         
         return code
 
+# Threads shared by every provider's default parse_many
+PARSE_MANY_WORKERS = 8
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool() -> ThreadPoolExecutor:
+    """The shared parse_many pool, created on first use"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ThreadPoolExecutor(max_workers=PARSE_MANY_WORKERS, thread_name_prefix='parse-many')
+        return _parse_pool
+
 class Provider(ABC):
     """Abstract base class for taokouling providers"""
     
@@ -98,10 +552,88 @@ class Provider(ABC):
     def get_name(self) -> str:
         """Get provider name"""
         pass
+    
+    def parse_many(self, codes: Iterable[str]) -> List[Tuple[str, Union['ParseResult', ParseError]]]:
+        """Parse several codes, returning (code, result or error) for each in order
+        
+        The default parses the codes concurrently on a thread pool shared by
+        all providers; providers whose backend takes several codes per request
+        override it.
+        """
+        codes = list(codes)
+        return list(zip(codes, _get_parse_pool().map(self._attempt, codes)))
+    
+    def _attempt(self, code: str) -> Union['ParseResult', ParseError]:
+        """The result of parsing code, or the ParseError it raised"""
+        try:
+            return self.parse(code)
+        except ParseError as e:
+            return e
+    
+    def warm_up(self):
+        """Prepare for the first parse, such as opening connections; must not block for long"""
+        pass
+    
+    def set_state_listener(self, listener: Optional[Callable[[str], None]]):
+        """Report availability changes, such as a circuit opening, to listener"""
+        pass
+    
+    def close(self):
+        """Release connections, threads and files held by the provider"""
+        pass
+    
+    async def parse_async(self, code: str) -> 'ParseResult':
+        """Parse a taokouling code without blocking the event loop
+        
+        The default runs parse on the loop's default executor; providers with
+        their own request threads or a faster path override it.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.parse, code)
+    
+    async def parse_all(self, codes: Iterable[str],
+                        limit: Optional[int] = None) -> AsyncIterator[Tuple[str, Union['ParseResult', ParseError]]]:
+        """Yield (code, result or error) for every code as its parse completes
+        
+        With a limit, at most that many parses run at once, and the next code
+        is taken from codes only when one of them completes; an iterable that
+        stops yielding ends the run once the parses started have completed.
+        Closing the iterator early cancels the parses still running.
+        """
+        async def attempt(code):
+            try:
+                return code, await self.parse_async(code)
+            except ParseError as e:
+                return code, e
+        
+        codes = iter(codes)
+        completed = asyncio.Queue()
+        running = set()
+        
+        def start(code):
+            task = asyncio.ensure_future(attempt(code))
+            task.add_done_callback(completed.put_nowait)
+            running.add(task)
+        
+        try:
+            for code in islice(codes, limit):
+                start(code)
+            while running:
+                task = await completed.get()
+                running.discard(task)
+                for code in islice(codes, 1):
+                    start(code)
+                yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
 
 class ParseResult:
     """Result of parsing a taokouling code"""
     
+    # Bulk runs keep many results alive; slots drop the per-instance __dict__
+    __slots__ = ('item_id', 'item_url', 'title', 'provider')
+    
     def __init__(self, item_id: str, item_url: str, title: str, provider: str):
         self.item_id = item_id
         self.item_url = item_url
@@ -117,4 +649,82 @@ class ParseResult:
         }
     
     def __str__(self) -> str:
-        return f"[{self.provider}] {self.title}\nID: {self.item_id}\nURL: {self.item_url}"
\ No newline at end of file
+        return f"[{self.provider}] {self.title}\nID: {self.item_id}\nURL: {self.item_url}"
+
+class ResultBatch:
+    """Columnar store for many ParseResults
+    
+    Ids, URLs and titles are kept in one list per field and providers as
+    small indexes into a table of interned names, so a batch costs a few
+    pointers per result instead of one object each. Results are rebuilt on
+    access, and the export methods stream rows one at a time.
+    """
+    
+    FIELDS = ('item_id', 'item_url', 'title', 'provider')
+    
+    __slots__ = ('item_ids', 'item_urls', 'titles', 'provider_indexes', 'provider_names', '_provider_lookup')
+    
+    def __init__(self, results: Iterable[ParseResult] = ()):
+        self.item_ids: list[str] = []
+        self.item_urls: list[str] = []
+        self.titles: list[str] = []
+        self.provider_indexes = array('H')
+        self.provider_names: list[str] = []
+        self._provider_lookup: Dict[str, int] = {}
+        self.extend(results)
+    
+    def _provider_index(self, provider: str) -> int:
+        index = self._provider_lookup.get(provider)
+        if index is None:
+            index = len(self.provider_names)
+            provider = sys.intern(provider)
+            self.provider_names.append(provider)
+            self._provider_lookup[provider] = index
+        return index
+    
+    def append(self, result: ParseResult):
+        """Add one result"""
+        self.item_ids.append(result.item_id)
+        self.item_urls.append(result.item_url)
+        self.titles.append(result.title)
+        self.provider_indexes.append(self._provider_index(result.provider))
+    
+    def extend(self, results: Iterable[ParseResult]):
+        """Add many results"""
+        for result in results:
+            self.append(result)
+    
+    def __len__(self) -> int:
+        return len(self.item_ids)
+    
+    def __getitem__(self, index: int) -> ParseResult:
+        return ParseResult(self.item_ids[index], self.item_urls[index], self.titles[index],
+                           self.provider_names[self.provider_indexes[index]])
+    
+    def _rows(self) -> Iterator[Tuple[str, str, str, str]]:
+        names = self.provider_names
+        return zip(self.item_ids, self.item_urls, self.titles, (names[i] for i in self.provider_indexes))
+    
+    def __iter__(self) -> Iterator[ParseResult]:
+        return (ParseResult(*row) for row in self._rows())
+    
+    def iter_dicts(self) -> Iterator[Dict[str, str]]:
+        """Yield each result as a to_dict() mapping"""
+        return (dict(zip(self.FIELDS, row)) for row in self._rows())
+    
+    def iter_jsonl(self) -> Iterator[str]:
+        """Yield each result as one JSON line"""
+        return (json.dumps(row, ensure_ascii=False) + '\n' for row in self.iter_dicts())
+    
+    def iter_csv_rows(self) -> Iterator[Tuple[str, ...]]:
+        """Yield a header row followed by one row per result"""
+        yield self.FIELDS
+        yield from self._rows()
+    
+    def write_jsonl(self, stream: IO[str]):
+        """Write results to a text stream as JSON lines"""
+        stream.writelines(self.iter_jsonl())
+    
+    def write_csv(self, stream: IO[str]):
+        """Write results to a text stream as CSV with a header row"""
+        csv.writer(stream).writerows(self.iter_csv_rows())
\ No newline at end of file
@@ -1,7 +1,25 @@
 """
 Providers package for taokouling parsing services
+
+Provider classes are imported on first access, so importing the package
+or one of its lightweight modules does not load the HTTP client.
 """
 
-from .lottefuture import LotteFutureProvider
+import importlib
+
+_EXPORTS = {
+    'LotteFutureProvider': '.lottefuture',
+    'AsyncLotteFutureProvider': '.lottefuture',
+    'CachingProvider': '.cache',
+    'CoalescingProvider': '.coalesce',
+    'HedgingProvider': '.hedge',
+    'RateLimiter': '.ratelimit',
+    'PROVIDERS': '.registry',
+}
+
+__all__ = list(_EXPORTS)
 
-__all__ = ['LotteFutureProvider']
\ No newline at end of file
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,113 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+from ..parser import NetworkError, CircuitOpenError, RequestCancelledError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Stops sending requests to a provider that keeps failing
+    
+    Used as a context manager around each request. A NetworkError leaving
+    the block, which covers timeouts, refused connections and 5xx responses
+    once retries are spent, counts as a failure; anything else, including
+    API errors, shows the service is answering. A cancelled request counts
+    as neither. After `failure_threshold` consecutive failures the circuit
+    opens: requests raise CircuitOpenError at once instead of waiting out
+    retries and timeouts. After `reset_timeout` seconds it lets one probe
+    request through (half-open); the probe closes the circuit if it gets an
+    answer and opens it again if it fails. A threshold of 0 never opens the
+    circuit.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._listener: Optional[Callable[[str], None]] = None
+        self._counters = dict.fromkeys(('opened', 'rejected'), 0)
+    
+    @property
+    def state(self) -> str:
+        """closed, open or half_open"""
+        with self._lock:
+            return self._state
+    
+    def set_listener(self, listener: Optional[Callable[[str], None]]):
+        """Call listener with the new state on every transition, from the requesting thread"""
+        self._listener = listener
+    
+    def __enter__(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return self
+            retry_in = self._opened_at + self.reset_timeout - self._clock()
+            if self._state == OPEN and retry_in <= 0:
+                changed = self._transition(HALF_OPEN)
+            elif self._state == OPEN or self._probing:
+                self._counters['rejected'] += 1
+                raise CircuitOpenError(f"Provider unavailable, retrying in {max(0.0, retry_in):.0f}s")
+            else:
+                changed = None
+            # This request is the probe
+            self._probing = True
+        self._notify(changed)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        failed = exc_type is not None and issubclass(exc_type, NetworkError)
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+            if exc_type is not None and issubclass(exc_type, RequestCancelledError):
+                # Says nothing about the service; a half-open circuit probes again
+                return False
+            if not failed:
+                self._failures = 0
+                changed = self._transition(CLOSED)
+            else:
+                self._failures += 1
+                if self._state == HALF_OPEN or (self._state == CLOSED and self.failure_threshold
+                                                and self._failures >= self.failure_threshold):
+                    self._opened_at = self._clock()
+                    self._counters['opened'] += 1
+                    changed = self._transition(OPEN)
+                else:
+                    changed = None
+        self._notify(changed)
+        return False
+    
+    def _transition(self, state: str) -> Optional[str]:
+        """Move to state and return it if it changed; called with the lock held"""
+        if self._state == state:
+            return None
+        self._state = state
+        if state == OPEN:
+            logger.warning(f"Circuit opened after {self._failures} consecutive failures; "
+                           f"probing again in {self.reset_timeout:.0f}s")
+        else:
+            logger.info(f"Circuit {state.replace('_', '-')}")
+        return state
+    
+    def _notify(self, state: Optional[str]):
+        if state and self._listener:
+            try:
+                self._listener(state)
+            except Exception as e:
+                logger.warning(f"Circuit state listener failed: {str(e)}")
+    
+    def stats(self) -> Dict[str, float]:
+        """Current state, consecutive failures, and open and rejection counters"""
+        with self._lock:
+            return dict(self._counters, state=self._state, failures=self._failures)
@@ -0,0 +1,229 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, NamedTuple, Optional, Union
+from ..parser import (Provider, ParseResult, ParseError, ExpiredTokenError, InvalidInputError,
+                      TaokoulingParser)
+from ..settings import settings
+from .store import SQLiteResultStore
+
+logger = logging.getLogger(__name__)
+
+# Outcomes that a retry within seconds would only repeat
+NEGATIVE_ERRORS = (ExpiredTokenError, InvalidInputError)
+
+class CacheEntry(NamedTuple):
+    """A cached outcome and the times it stops being fresh and servable"""
+    outcome: Union[ParseResult, ParseError]
+    fresh_until: float
+    stale_until: float
+
+class CachingProvider(Provider):
+    """Bounded LRU+TTL result cache in front of another provider
+    
+    Entries are keyed by normalized code. A result is fresh for `ttl` seconds
+    and is then served stale for up to `stale_ttl` more seconds while a
+    background refresh replaces it. ExpiredTokenError and InvalidInputError
+    are remembered for `negative_ttl` seconds and raised again on a hit.
+    When the cache holds `max_entries`, the least recently used entry goes.
+    
+    With a `store`, results are also written to disk, a memory miss is looked
+    up there before the provider, and warm_up() preloads the most recent
+    stored results.
+    """
+    
+    def __init__(self, provider: Provider, max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None, stale_ttl: Optional[float] = None,
+                 negative_ttl: Optional[float] = None, store: Optional[SQLiteResultStore] = None,
+                 clock: Callable[[], float] = time.monotonic, wall_clock: Callable[[], float] = time.time):
+        self.provider = provider
+        self.store = store
+        self.max_entries = max(1, settings.cache_size if max_entries is None else max_entries)
+        self.ttl = settings.cache_ttl if ttl is None else ttl
+        self.stale_ttl = settings.cache_stale_ttl if stale_ttl is None else stale_ttl
+        self.negative_ttl = settings.cache_negative_ttl if negative_ttl is None else negative_ttl
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._parser = TaokoulingParser()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-refresh')
+        self._counters = dict.fromkeys(
+            ('hits', 'stale_hits', 'negative_hits', 'store_hits', 'misses', 'evictions', 'refreshes'), 0)
+    
+    def get_name(self) -> str:
+        return self.provider.get_name()
+    
+    def parse(self, code: str) -> ParseResult:
+        """Parse a taokouling code, answering from the cache when possible"""
+        key = self._parser.normalize_code(code)
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._serve(entry)
+        return self._fetch(key)
+    
+    async def parse_async(self, code: str) -> ParseResult:
+        """Parse a taokouling code; cache hits never leave the event loop"""
+        key = self._parser.normalize_code(code)
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._serve(entry)
+        
+        try:
+            result = await self.provider.parse_async(key)
+        except ParseError as e:
+            self._store(key, e)
+            raise
+        self._store(key, result)
+        return result
+    
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """The servable entry for key, if any, counting the hit or miss"""
+        now = self._clock()
+        refresh = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now >= entry.stale_until:
+                del self._entries[key]
+                entry = None
+        
+        if entry is None:
+            entry = self._recall(key)
+            if entry is None:
+                with self._lock:
+                    self._counters['misses'] += 1
+                return None
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            if isinstance(entry.outcome, ParseError):
+                self._counters['negative_hits'] += 1
+            elif now < entry.fresh_until:
+                self._counters['hits'] += 1
+            else:
+                self._counters['stale_hits'] += 1
+                refresh = key not in self._refreshing
+                self._refreshing.add(key)
+        
+        if refresh:
+            self._refresher.submit(self._refresh, key)
+        return entry
+    
+    def _recall(self, key: str) -> Optional[CacheEntry]:
+        """Move a result from the persistent store into memory"""
+        if self.store is None:
+            return None
+        stored = self.store.get(key)
+        if stored is None:
+            return None
+        
+        entry = self._from_stored(stored)
+        with self._lock:
+            self._insert(key, entry)
+            self._counters['store_hits'] += 1
+        return entry
+    
+    def _from_stored(self, stored) -> CacheEntry:
+        """Translate wall-clock bounds from the store to this cache's clock"""
+        offset = self._clock() - self._wall_clock()
+        return CacheEntry(stored.result, stored.fresh_until + offset, stored.stale_until + offset)
+    
+    def _insert(self, key: str, entry: CacheEntry):
+        """Add an entry as most recently used, evicting past max_entries; holds the lock"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+    
+    def _serve(self, entry: CacheEntry) -> ParseResult:
+        """Return a cached result or raise a cached error"""
+        outcome = entry.outcome
+        if isinstance(outcome, ParseError):
+            # A fresh instance keeps tracebacks from piling up on the cached one
+            raise type(outcome)(outcome.message)
+        return outcome
+    
+    def _store(self, key: str, outcome: Union[ParseResult, ParseError]):
+        """Cache a result or a negative error; other errors are not cached"""
+        now = self._clock()
+        if isinstance(outcome, ParseResult):
+            entry = CacheEntry(outcome, now + self.ttl, now + self.ttl + self.stale_ttl)
+        elif isinstance(outcome, NEGATIVE_ERRORS):
+            entry = CacheEntry(outcome, now + self.negative_ttl, now + self.negative_ttl)
+        else:
+            return
+        
+        with self._lock:
+            self._insert(key, entry)
+        
+        if self.store is not None and isinstance(outcome, ParseResult):
+            offset = self._wall_clock() - now
+            self.store.put(key, outcome, entry.fresh_until + offset, entry.stale_until + offset)
+    
+    def _fetch(self, key: str) -> ParseResult:
+        """Parse through the wrapped provider and cache the outcome"""
+        try:
+            result = self.provider.parse(key)
+        except ParseError as e:
+            self._store(key, e)
+            raise
+        self._store(key, result)
+        return result
+    
+    def _refresh(self, key: str):
+        """Replace a stale entry; on failure the stale entry stays until it runs out"""
+        try:
+            self._fetch(key)
+            with self._lock:
+                self._counters['refreshes'] += 1
+        except ParseError as e:
+            logger.info(f"Background refresh of code {key[:8]}... failed: {e.message}")
+        except Exception as e:
+            logger.exception(f"Unexpected error refreshing code {key[:8]}...: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+    
+    def warm_up(self) -> int:
+        """Warm up the wrapped provider, then preload the most recently stored
+        results and return how many were loaded"""
+        self.provider.warm_up()
+        if self.store is None:
+            return 0
+        stored = self.store.load_recent(self.max_entries)
+        
+        # Oldest first, so the newest end up most recently used
+        with self._lock:
+            for item in reversed(stored):
+                if item.code not in self._entries:
+                    self._insert(item.code, self._from_stored(item))
+        logger.info(f"Warmed result cache with {len(stored)} stored results")
+        return len(stored)
+    
+    def set_state_listener(self, listener: Optional[Callable[[str], None]]):
+        """Listen to the wrapped provider's availability"""
+        self.provider.set_state_listener(listener)
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters and the current entry count"""
+        with self._lock:
+            return dict(self._counters, size=len(self._entries))
+    
+    def clear(self):
+        """Drop every entry cached in memory"""
+        with self._lock:
+            self._entries.clear()
+    
+    def close(self):
+        """Stop background refreshes, close the wrapped provider and commit pending writes to the store"""
+        self._refresher.shutdown(wait=False, cancel_futures=True)
+        # Closing the provider first aborts a refresh in flight instead of waiting it out
+        self.provider.close()
+        self._refresher.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
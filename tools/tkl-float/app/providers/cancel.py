@@ -0,0 +1,165 @@
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Set
+from ..parser import RequestCancelledError, DeadlineExceededError
+
+# The token of the call running on each thread
+_local = threading.local()
+
+# Monotonic time by which the work started in this context must finish;
+# asyncio tasks inherit it from where they were created
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+# A call with less time than this left gives up instead of starting a step
+DEADLINE_SLACK = 0.01
+
+class CancelToken:
+    """Lets another thread abort a blocking provider call
+    
+    The call runs with the token bound to its thread. The connection pool
+    attaches every connection the call uses and detaches it when it goes
+    back to the pool. cancel() shuts the attached sockets down, so a
+    blocked send or read fails at once instead of waiting out the timeout,
+    and the call raises RequestCancelledError at its next step instead of
+    retrying. A connect already under way still runs to its own timeout.
+    
+    A token may also carry a deadline, by default the one of the context
+    it is created in. The pool caps each connect and read timeout at the
+    time left, and once it runs out the call raises DeadlineExceededError
+    at its next step.
+    """
+    
+    def __init__(self, deadline: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._connections: Set[object] = set()
+        self._callbacks: List[Callable[[], None]] = []
+        self.deadline = deadline if deadline is not None else _deadline.get()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+    
+    def cancel(self):
+        """Abort the call; later calls do nothing"""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            # Under the lock, so no connection goes back to the pool mid-shutdown
+            for conn in self._connections:
+                sock = getattr(conn, 'sock', None)
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+            callbacks = list(self._callbacks)
+        # Outside the lock, so a callback may take locks of its own
+        for callback in callbacks:
+            callback()
+    
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]):
+        """Call callback if the token is cancelled while in the block"""
+        with self._lock:
+            self._callbacks.append(callback)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._callbacks.remove(callback)
+    
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, None without one"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def check(self):
+        """Raise RequestCancelledError once cancelled, DeadlineExceededError once out of time"""
+        if self._cancelled:
+            raise RequestCancelledError()
+        if self.deadline is not None and time.monotonic() >= self.deadline - DEADLINE_SLACK:
+            raise DeadlineExceededError()
+    
+    def attach(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+            conn._cancel_token = self
+        self.check()
+    
+    def detach(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+            conn._cancel_token = None
+    
+    @contextmanager
+    def bound(self):
+        """Make this the token of the call running on this thread"""
+        outer = current()
+        _local.token = self
+        try:
+            yield self
+        finally:
+            _local.token = outer
+    
+    def run(self, fn: Callable, *args):
+        """fn(*args) with this token bound, for running on an executor"""
+        with self.bound():
+            return fn(*args)
+
+def current() -> Optional[CancelToken]:
+    """The token of the call running on this thread, if any"""
+    return getattr(_local, 'token', None)
+
+def check():
+    """Raise if this thread's call was cancelled or ran out of time"""
+    token = current()
+    if token is not None:
+        token.check()
+
+def remaining() -> Optional[float]:
+    """Seconds left to this thread's call, None without a deadline"""
+    token = current()
+    return token.remaining() if token is not None else None
+
+def attach(conn):
+    """Let this thread's call abort conn, raising if it is already cancelled"""
+    token = current()
+    if token is not None:
+        token.attach(conn)
+
+def detach(conn):
+    """Stop conn from being aborted, as it goes back to the pool"""
+    token = getattr(conn, '_cancel_token', None)
+    if token is not None:
+        token.detach(conn)
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Give the work started in the block `seconds` to finish, or no limit for None or 0
+    
+    Calls the block makes, directly or through asyncio tasks it creates,
+    pick the deadline up when they create their cancel token. A deadline
+    set inside another one never extends it.
+    """
+    if not seconds:
+        yield current_deadline()
+        return
+    ends_at = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        ends_at = min(ends_at, outer)
+    reset = _deadline.set(ends_at)
+    try:
+        yield ends_at
+    finally:
+        _deadline.reset(reset)
+
+def current_deadline() -> Optional[float]:
+    """Monotonic time by which the work in this context must finish, if any"""
+    return _deadline.get()
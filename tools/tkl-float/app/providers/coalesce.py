@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+from ..parser import Provider, ParseResult, TaokoulingParser
+
+logger = logging.getLogger(__name__)
+
+# Seconds an abandoned call keeps running for a caller to adopt it, long
+# enough for a superseding batch to ask for the same code again
+ABANDON_GRACE = 0.25
+
+class Flight:
+    """One outbound parse and the callers waiting on it"""
+    __slots__ = ('future', 'waiters', 'cancel')
+    
+    def __init__(self):
+        self.future = Future()
+        self.waiters = 0
+        self.cancel: Optional[Callable[[], bool]] = None
+
+class CoalescingProvider(Provider):
+    """Single-flight wrapper: concurrent parses of one code share one call
+    
+    While a code is in flight, later callers for the same normalized code,
+    from any thread or event loop, wait on the first call and receive the
+    same result or the same error. A call started on an event loop is
+    cancelled only once every caller waiting on it has been cancelled and
+    nobody has joined it for ABANDON_GRACE seconds.
+    """
+    
+    def __init__(self, provider: Provider):
+        self.provider = provider
+        self._parser = TaokoulingParser()
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('calls', 'coalesced'), 0)
+    
+    def get_name(self) -> str:
+        return self.provider.get_name()
+    
+    def _join(self, key: str):
+        """The flight for key and whether this caller has to start it"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self._counters['calls'] += 1
+            else:
+                self._counters['coalesced'] += 1
+            flight.waiters += 1
+        return flight, leader
+    
+    def _land(self, key: str, flight: Flight):
+        """Retire a finished flight so later parses start a new call"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+    
+    def parse(self, code: str) -> ParseResult:
+        """Parse a taokouling code, sharing a call already in flight for it"""
+        key = self._parser.normalize_code(code)
+        flight, leader = self._join(key)
+        if not leader:
+            return flight.future.result()
+        
+        try:
+            result = self.provider.parse(key)
+        except BaseException as e:
+            self._land(key, flight)
+            flight.future.set_exception(e)
+            raise
+        self._land(key, flight)
+        flight.future.set_result(result)
+        return result
+    
+    async def parse_async(self, code: str) -> ParseResult:
+        """Parse a taokouling code, sharing a call already in flight for it"""
+        key = self._parser.normalize_code(code)
+        flight, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(self._fly(key, flight))
+            flight.cancel = task.cancel
+        
+        shared = asyncio.wrap_future(flight.future)
+        try:
+            # Shielded so one caller giving up does not cancel the others' call
+            return await asyncio.shield(shared)
+        except asyncio.CancelledError:
+            # The call may still fail after this caller is gone, as one cut
+            # off by a deadline does; nobody is left to read the error
+            shared.add_done_callback(lambda done: done.cancelled() or done.exception())
+            with self._lock:
+                flight.waiters -= 1
+            if flight.cancel:
+                asyncio.get_running_loop().call_later(ABANDON_GRACE, self._abandon, key, flight)
+            raise
+    
+    def _abandon(self, key: str, flight: Flight):
+        """Cancel a flight that has had no waiters for the grace period"""
+        with self._lock:
+            if flight.waiters or self._flights.get(key) is not flight:
+                return
+            del self._flights[key]
+        logger.debug(f"Cancelling abandoned parse of code {key[:8]}...")
+        flight.cancel()
+    
+    async def _fly(self, key: str, flight: Flight):
+        """Make the outbound call for a flight started on the event loop"""
+        try:
+            result = await self.provider.parse_async(key)
+        except asyncio.CancelledError:
+            self._land(key, flight)
+            flight.future.cancel()
+            raise
+        except BaseException as e:
+            self._land(key, flight)
+            flight.future.set_exception(e)
+            return
+        self._land(key, flight)
+        flight.future.set_result(result)
+    
+    def stats(self) -> Dict[str, int]:
+        """Outbound calls made, calls saved by coalescing, and calls in flight"""
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._flights))
+    
+    def warm_up(self):
+        """Warm up the wrapped provider"""
+        self.provider.warm_up()
+    
+    def set_state_listener(self, listener: Optional[Callable[[str], None]]):
+        """Listen to the wrapped provider's availability"""
+        self.provider.set_state_listener(listener)
+    
+    def close(self):
+        """Close the wrapped provider"""
+        self.provider.close()
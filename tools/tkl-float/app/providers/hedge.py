@@ -0,0 +1,176 @@
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, Sequence
+from ..parser import Provider, ParseResult, ParseError
+
+logger = logging.getLogger(__name__)
+
+class LatencyTracker:
+    """Recent call latencies of one provider"""
+    
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+    
+    def percentile(self, p: float, min_samples: int = 1) -> Optional[float]:
+        """The p-th percentile latency, or None with fewer than min_samples samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+class HedgingProvider(Provider):
+    """Races a slow call against a hedge to cut tail latency
+    
+    parse_async calls the first provider. If no answer has come back once
+    the call has run for that provider's `percentile` latency, a hedge goes
+    to the next provider in the list, or to the same provider again when it
+    is the only one, up to `max_hedges` times, by default once per other
+    provider. The first result wins and the calls still running are
+    cancelled; errors only come back once every call has failed, the first
+    error to arrive winning.
+    
+    Hedges are capped at `max_extra` times the calls made, so a slow
+    provider sees at most that much extra load. No hedging happens before a
+    provider has `min_samples` latencies recorded. Cancelled calls count
+    with the time they ran, so the slow tail is not dropped from the
+    samples. Synchronous parse calls go to the first provider only.
+    """
+    
+    def __init__(self, providers: Sequence[Provider], percentile: float = 95, max_extra: float = 0.05,
+                 max_hedges: Optional[int] = None, min_samples: int = 20, min_delay: float = 0.05,
+                 window: int = 200, clock: Callable[[], float] = time.monotonic):
+        if not providers:
+            raise ValueError("HedgingProvider needs at least one provider")
+        self.providers = list(providers)
+        self.percentile = percentile
+        self.max_extra = max_extra
+        # One hedge per other provider, or one repeat of a lone provider
+        self.max_hedges = max(1, len(self.providers) - 1) if max_hedges is None else max_hedges
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._clock = clock
+        self._latencies = [LatencyTracker(window) for _ in self.providers]
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('calls', 'hedges', 'hedge_wins', 'denied'), 0)
+    
+    def get_name(self) -> str:
+        return " / ".join(provider.get_name() for provider in self.providers)
+    
+    def parse(self, code: str) -> ParseResult:
+        """Parse a taokouling code with the first provider"""
+        started = self._clock()
+        result = self.providers[0].parse(code)
+        self._latencies[0].record(self._clock() - started)
+        return result
+    
+    def hedge_delay(self, index: int) -> Optional[float]:
+        """Seconds a call to providers[index] runs before it is hedged, None while unknown"""
+        latency = self._latencies[index].percentile(self.percentile, self.min_samples)
+        if latency is None:
+            return None
+        return max(self.min_delay, latency)
+    
+    def _take_hedge(self) -> bool:
+        """Reserve one hedge if the extra load budget allows it"""
+        with self._lock:
+            if self._counters['hedges'] + 1 <= self.max_extra * self._counters['calls']:
+                self._counters['hedges'] += 1
+                return True
+            self._counters['denied'] += 1
+            return False
+    
+    async def _timed(self, index: int, code: str) -> ParseResult:
+        """Call providers[index] and record how long it took"""
+        started = self._clock()
+        try:
+            result = await self.providers[index].parse_async(code)
+        except asyncio.CancelledError:
+            self._latencies[index].record(self._clock() - started)
+            raise
+        self._latencies[index].record(self._clock() - started)
+        return result
+    
+    async def parse_async(self, code: str) -> ParseResult:
+        """Parse a taokouling code, hedging a call slower than its provider's percentile"""
+        with self._lock:
+            self._counters['calls'] += 1
+        
+        launched = []
+        pending = set()
+        
+        def launch():
+            index = len(launched) % len(self.providers)
+            task = asyncio.ensure_future(self._timed(index, code))
+            launched.append((task, index, self._clock()))
+            pending.add(task)
+        
+        launch()
+        hedging = True
+        first_error = None
+        try:
+            while pending:
+                timeout = None
+                if hedging and len(launched) <= self.max_hedges:
+                    _, index, started = launched[-1]
+                    delay = self.hedge_delay(index)
+                    if delay is not None:
+                        timeout = max(0.0, started + delay - self._clock())
+                
+                done, pending = await asyncio.wait(pending, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except ParseError as e:
+                        first_error = first_error or e
+                        continue
+                    if task is not launched[0][0]:
+                        with self._lock:
+                            self._counters['hedge_wins'] += 1
+                    return result
+                
+                if not done:
+                    if self._take_hedge():
+                        logger.debug(f"Hedging code {code[:8]}... after {timeout:.2f}s")
+                        launch()
+                    else:
+                        # Over budget: wait for the calls already made
+                        hedging = False
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def warm_up(self):
+        """Warm up every provider"""
+        for provider in self.providers:
+            provider.warm_up()
+    
+    def set_state_listener(self, listener: Optional[Callable[[str], None]]):
+        """Listen to the first provider's availability"""
+        self.providers[0].set_state_listener(listener)
+    
+    def stats(self) -> Dict[str, object]:
+        """Hedging counters and each provider's p50 and hedging percentile latency"""
+        with self._lock:
+            counters = dict(self._counters)
+        counters['latency'] = {
+            provider.get_name(): {'p50': tracker.percentile(50), f'p{self.percentile:g}': tracker.percentile(self.percentile)}
+            for provider, tracker in zip(self.providers, self._latencies)
+        }
+        return counters
+    
+    def close(self):
+        """Close every provider"""
+        for provider in self.providers:
+            provider.close()
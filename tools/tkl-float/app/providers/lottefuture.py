@@ -1,38 +1,91 @@
+import time
+import asyncio
 import requests
 import logging
-from typing import Dict
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 from urllib.parse import urljoin
-from ..parser import Provider, ParseResult, NetworkError, ProviderError, ExpiredTokenError, NoPermissionError, RateLimitedError
+from urllib3.util.retry import Retry
+from ..parser import Provider, ParseResult, ParseError, NetworkError, ProviderError, ExpiredTokenError, NoPermissionError, RateLimitedError, CircuitOpenError, RequestCancelledError, DeadlineExceededError
 from ..settings import settings
+from . import cancel
+from .breaker import CircuitBreaker
+from .cancel import CancelToken
+from .pool import PooledAdapter
+from .ratelimit import RateLimiter, parse_retry_after
+from .trace import RequestTrace, RequestTracer, phase
 
 logger = logging.getLogger(__name__)
 
+class ServerErrorRetry(Retry):
+    """Retry that leaves 429 responses to the rate limiter and keeps to the call's deadline
+    
+    urllib3 otherwise retries any 429 carrying Retry-After itself, sleeping
+    on the request thread where the limiter never sees the throttling. A
+    retry whose backoff would run past the deadline is not attempted.
+    """
+    RETRY_AFTER_STATUS_CODES = Retry.RETRY_AFTER_STATUS_CODES - {429}
+    
+    def get_backoff_time(self) -> float:
+        return self._within_deadline(super().get_backoff_time())
+    
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return self._within_deadline(retry_after) if retry_after is not None else None
+    
+    @staticmethod
+    def _within_deadline(wait: float) -> float:
+        remaining = cancel.remaining()
+        if remaining is not None and wait >= remaining:
+            raise DeadlineExceededError(f"Deadline exceeded before retrying in {wait:.1f}s")
+        return wait
+
 class LotteFutureProvider(Provider):
     """LotteFuture API provider for taokouling parsing"""
     
-    def __init__(self):
+    # Times a request is queued again after being throttled before giving up
+    MAX_THROTTLED_ATTEMPTS = 5
+    
+    def __init__(self, pool_size: Optional[int] = None, batch_size: Optional[int] = None):
         self.base_url = settings.base_url
         self.app_key = settings.app_key
         self.app_secret = settings.app_secret
         self.invite_code = settings.invite_code
         self.timeout = settings.timeout
+        # Codes per request; above 1 only for backends that accept a code list
+        self.batch_size = max(1, batch_size or settings.batch_size)
+        # One pooled connection per request thread
+        pool_size = max(1, pool_size or settings.concurrency)
         
         # Create session with retry configuration
         self.session = requests.Session()
         
-        # Configure retries with exponential backoff
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-        
-        retry_strategy = Retry(
+        # Configure retries with exponential backoff; 429s are left to the
+        # rate limiter, which queues the request instead of sleeping on it
+        retry_strategy = ServerErrorRetry(
             total=3,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+            status_forcelist=[500, 502, 503, 504],
         )
         
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+        self.adapter = PooledAdapter(pool_size, dns_ttl=settings.dns_ttl, keep_warm=settings.keep_warm,
+                                     max_retries=retry_strategy)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        
+        self.limiter = RateLimiter(rate=settings.rate_limit, max_concurrency=pool_size)
+        # Fails requests fast while the API is down instead of waiting out retries
+        self.breaker = CircuitBreaker(settings.breaker_threshold, settings.breaker_reset)
+        # Phase timings and latency histograms per endpoint, written to
+        # trace_file on close when one is set
+        self.tracer = RequestTracer()
+        self.trace_file = settings.trace_file
+        # Cancel tokens of the requests in flight, cancelled on close
+        self._tokens: Set[CancelToken] = set()
+        self._tokens_lock = threading.Lock()
+        self._closed = False
     
     def get_name(self) -> str:
         return "LotteFuture"
@@ -54,78 +107,310 @@ class LotteFutureProvider(Provider):
         if params:
             request_params.update(params)
         
+        with self._cancellable() as token, self.breaker, self.tracer.trace(endpoint) as trace:
+            try:
+                data = self._send(url, request_params, trace, token)
+                logger.debug(f"Response status: {data.get('code', 'unknown')}")
+                
+                return data
+                
+            except requests.exceptions.Timeout:
+                raise NetworkError(f"Request timeout after {self.timeout} seconds")
+            except requests.exceptions.ConnectionError:
+                raise NetworkError("Connection failed")
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code == 401:
+                    raise ExpiredTokenError("Authentication failed - check credentials")
+                elif e.response.status_code == 403:
+                    raise NoPermissionError("Access forbidden")
+                elif e.response.status_code == 429:
+                    raise RateLimitedError("Rate limit exceeded")
+                else:
+                    raise NetworkError(f"HTTP {e.response.status_code}: {e.response.text}")
+            except requests.exceptions.RequestException as e:
+                raise NetworkError(f"Request failed: {str(e)}")
+            except ValueError as e:
+                raise ProviderError(f"Invalid JSON response: {str(e)}")
+    
+    @contextmanager
+    def _cancellable(self):
+        """The calling thread's cancel token, or a new one, cancelled if this provider closes"""
+        token = cancel.current() or CancelToken()
+        with self._tokens_lock:
+            self._tokens.add(token)
+            if self._closed:
+                token.cancel()
         try:
-            logger.debug(f"Making request to {url}")
-            response = self.session.get(
-                url,
-                params=request_params,
-                timeout=(self.timeout // 2, self.timeout)  # Connect/Read timeout split
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            logger.debug(f"Response status: {data.get('code', 'unknown')}")
-            
-            return data
+            with token.bound():
+                token.check()
+                yield token
+        finally:
+            with self._tokens_lock:
+                self._tokens.discard(token)
+    
+    def _send(self, url: str, params: Dict, trace: RequestTrace, token: CancelToken) -> Dict:
+        """GET url through the rate limiter, queueing again while throttled"""
+        for attempt in range(self.MAX_THROTTLED_ATTEMPTS):
+            token.check()
+            # Cancelling the token wakes the limiter, so a queued request stops waiting
+            with phase('queue'), token.on_cancel(self.limiter.wake):
+                if not self.limiter.acquire(timeout=token.remaining(), token=token):
+                    raise DeadlineExceededError("Deadline exceeded waiting for the rate limiter")
+            started = time.monotonic()
+            try:
+                token.check()
+                logger.debug(f"Making request to {url}")
+                response = self.session.get(
+                    url,
+                    params=params,
+                    timeout=(self.timeout // 2, self.timeout),  # Connect/Read timeout split
+                    stream=True  # So the body download is timed on its own
+                )
+                with phase('download'):
+                    response.content
+                trace.status = response.status_code
+                throttled = response.status_code == 429
+                if not throttled:
+                    response.raise_for_status()
+                    with phase('decode'):
+                        data = response.json()
+                    throttled = data.get('code') == 429
+            except BaseException:
+                self.limiter.release()
+                # An aborted connection surfaces as whatever error it caused
+                token.check()
+                raise
             
-        except requests.exceptions.Timeout:
-            raise NetworkError(f"Request timeout after {self.timeout} seconds")
-        except requests.exceptions.ConnectionError:
-            raise NetworkError("Connection failed")
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 401:
-                raise ExpiredTokenError("Authentication failed - check credentials")
-            elif e.response.status_code == 403:
-                raise NoPermissionError("Access forbidden")
-            elif e.response.status_code == 429:
-                raise RateLimitedError("Rate limit exceeded")
-            else:
-                raise NetworkError(f"HTTP {e.response.status_code}: {e.response.text}")
-        except requests.exceptions.RequestException as e:
-            raise NetworkError(f"Request failed: {str(e)}")
-        except ValueError as e:
-            raise ProviderError(f"Invalid JSON response: {str(e)}")
+            if not throttled:
+                self.limiter.release(latency=time.monotonic() - started)
+                return data
+            trace.throttled += 1
+            self.limiter.release(throttled=True,
+                                 retry_after=parse_retry_after(response.headers.get('Retry-After')))
+        
+        # Still throttled: surface it as a rate limit error
+        if response.status_code == 429:
+            response.raise_for_status()
+        return data
     
     def parse(self, code: str) -> ParseResult:
         """Parse a taokouling code using LotteFuture API"""
         try:
             # Make API request
             response = self._make_request('/api/parse', {'code': code})
+            return self._to_result(code, response)
             
-            # Check response code
-            if response.get('code') != 0:
-                error_msg = response.get('message', 'Unknown error')
-                
-                # Map error codes to our exceptions
-                error_code = response.get('code')
-                if error_code == 401:
-                    raise ExpiredTokenError(error_msg)
-                elif error_code == 403:
-                    raise NoPermissionError(error_msg)
-                elif error_code == 429:
-                    raise RateLimitedError(error_msg)
-                else:
-                    raise ProviderError(f"API error {error_code}: {error_msg}")
-            
-            # Extract data
-            data = response.get('data', {})
-            item_id = data.get('item_id', '')
-            item_url = data.get('item_url', '')
-            title = data.get('title', '')
-            
-            if not all([item_id, item_url, title]):
-                raise ProviderError("Incomplete response data from provider")
-            
-            logger.info(f"Successfully parsed code {code[:8]}...")
-            return ParseResult(item_id, item_url, title, self.get_name())
-            
-        except (NetworkError, ProviderError, ExpiredTokenError, NoPermissionError, RateLimitedError):
+        except (NetworkError, ProviderError, ExpiredTokenError, NoPermissionError, RateLimitedError, CircuitOpenError,
+                RequestCancelledError):
             raise
         except Exception as e:
             logger.exception(f"Unexpected error parsing code: {str(e)}")
             raise ProviderError(f"Unexpected error: {str(e)}")
     
+    def parse_many(self, codes: Iterable[str]) -> List[Tuple[str, Union[ParseResult, ParseError]]]:
+        """Parse codes batch_size at a time, one request per chunk
+        
+        A chunk is sent as a comma-separated `codes` parameter; the response
+        `data` maps each code to the same envelope a single-code parse gets.
+        With a batch_size of 1, codes are parsed one request each, concurrently.
+        """
+        codes = list(codes)
+        if self.batch_size == 1:
+            return super().parse_many(codes)
+        
+        outcomes = []
+        for start in range(0, len(codes), self.batch_size):
+            outcomes.extend(self._parse_chunk(codes[start:start + self.batch_size]))
+        return outcomes
+    
+    def _parse_chunk(self, codes: List[str]) -> List[Tuple[str, Union[ParseResult, ParseError]]]:
+        """Parse up to batch_size codes in one request"""
+        try:
+            response = self._make_request('/api/parse', {'codes': ','.join(codes)})
+            self._check_code(response)
+            entries = response.get('data')
+            if not isinstance(entries, dict):
+                raise ProviderError("Invalid batch response from provider")
+        except ParseError as e:
+            # A failed request fails every code in it
+            return [(code, e) for code in codes]
+        except Exception as e:
+            logger.exception(f"Unexpected error parsing {len(codes)} codes: {str(e)}")
+            error = ProviderError(f"Unexpected error: {str(e)}")
+            return [(code, error) for code in codes]
+        
+        outcomes = []
+        for code in codes:
+            try:
+                entry = entries.get(code)
+                if not isinstance(entry, dict):
+                    raise ProviderError("No result for code in batch response")
+                outcomes.append((code, self._to_result(code, entry)))
+            except ParseError as e:
+                outcomes.append((code, e))
+        return outcomes
+    
+    def _check_code(self, response: Dict):
+        """Raise the error matching a non-zero response code"""
+        if response.get('code') != 0:
+            error_msg = response.get('message', 'Unknown error')
+            
+            # Map error codes to our exceptions
+            error_code = response.get('code')
+            if error_code == 401:
+                raise ExpiredTokenError(error_msg)
+            elif error_code == 403:
+                raise NoPermissionError(error_msg)
+            elif error_code == 429:
+                raise RateLimitedError(error_msg)
+            else:
+                raise ProviderError(f"API error {error_code}: {error_msg}")
+    
+    def _to_result(self, code: str, response: Dict) -> ParseResult:
+        """Map an /api/parse response to a ParseResult or the matching error"""
+        # Check response code
+        self._check_code(response)
+        
+        # Extract data
+        data = response.get('data', {})
+        item_id = data.get('item_id', '')
+        item_url = data.get('item_url', '')
+        title = data.get('title', '')
+        
+        if not all([item_id, item_url, title]):
+            raise ProviderError("Incomplete response data from provider")
+        
+        logger.info(f"Successfully parsed code {code[:8]}...")
+        return ParseResult(item_id, item_url, title, self.get_name())
+    
+    def warm_up(self):
+        """Open a connection to the API in the background, and again after idle periods"""
+        if self.base_url:
+            # The same certificate settings requests will use, so the warmed pool is the one used
+            verify = self.session.merge_environment_settings(self.base_url, {}, None, None, None)['verify']
+            self.adapter.warm_in_background(self.base_url, verify)
+    
+    def set_state_listener(self, listener: Optional[Callable[[str], None]]):
+        """Report circuit breaker transitions to listener"""
+        self.breaker.set_listener(listener)
+    
+    def connection_stats(self) -> Dict[str, float]:
+        """Connection reuse and DNS cache counters of the session's pool"""
+        return self.adapter.stats()
+    
+    def request_stats(self) -> Dict[str, Dict]:
+        """Attempts, retries, status codes, errors and phase latency histograms per endpoint"""
+        return self.tracer.stats()
+    
+    def dump_traces(self, path: Optional[str] = None):
+        """Write request stats and the latest request traces to path, or to trace_file"""
+        return self.tracer.dump(path or self.trace_file)
+    
+    def close(self):
+        """Abort requests in flight, write the request traces if configured, then close the session"""
+        if hasattr(self, '_tokens'):
+            with self._tokens_lock:
+                self._closed = True
+                tokens = list(self._tokens)
+            for token in tokens:
+                token.cancel()
+            self.limiter.wake()
+        if getattr(self, 'trace_file', None):
+            trace_file, self.trace_file = self.trace_file, None
+            try:
+                self.dump_traces(trace_file)
+            except OSError as e:
+                logger.warning(f"Could not write request traces to {trace_file}: {str(e)}")
+        if hasattr(self, 'session'):
+            self.session.close()
+    
     def __del__(self):
         """Cleanup session"""
-        if hasattr(self, 'session'):
-            self.session.close()
\ No newline at end of file
+        self.close()
+
+class AsyncLotteFutureProvider(LotteFutureProvider):
+    """LotteFuture provider that resolves many codes concurrently on an asyncio loop
+    
+    requests has no asyncio API, so each call runs the blocking request on a
+    pool of `concurrency` threads sharing one session and connection pool.
+    At most `concurrency` requests are in flight; the rest wait their turn.
+    Cancelling a parse drops its request from the queue, or aborts it on
+    its connection once it has started.
+    
+    With a batch_size above 1, codes asked for in the same event loop
+    iteration, as parse_all and the wrappers around it do, are collected and
+    sent batch_size per request. parse_async calls must then come from one
+    event loop at a time.
+    """
+    
+    def __init__(self, concurrency: Optional[int] = None, batch_size: Optional[int] = None):
+        self.concurrency = max(1, concurrency or settings.concurrency)
+        super().__init__(pool_size=self.concurrency, batch_size=batch_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix='lottefuture')
+        self._pending = []
+    
+    async def parse_async(self, code: str) -> ParseResult:
+        """Parse a taokouling code on this provider's request threads"""
+        loop = asyncio.get_running_loop()
+        if self.batch_size == 1:
+            token = CancelToken()
+            try:
+                return await loop.run_in_executor(self._executor, token.run, self.parse, code)
+            except asyncio.CancelledError:
+                # Not started: dropped from the queue; started: its request is aborted
+                token.cancel()
+                raise
+        
+        future = loop.create_future()
+        self._pending.append((code, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif len(self._pending) == 1:
+            # Codes asked for in this loop iteration join the same batch
+            loop.call_soon(self._flush)
+        return await future
+    
+    def _flush(self):
+        """Send the codes collected so far, batch_size per request"""
+        pending = [(code, future) for code, future in self._pending if not future.done()]
+        self._pending = []
+        for start in range(0, len(pending), self.batch_size):
+            asyncio.ensure_future(self._send_chunk(pending[start:start + self.batch_size]))
+    
+    async def _send_chunk(self, chunk: List[Tuple[str, asyncio.Future]]):
+        """Parse one chunk on the request threads and resolve each code's future"""
+        chunk = [(code, future) for code, future in chunk if not future.done()]
+        if not chunk:
+            return
+        
+        loop = asyncio.get_running_loop()
+        codes = [code for code, _ in chunk]
+        token = CancelToken()
+        
+        def abandon(_):
+            # The request goes on while any code in it is still wanted
+            if all(future.cancelled() for _, future in chunk):
+                token.cancel()
+        
+        for _, future in chunk:
+            future.add_done_callback(abandon)
+        try:
+            outcomes = await loop.run_in_executor(self._executor, token.run, self._parse_chunk, codes)
+        except RuntimeError as e:
+            # Request threads already shut down
+            error = ProviderError(f"Provider closed: {str(e)}")
+            outcomes = [(code, error) for code in codes]
+        for (_, future), (_, outcome) in zip(chunk, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, ParseError):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+    
+    def close(self):
+        """Drop queued requests and abort those in flight, then close the session"""
+        if hasattr(self, '_executor'):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        super().close()
@@ -0,0 +1,236 @@
+import time
+import socket
+import logging
+import threading
+from typing import Callable, Dict, List
+from urllib.parse import urlsplit
+from requests import Request
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from . import cancel, trace
+
+logger = logging.getLogger(__name__)
+
+class DNSCache:
+    """Resolved addresses per host and port, reused for `ttl` seconds
+    
+    The system resolver does not report record TTLs, so every entry lives
+    for the same fixed time. A host whose cached addresses all fail to
+    connect is dropped and resolved again on the next connection.
+    """
+    
+    def __init__(self, ttl: float = 300, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('hits', 'misses'), 0)
+    
+    def resolve(self, host: str, port: int) -> List[str]:
+        """Addresses for host in resolver order"""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get((host, port))
+            if entry and now < entry[0]:
+                self._counters['hits'] += 1
+                return entry[1]
+            self._counters['misses'] += 1
+        
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._entries[(host, port)] = (now + self.ttl, addresses)
+        return addresses
+    
+    def invalidate(self, host: str, port: int):
+        """Forget the addresses cached for host"""
+        with self._lock:
+            self._entries.pop((host, port), None)
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters, hosts=len(self._entries))
+
+class CachedDNSConnectionMixin:
+    """Connects through the adapter's DNS cache and counts new sockets
+    
+    Only socket creation sees the cached address; TLS server name checks
+    and the Host header keep using the hostname. Each step is timed as a
+    phase of the request being traced, if any, and the connection can be
+    aborted by the cancel token of the call using it. Connect and read
+    timeouts are capped at the time that call has left.
+    """
+    adapter: 'PooledAdapter' = None
+    
+    def _cap_timeout(self):
+        """Lower the timeout urllib3 set for this step to the call's remaining time"""
+        budget = cancel.remaining()
+        if budget is not None:
+            self.timeout = min(self.timeout, budget) if isinstance(self.timeout, (int, float)) else budget
+    
+    def connect(self):
+        cancel.attach(self)
+        self._cap_timeout()
+        # Whatever connect() does beyond opening the socket is the handshake
+        with trace.phase('tls' if isinstance(self, HTTPSConnection) else 'connect'):
+            super().connect()
+        # Cancelled while connecting, before there was a socket to shut down
+        cancel.check()
+    
+    def request(self, *args, **kwargs):
+        cancel.attach(self)
+        trace.attempt()
+        with trace.phase('send'):
+            return super().request(*args, **kwargs)
+    
+    def getresponse(self, *args, **kwargs):
+        cancel.check()
+        # Applied to the socket by getresponse, so it also bounds the body read
+        self._cap_timeout()
+        with trace.phase('wait'):
+            return super().getresponse(*args, **kwargs)
+    
+    def _new_conn(self):
+        host = self._dns_host
+        with trace.phase('dns'):
+            addresses = self.adapter.dns.resolve(host, self.port)
+        try:
+            for index, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    with trace.phase('connect'):
+                        sock = super()._new_conn()
+                    break
+                except Exception:
+                    if index == len(addresses) - 1:
+                        self.adapter.dns.invalidate(host, self.port)
+                        raise
+        finally:
+            self._dns_host = host
+        self.adapter._connection_opened()
+        return sock
+
+class DetachingPoolMixin:
+    """Detaches connections from their call's cancel token as they are returned"""
+    
+    def _put_conn(self, conn):
+        if conn is not None:
+            cancel.detach(conn)
+        super()._put_conn(conn)
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with a DNS cache, pool pre-warming and reuse statistics
+    
+    warm() opens connections to a host ahead of the first request. With a
+    `keep_warm` interval, a background thread opens one again whenever the
+    adapter has sent nothing for that long, before the server's keep-alive
+    timeout would leave the pool with only dead sockets.
+    """
+    
+    def __init__(self, pool_size: int, dns_ttl: float = 300, keep_warm: float = 0, **kwargs):
+        self.dns = DNSCache(dns_ttl)
+        self.keep_warm = keep_warm
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = dict.fromkeys(('requests', 'new_connection_requests', 'connections', 'warmed'), 0)
+        self._last_used = time.monotonic()
+        self._warm_url = None
+        self._warm_verify = True
+        self._warmer = None
+        self._stopped = threading.Event()
+        super().__init__(pool_maxsize=pool_size, **kwargs)
+    
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': self._pool_class(HTTPConnectionPool, HTTPConnection),
+            'https': self._pool_class(HTTPSConnectionPool, HTTPSConnection),
+        }
+    
+    def _pool_class(self, pool_cls, connection_cls):
+        """A pool class whose connections resolve through this adapter's DNS cache"""
+        connection = type(connection_cls.__name__, (CachedDNSConnectionMixin, connection_cls), {'adapter': self})
+        return type(pool_cls.__name__, (DetachingPoolMixin, pool_cls), {'ConnectionCls': connection})
+    
+    def _connection_opened(self):
+        with self._stats_lock:
+            self._counters['connections'] += 1
+        self._local.opened = True
+    
+    def send(self, request, **kwargs):
+        self._local.opened = False
+        self._last_used = time.monotonic()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            with self._stats_lock:
+                self._counters['requests'] += 1
+                if self._local.opened:
+                    self._counters['new_connection_requests'] += 1
+    
+    def warm(self, url: str, connections: int = 1, verify=True) -> int:
+        """Open up to `connections` idle connections to url's host; returns how many
+        
+        verify has to match the session's, as pools are kept per TLS setting.
+        """
+        pool = self._pool_for(url, verify)
+        opened = []
+        try:
+            for _ in range(connections):
+                conn = pool._get_conn(timeout=0)
+                # A dropped keep-alive socket is reconnected here instead of
+                # on the next request
+                if conn.sock is None:
+                    conn.connect()
+                    opened.append(conn)
+                else:
+                    pool._put_conn(conn)
+                    break
+        except Exception as e:
+            logger.info(f"Connection pre-warming for {urlsplit(url).hostname} failed: {str(e)}")
+        finally:
+            for conn in opened:
+                pool._put_conn(conn)
+        
+        with self._stats_lock:
+            self._counters['warmed'] += len(opened)
+        if opened:
+            logger.debug(f"Pre-warmed {len(opened)} connections to {urlsplit(url).hostname}")
+        return len(opened)
+    
+    def _pool_for(self, url: str, verify):
+        """The connection pool send() uses for url"""
+        # requests 2.32 keys pools by TLS settings as well as by host
+        if hasattr(self, 'get_connection_with_tls_context'):
+            return self.get_connection_with_tls_context(Request('GET', url).prepare(), verify)
+        return self.get_connection(url)
+    
+    def warm_in_background(self, url: str, verify=True):
+        """Warm url's host now without blocking, then again after idle periods"""
+        self._warm_url = url
+        self._warm_verify = verify
+        if self._warmer is None:
+            self._warmer = threading.Thread(target=self._keep_warm, name='pool-warmer', daemon=True)
+            self._warmer.start()
+    
+    def _keep_warm(self):
+        self.warm(self._warm_url, verify=self._warm_verify)
+        while self.keep_warm and not self._stopped.wait(self.keep_warm):
+            if time.monotonic() - self._last_used >= self.keep_warm:
+                self.warm(self._warm_url, verify=self._warm_verify)
+                self._last_used = time.monotonic()
+    
+    def stats(self) -> Dict[str, float]:
+        """Request, connection and DNS counters with the share of requests on reused connections"""
+        with self._stats_lock:
+            counters = dict(self._counters)
+        requests = counters['requests']
+        counters['reused'] = requests - counters['new_connection_requests']
+        counters['reuse_ratio'] = counters['reused'] / requests if requests else 0.0
+        counters.update({f'dns_{name}': value for name, value in self.dns.stats().items()})
+        return counters
+    
+    def close(self):
+        self._stopped.set()
+        super().close()
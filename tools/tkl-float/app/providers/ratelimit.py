@@ -0,0 +1,159 @@
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from .cancel import CancelToken
+
+logger = logging.getLogger(__name__)
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header given as seconds or an HTTP date"""
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - (now or datetime.now(timezone.utc))).total_seconds())
+
+class RateLimiter:
+    """Client-side token bucket with an adaptive concurrency limit
+    
+    acquire() blocks until a request may go out. The request must be below
+    the concurrency limit, must have a token from a bucket refilled at `rate`
+    per second (no bucket when rate is 0), and must not fall inside a pause
+    ordered by the provider. release() reports how the request went:
+    - a throttled response halves the limit, once per throttling episode,
+      and pauses every request for its Retry-After, or for a doubling
+      backoff without one, but never longer than max_backoff;
+    - while recent responses are much slower than usual, each response
+      lowers the limit slightly: a short moving average of latency
+      (short_window samples) is compared with a long one (latency_window
+      samples), so single slow responses from normal jitter cut nothing;
+    - any other response raises it slightly, up to max_concurrency.
+    Requests that would have been retried after a 429 queue here instead.
+    """
+    
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None, max_concurrency: int = 4,
+                 min_concurrency: int = 1, slow_factor: float = 2.0, short_window: int = 10,
+                 latency_window: int = 100, max_backoff: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.slow_factor = slow_factor
+        # Exponential moving averages weighted like means over that many samples
+        self._short_weight = 2 / (max(1, short_window) + 1)
+        self._baseline_weight = 2 / (max(1, latency_window) + 1)
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._tokens = self.burst
+        self._refilled_at = clock()
+        self._resume_at = 0.0
+        self._consecutive_throttles = 0
+        self._short_latency = None
+        self._baseline_latency = None
+        self._counters = dict.fromkeys(('requests', 'throttled', 'waits'), 0)
+    
+    @property
+    def limit(self) -> int:
+        """Requests currently allowed in flight"""
+        return max(self.min_concurrency, int(self._limit))
+    
+    def acquire(self, timeout: Optional[float] = None, token: Optional[CancelToken] = None) -> bool:
+        """Block until a request may be sent, or for at most timeout seconds
+        
+        Returns False, taking nothing, if the request may still not go
+        after timeout. token is checked before every wait, so once it is
+        cancelled, a wake() makes acquire raise instead of waiting on.
+        """
+        give_up_at = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            waited = False
+            while True:
+                if token is not None:
+                    token.check()
+                wait = self._wait_time()
+                if wait == 0:
+                    break
+                if give_up_at is not None:
+                    left = give_up_at - self._clock()
+                    if left <= 0:
+                        return False
+                    wait = left if wait is None else min(wait, left)
+                waited = True
+                self._cond.wait(wait)
+            
+            if self.rate:
+                self._tokens -= 1
+            self._in_flight += 1
+            self._counters['requests'] += 1
+            if waited:
+                self._counters['waits'] += 1
+            return True
+    
+    def _wait_time(self) -> Optional[float]:
+        """Seconds until a request may go, None to wait for a release, 0 for now"""
+        now = self._clock()
+        if now < self._resume_at:
+            return self._resume_at - now
+        if self._in_flight >= self.limit:
+            return None
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+        return 0
+    
+    def release(self, latency: Optional[float] = None, throttled: bool = False,
+                retry_after: Optional[float] = None):
+        """Report a finished request; latency only for successful responses"""
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._consecutive_throttles += 1
+                self._counters['throttled'] += 1
+                now = self._clock()
+                # Requests throttled together cut the limit once, not once each
+                if now >= self._resume_at:
+                    self._limit = max(self.min_concurrency, self._limit / 2)
+                if retry_after is None:
+                    retry_after = 2.0 ** (self._consecutive_throttles - 1)
+                # A server asking for minutes would otherwise stall every request for as long
+                retry_after = min(self.max_backoff, retry_after)
+                self._resume_at = max(self._resume_at, now + retry_after)
+                logger.info(f"Throttled by provider: pausing {retry_after:.1f}s, concurrency {self.limit}")
+            elif latency is not None:
+                self._consecutive_throttles = 0
+                if self._short_latency is None:
+                    self._short_latency = self._baseline_latency = latency
+                self._short_latency += (latency - self._short_latency) * self._short_weight
+                self._baseline_latency += (latency - self._baseline_latency) * self._baseline_weight
+                if self._short_latency > self._baseline_latency * self.slow_factor:
+                    self._limit = max(self.min_concurrency, self._limit - 1 / self._limit)
+                else:
+                    self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+    
+    def wake(self):
+        """Make waiting acquire() calls check their token and wait time again"""
+        with self._cond:
+            self._cond.notify_all()
+    
+    def stats(self) -> Dict[str, float]:
+        """Request, throttle and wait counters with the current limit"""
+        with self._cond:
+            return dict(self._counters, limit=self.limit, in_flight=self._in_flight,
+                        paused_for=max(0.0, self._resume_at - self._clock()))
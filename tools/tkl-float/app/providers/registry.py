@@ -0,0 +1,160 @@
+import logging
+import importlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from ..parser import Provider, ParseResult, ParseError
+from ..settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Entry point group third-party packages register providers under
+ENTRY_POINT_GROUP = 'tkl_float.providers'
+
+ProviderFactory = Callable[..., Provider]
+
+class ProviderRegistry:
+    """Provider factories by name, imported the first time one is created
+    
+    A provider is registered as a factory or as a "module:attribute" path;
+    a path whose module starts with a dot is relative to this package.
+    Paths are imported only when the provider is first loaded, so
+    registering one costs nothing. Names not registered directly are
+    looked up among the installed packages' `tkl_float.providers` entry
+    points, which are scanned once, on the first miss.
+    """
+    
+    def __init__(self, providers: Iterable[Tuple[str, Union[str, ProviderFactory]]] = ()):
+        self._lock = threading.Lock()
+        self._targets: Dict[str, Union[str, ProviderFactory]] = {}
+        self._loaded: Dict[str, ProviderFactory] = {}
+        self._entry_points = None
+        for name, target in providers:
+            self.register(name, target)
+    
+    def register(self, name: str, target: Union[str, ProviderFactory]):
+        """Register a provider factory or "module:attribute" path under name"""
+        if not name:
+            raise ValueError("Provider needs a name")
+        if isinstance(target, str) and ':' not in target:
+            raise ValueError(f"Provider path must be module:attribute: {target!r}")
+        with self._lock:
+            if name in self._targets:
+                raise ValueError(f"Provider already registered: {name}")
+            self._targets[name] = target
+        logger.debug(f"Registered provider {name}")
+    
+    def names(self) -> List[str]:
+        """Every registered and entry point provider name"""
+        with self._lock:
+            return list(dict.fromkeys([*self._targets, *self._discover()]))
+    
+    def _discover(self) -> Dict[str, object]:
+        """Entry points in ENTRY_POINT_GROUP by name; called with the lock held"""
+        if self._entry_points is None:
+            from importlib.metadata import entry_points
+            try:
+                found = entry_points(group=ENTRY_POINT_GROUP)
+            except TypeError:
+                # Python before 3.10
+                found = entry_points().get(ENTRY_POINT_GROUP, ())
+            self._entry_points = {entry_point.name: entry_point for entry_point in found}
+        return self._entry_points
+    
+    def load(self, name: str) -> ProviderFactory:
+        """The factory for name, importing it on first use"""
+        with self._lock:
+            factory = self._loaded.get(name)
+            if factory is not None:
+                return factory
+            target = self._targets.get(name)
+            if target is None:
+                target = self._discover().get(name)
+            if target is None:
+                raise KeyError(f"Unknown provider: {name}")
+            
+            if isinstance(target, str):
+                module, _, attribute = target.partition(':')
+                factory = getattr(importlib.import_module(module, __package__), attribute)
+            elif hasattr(target, 'load'):
+                factory = target.load()
+            else:
+                factory = target
+            self._loaded[name] = factory
+        logger.info(f"Loaded provider {name}")
+        return factory
+    
+    def create(self, name: str, **kwargs) -> 'LazyProvider':
+        """A provider for name that is imported and built on first use"""
+        with self._lock:
+            known = name in self._targets or name in self._discover()
+        if not known:
+            raise KeyError(f"Unknown provider: {name}")
+        return LazyProvider(self, name, kwargs)
+
+class LazyProvider(Provider):
+    """Stands in for a registered provider until it is first needed
+    
+    The first parse or warm_up imports and builds the provider; closing a
+    provider never built does nothing.
+    """
+    
+    def __init__(self, registry: ProviderRegistry, name: str, kwargs: Optional[Dict] = None):
+        self.registry = registry
+        self.name = name
+        self.kwargs = kwargs or {}
+        self._provider: Optional[Provider] = None
+        self._listener = None
+        self._lock = threading.Lock()
+    
+    @property
+    def provider(self) -> Provider:
+        """The provider, built on first access"""
+        if self._provider is None:
+            with self._lock:
+                if self._provider is None:
+                    provider = self.registry.load(self.name)(**self.kwargs)
+                    if self._listener is not None:
+                        provider.set_state_listener(self._listener)
+                    self._provider = provider
+        return self._provider
+    
+    def get_name(self) -> str:
+        return self._provider.get_name() if self._provider is not None else self.name
+    
+    def parse(self, code: str) -> ParseResult:
+        """Parse a taokouling code with the provider"""
+        return self.provider.parse(code)
+    
+    async def parse_async(self, code: str) -> ParseResult:
+        """Parse a taokouling code with the provider"""
+        return await self.provider.parse_async(code)
+    
+    def parse_many(self, codes: Iterable[str]) -> List[Tuple[str, Union[ParseResult, ParseError]]]:
+        """Parse codes with the provider's own batching"""
+        return self.provider.parse_many(codes)
+    
+    def warm_up(self):
+        """Build the provider and warm it up"""
+        self.provider.warm_up()
+    
+    def set_state_listener(self, listener: Optional[Callable[[str], None]]):
+        """Pass listener on to the provider, now or once it is built"""
+        self._listener = listener
+        if self._provider is not None:
+            self._provider.set_state_listener(listener)
+    
+    def close(self):
+        """Close the provider if it was built"""
+        if self._provider is not None:
+            self._provider.close()
+
+PROVIDERS = ProviderRegistry([
+    ('lottefuture', '.lottefuture:AsyncLotteFutureProvider'),
+])
+
+# Providers added through LT_PROVIDER_PLUGINS without packaging them
+for name, target in settings.provider_plugins:
+    try:
+        PROVIDERS.register(name, target)
+    except ValueError as e:
+        logger.warning(f"Ignoring LT_PROVIDER_PLUGINS entry {name}: {str(e)}")
@@ -0,0 +1,165 @@
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Union
+from ..parser import ParseResult
+from ..settings import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    code TEXT PRIMARY KEY,
+    item_id TEXT NOT NULL,
+    item_url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at);
+"""
+
+class StoredResult(NamedTuple):
+    """A persisted result with wall-clock freshness bounds"""
+    code: str
+    result: ParseResult
+    fresh_until: float
+    stale_until: float
+
+class SQLiteResultStore:
+    """On-disk parse result cache in a WAL-mode SQLite database
+    
+    Reads go straight to the database and see every committed write. Writes
+    are queued and committed by a background thread, one transaction per
+    burst of up to `batch_size` results, so callers never wait on the disk.
+    The same thread deletes rows past their stale time every
+    `compact_interval` seconds.
+    """
+    
+    def __init__(self, path: Union[str, Path], batch_size: int = 256,
+                 compact_interval: float = 3600, clock: Callable[[], float] = time.time):
+        self.path = str(path)
+        self.batch_size = max(1, batch_size)
+        self.compact_interval = max(1, compact_interval)
+        self._clock = clock
+        
+        writer = self._connect()
+        writer.executescript(SCHEMA)
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, args=(writer,),
+                                        name='result-store', daemon=True)
+        self._writer.start()
+    
+    @classmethod
+    def open_default(cls) -> Optional['SQLiteResultStore']:
+        """The store next to the logs directory, or None when disabled or unavailable"""
+        if not settings.cache_persist:
+            return None
+        path = settings.data_dir / 'cache.db'
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            return cls(path)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Persistent result cache unavailable at {path}: {str(e)}")
+            return None
+    
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent; a crash may only lose the last commits
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+    
+    def get(self, code: str) -> Optional[StoredResult]:
+        """The stored result for code, if it has not passed its stale time"""
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT code, item_id, item_url, title, provider, fresh_until, stale_until "
+                "FROM results WHERE code = ? AND stale_until > ?", (code, self._clock())).fetchone()
+        return self._to_stored(row) if row else None
+    
+    def load_recent(self, limit: int) -> List[StoredResult]:
+        """Up to `limit` unexpired results, most recently stored first"""
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT code, item_id, item_url, title, provider, fresh_until, stale_until "
+                "FROM results WHERE stale_until > ? ORDER BY stored_at DESC LIMIT ?",
+                (self._clock(), limit)).fetchall()
+        return [self._to_stored(row) for row in rows]
+    
+    def _to_stored(self, row) -> StoredResult:
+        code, item_id, item_url, title, provider, fresh_until, stale_until = row
+        return StoredResult(code, ParseResult(item_id, item_url, title, provider), fresh_until, stale_until)
+    
+    def put(self, code: str, result: ParseResult, fresh_until: float, stale_until: float):
+        """Queue a result for writing"""
+        self._queue.put((code, result.item_id, result.item_url, result.title, result.provider,
+                         self._clock(), fresh_until, stale_until))
+    
+    def flush(self):
+        """Block until every queued write is committed"""
+        self._queue.join()
+    
+    def _write_loop(self, connection: sqlite3.Connection):
+        """Commit queued writes in batches and compact on schedule"""
+        next_compaction = time.monotonic()
+        while True:
+            timeout = max(0, next_compaction - time.monotonic())
+            try:
+                rows = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                rows = []
+            
+            # Everything already queued joins the same transaction
+            while rows and rows[-1] is not None and len(rows) < self.batch_size:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            closing = bool(rows) and rows[-1] is None
+            batch = [row for row in rows if row is not None]
+            try:
+                if batch:
+                    with connection:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                if time.monotonic() >= next_compaction:
+                    self.compact()
+                    next_compaction = time.monotonic() + self.compact_interval
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write {len(batch)} cached results: {str(e)}")
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+            
+            if closing:
+                connection.close()
+                return
+    
+    def compact(self) -> int:
+        """Delete rows past their stale time and fold the WAL back into the database"""
+        with self._read_lock, self._reader:
+            deleted = self._reader.execute(
+                "DELETE FROM results WHERE stale_until <= ?", (self._clock(),)).rowcount
+        with self._read_lock:
+            self._reader.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if deleted:
+            logger.info(f"Compacted result cache: {deleted} expired entries removed")
+        return deleted
+    
+    def close(self):
+        """Commit queued writes and close the database"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        with self._read_lock:
+            self._reader.close()
@@ -0,0 +1,238 @@
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Phases of a request in the order they happen; a phase covers all attempts
+PHASES = ('queue', 'dns', 'connect', 'tls', 'send', 'wait', 'download', 'decode')
+
+# Histogram bucket upper bounds in milliseconds; slower samples fall in an open last bucket
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+# The trace of the request running on each thread
+_local = threading.local()
+
+class LatencyHistogram:
+    """Latencies counted in fixed buckets, with percentiles estimated from them
+    
+    Each bucket also keeps the smallest and largest sample it holds, so a
+    percentile is interpolated between samples actually seen rather than
+    between the bucket bounds.
+    """
+    
+    def __init__(self, bounds: Sequence[float] = BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.lows = [0.0] * len(self.counts)
+        self.highs = [0.0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+    
+    def record(self, ms: float):
+        index = bisect_left(self.bounds, ms)
+        if self.counts[index]:
+            self.lows[index] = min(self.lows[index], ms)
+            self.highs[index] = max(self.highs[index], ms)
+        else:
+            self.lows[index] = self.highs[index] = ms
+        self.counts[index] += 1
+        self.min = ms if not self.count else min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.count += 1
+        self.total += ms
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile in ms, interpolated within its bucket; None when empty"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low, high = self.lows[index], self.highs[index]
+                return low + (high - low) * max(0.0, rank - seen) / count
+            seen += count
+        return self.max
+    
+    def to_dict(self) -> Dict[str, object]:
+        summary = {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'min': round(self.min, 3),
+            'max': round(self.max, 3),
+        }
+        for p in (50, 90, 95, 99):
+            value = self.percentile(p)
+            summary[f'p{p}'] = round(value, 3) if value is not None else None
+        # Cumulative counts, as in Prometheus histograms
+        buckets, running = {}, 0
+        for bound, count in zip((*self.bounds, 'inf'), self.counts):
+            running += count
+            buckets[f'le_{bound}'] = running
+        summary['buckets'] = buckets
+        return summary
+
+class RequestTrace:
+    """Phase timings, attempts and outcome of one request
+    
+    Phases nest: time in a phase started inside another counts only
+    towards the inner one, so the phases add up to at most the total. The
+    rest, under `other`, is retry backoff and time in requests itself.
+    Only the phases that ran are in `phases`; a request on a reused
+    connection has no dns, connect or tls phase.
+    """
+    
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started_at = time.time()
+        self.phases: Dict[str, float] = {}
+        self.attempts = 0
+        self.throttled = 0
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.total = 0.0
+        # Time spent in nested phases, one entry per open phase
+        self._nested: List[float] = []
+    
+    def to_dict(self) -> Dict[str, object]:
+        phases = {name: round(self.phases.get(name, 0.0) * 1000, 3) for name in PHASES}
+        phases['other'] = round(max(0.0, self.total - sum(self.phases.values())) * 1000, 3)
+        return {
+            'endpoint': self.endpoint,
+            'started_at': self.started_at,
+            'total_ms': round(self.total * 1000, 3),
+            'phases_ms': phases,
+            'attempts': self.attempts,
+            'throttled': self.throttled,
+            'status': self.status,
+            'error': self.error,
+        }
+
+def current() -> Optional[RequestTrace]:
+    """The trace of the request running on this thread, if any"""
+    return getattr(_local, 'trace', None)
+
+@contextmanager
+def phase(name: str):
+    """Time the block as phase name of the current request; does nothing outside one"""
+    trace = current()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    trace._nested.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        trace.phases[name] = trace.phases.get(name, 0.0) + elapsed - trace._nested.pop()
+        if trace._nested:
+            trace._nested[-1] += elapsed
+
+def attempt():
+    """Count an HTTP attempt, retries included, for the current request"""
+    trace = current()
+    if trace is not None:
+        trace.attempts += 1
+
+class RequestTracer:
+    """Per-endpoint latency histograms and counters of a provider's requests
+    
+    trace() wraps one request; the connection pool and provider report its
+    phases through phase() and attempt() on the same thread. The last
+    `keep` traces are kept whole for dumping.
+    """
+    
+    def __init__(self, keep: int = 200):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, object]] = {}
+        self._recent = deque(maxlen=keep)
+    
+    @contextmanager
+    def trace(self, endpoint: str):
+        """Trace the request made in the block"""
+        trace = RequestTrace(endpoint)
+        outer = current()
+        _local.trace = trace
+        started = time.perf_counter()
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = getattr(e, 'error_type', type(e).__name__)
+            raise
+        finally:
+            trace.total = time.perf_counter() - started
+            _local.trace = outer
+            self._record(trace)
+    
+    def _record(self, trace: RequestTrace):
+        with self._lock:
+            endpoint = self._endpoints.get(trace.endpoint)
+            if endpoint is None:
+                endpoint = self._endpoints[trace.endpoint] = {
+                    'counters': dict.fromkeys(('requests', 'attempts', 'retries', 'throttled'), 0),
+                    'statuses': {},
+                    'errors': {},
+                    'latency': {name: LatencyHistogram() for name in ('total', *PHASES)},
+                }
+            counters = endpoint['counters']
+            counters['requests'] += 1
+            counters['attempts'] += trace.attempts
+            counters['retries'] += max(0, trace.attempts - 1)
+            counters['throttled'] += trace.throttled
+            if trace.status is not None:
+                endpoint['statuses'][trace.status] = endpoint['statuses'].get(trace.status, 0) + 1
+            if trace.error:
+                endpoint['errors'][trace.error] = endpoint['errors'].get(trace.error, 0) + 1
+            latency = endpoint['latency']
+            latency['total'].record(trace.total * 1000)
+            # Phases that did not run would only drag the percentiles to zero
+            for name, seconds in trace.phases.items():
+                latency[name].record(seconds * 1000)
+            self._recent.append(trace)
+        
+        logger.debug(f"{trace.endpoint} took {trace.total * 1000:.1f}ms over {trace.attempts} attempts: "
+                     + ", ".join(f"{name} {seconds * 1000:.1f}ms"
+                                 for name, seconds in trace.phases.items()))
+    
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Counters, status codes, errors and latency histograms in ms by endpoint"""
+        with self._lock:
+            return {
+                name: {
+                    **endpoint['counters'],
+                    'statuses': dict(endpoint['statuses']),
+                    'errors': dict(endpoint['errors']),
+                    'latency_ms': {phase: histogram.to_dict()
+                                   for phase, histogram in endpoint['latency'].items()},
+                }
+                for name, endpoint in self._endpoints.items()
+            }
+    
+    def recent(self) -> List[Dict[str, object]]:
+        """The last traces kept, oldest first"""
+        with self._lock:
+            return [trace.to_dict() for trace in self._recent]
+    
+    def dump(self, path) -> Path:
+        """Write stats() and recent() to path as JSON"""
+        path = Path(path)
+        report = {
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'endpoints': self.stats(),
+            'recent': self.recent(),
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Wrote request traces to {path}")
+        return path
@@ -12,6 +12,25 @@ class Settings:
         self.app_secret = ""
         self.invite_code = ""
         self.timeout = 30
+        self.batch_deadline = 10.0
+        self.concurrency = 4
+        self.rate_limit = 0.0
+        self.batch_size = 1
+        self.dns_ttl = 300
+        self.keep_warm = 45
+        self.breaker_threshold = 5
+        self.breaker_reset = 30
+        self.trace_file = ''
+        self.hedge_percentile = 95.0
+        self.hedge_max_extra = 0.05
+        self.providers = ['lottefuture']
+        self.provider_plugins = []
+        self.cache_size = 1024
+        self.cache_ttl = 600
+        self.cache_stale_ttl = 3600
+        self.cache_negative_ttl = 30
+        self.cache_persist = True
+        self.extra_formats = []
         self.load_env()
     
     def load_env(self):
@@ -45,6 +64,25 @@ class Settings:
         self.app_secret = os.getenv('LT_APP_SECRET', '')
         self.invite_code = os.getenv('LT_INVITE_CODE', '')
         self.timeout = int(os.getenv('LT_TIMEOUT', '30'))
+        self.batch_deadline = float(os.getenv('LT_BATCH_DEADLINE', '10'))
+        self.concurrency = int(os.getenv('LT_CONCURRENCY', '4'))
+        self.rate_limit = float(os.getenv('LT_RATE_LIMIT', '0'))
+        self.batch_size = int(os.getenv('LT_BATCH_SIZE', '1'))
+        self.dns_ttl = int(os.getenv('LT_DNS_TTL', '300'))
+        self.keep_warm = int(os.getenv('LT_KEEP_WARM', '45'))
+        self.breaker_threshold = int(os.getenv('LT_BREAKER_THRESHOLD', '5'))
+        self.breaker_reset = int(os.getenv('LT_BREAKER_RESET', '30'))
+        self.trace_file = os.getenv('LT_TRACE_FILE', '')
+        self.hedge_percentile = float(os.getenv('LT_HEDGE_PERCENTILE', '95'))
+        self.hedge_max_extra = float(os.getenv('LT_HEDGE_MAX_EXTRA', '0.05'))
+        self.providers = [name.strip() for name in os.getenv('LT_PROVIDERS', 'lottefuture').split(',') if name.strip()]
+        self.provider_plugins = self.parse_plugins(os.getenv('LT_PROVIDER_PLUGINS', ''))
+        self.cache_size = int(os.getenv('LT_CACHE_SIZE', '1024'))
+        self.cache_ttl = int(os.getenv('LT_CACHE_TTL', '600'))
+        self.cache_stale_ttl = int(os.getenv('LT_CACHE_STALE_TTL', '3600'))
+        self.cache_negative_ttl = int(os.getenv('LT_CACHE_NEGATIVE_TTL', '30'))
+        self.cache_persist = os.getenv('LT_CACHE_PERSIST', '1') != '0'
+        self.extra_formats = self.parse_formats(os.getenv('LT_EXTRA_FORMATS', ''))
         
         # Validate required settings
         missing = [key for key, value in [
@@ -57,6 +95,45 @@ class Settings:
         if missing:
             logger.warning(f"Missing environment variables: {', '.join(missing)}")
     
+    @property
+    def data_dir(self) -> Path:
+        """%APPDATA%/tkl-float when available, else the per-user XDG data directory"""
+        appdata = os.environ.get('APPDATA', '')
+        if appdata:
+            return Path(appdata) / 'tkl-float'
+        # $XDG_DATA_HOME must be absolute to count; it defaults to ~/.local/share
+        data_home = os.environ.get('XDG_DATA_HOME', '')
+        if not os.path.isabs(data_home):
+            data_home = Path.home() / '.local' / 'share'
+        return Path(data_home) / 'tkl-float'
+    
+    def parse_formats(self, value: str):
+        """Parse extra taokouling formats given as family:opener[:closer],..."""
+        formats = []
+        for entry in (part.strip() for part in value.split(',')):
+            if not entry:
+                continue
+            parts = entry.split(':')
+            if len(parts) not in (2, 3) or not all(parts):
+                logger.warning(f"Ignoring malformed LT_EXTRA_FORMATS entry: {entry}")
+                continue
+            # Closer defaults to the opener
+            formats.append((parts[0], parts[1], parts[-1]))
+        return formats
+    
+    def parse_plugins(self, value: str):
+        """Parse extra providers given as name=module:attribute,..."""
+        plugins = []
+        for entry in (part.strip() for part in value.split(',')):
+            if not entry:
+                continue
+            name, _, target = entry.partition('=')
+            if not name or ':' not in target:
+                logger.warning(f"Ignoring malformed LT_PROVIDER_PLUGINS entry: {entry}")
+                continue
+            plugins.append((name.strip(), target.strip()))
+        return plugins
+    
     def get_config(self):
         """Get configuration dictionary (with secrets redacted for logging)"""
         return {
@@ -64,7 +141,26 @@ class Settings:
             'app_key': self.app_key[:4] + '***' if self.app_key else '',
             'app_secret': self.app_secret[:4] + '***' if self.app_secret else '',
             'invite_code': self.invite_code[:4] + '***' if self.invite_code else '',
-            'timeout': self.timeout
+            'timeout': self.timeout,
+            'batch_deadline': self.batch_deadline,
+            'concurrency': self.concurrency,
+            'rate_limit': self.rate_limit,
+            'batch_size': self.batch_size,
+            'dns_ttl': self.dns_ttl,
+            'keep_warm': self.keep_warm,
+            'breaker_threshold': self.breaker_threshold,
+            'breaker_reset': self.breaker_reset,
+            'trace_file': self.trace_file,
+            'hedge_percentile': self.hedge_percentile,
+            'hedge_max_extra': self.hedge_max_extra,
+            'providers': self.providers,
+            'provider_plugins': self.provider_plugins,
+            'cache_size': self.cache_size,
+            'cache_ttl': self.cache_ttl,
+            'cache_stale_ttl': self.cache_stale_ttl,
+            'cache_negative_ttl': self.cache_negative_ttl,
+            'cache_persist': self.cache_persist,
+            'extra_formats': self.extra_formats
         }
 
 settings = Settings()
\ No newline at end of file
@@ -8,11 +8,15 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, QTimer, Signal
 from PySide6.QtGui import QIcon, QAction, QClipboard, QPixmap
-from .worker import ParseWorker, ClipboardWorker
-from .parser import ParseResult
+from .worker import ParseService, ClipboardWorker, INTERACTIVE, BACKGROUND
+from .parser import ParseResult, TaokoulingParser, FORMAT_REGISTRY
+from .settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Longest quit waits for the parse service thread to finish
+SERVICE_STOP_TIMEOUT_MS = 2000
+
 class MainWindow(QMainWindow):
     """Main application window"""
     
@@ -21,12 +25,18 @@ class MainWindow(QMainWindow):
     
     def __init__(self):
         super().__init__()
-        self.parse_worker = None
+        self.parse_service = None
+        # Batches whose outcomes are shown, and the user's latest one
+        self.open_batches = set()
+        self.interactive_batch = 0
+        self.unfinished_count = 0
         self.clipboard_worker = None
         self.clipboard_enabled = True
+        self.parser = TaokoulingParser()
         self.init_ui()
         self.init_tray()
         self.init_hotkey()
+        self.init_parse_service()
         self.init_clipboard_monitoring()
     
     def init_ui(self):
@@ -86,6 +96,11 @@ class MainWindow(QMainWindow):
         self.status_label = QLabel("就绪")
         self.statusBar().addWidget(self.status_label)
         
+        # Provider availability, shown only while requests are held back
+        self.provider_label = QLabel()
+        self.provider_label.hide()
+        self.statusBar().addPermanentWidget(self.provider_label)
+        
         # Style
         self.setStyleSheet("""
             QMainWindow {
@@ -178,6 +193,17 @@ class MainWindow(QMainWindow):
             logger.warning(f"Failed to register global hotkey: {str(e)}")
             self.show_hotkey_help()
     
+    def init_parse_service(self):
+        """Start the parse service shared by every parse"""
+        self.parse_service = ParseService()
+        self.parse_service.result_ready.connect(self.on_parse_result)
+        self.parse_service.error_occurred.connect(self.on_parse_error)
+        self.parse_service.progress_updated.connect(self.on_parse_progress)
+        self.parse_service.codes_unfinished.connect(self.on_codes_unfinished)
+        self.parse_service.batch_finished.connect(self.on_parsing_finished)
+        self.parse_service.provider_state_changed.connect(self.on_provider_state_changed)
+        self.parse_service.start()
+    
     def init_clipboard_monitoring(self):
         """Initialize clipboard monitoring"""
         self.clipboard_worker = ClipboardWorker()
@@ -192,58 +218,92 @@ class MainWindow(QMainWindow):
             self.show_error("请输入淘口令")
             return
         
-        # Extract codes from input
-        from .parser import TaokoulingParser
-        parser = TaokoulingParser()
-        codes = parser.extract_codes(text)
+        # Extract codes from input; item links in it resolve without the API
+        codes, local_results, _ = self.parser.resolve_local(text)
         
-        if not codes:
+        if not codes and not local_results:
             self.show_error("未检测到有效的淘口令格式")
             return
         
         # Start parsing
-        self.start_parsing(codes)
+        if local_results:
+            self.start_parsing(codes, local_results)
+        else:
+            self.start_parsing(codes)
     
-    def start_parsing(self, codes):
-        """Start parsing codes in background"""
-        if self.parse_worker and self.parse_worker.isRunning():
-            self.parse_worker.stop()
-        
-        self.parse_worker = ParseWorker()
-        self.parse_worker.set_codes(codes)
-        self.parse_worker.result_ready.connect(self.on_parse_result)
-        self.parse_worker.error_occurred.connect(self.on_parse_error)
-        self.parse_worker.progress_updated.connect(self.on_parse_progress)
-        self.parse_worker.finished.connect(self.on_parsing_finished)
-        
-        self.parse_button.setEnabled(False)
-        self.parse_button.setText("解析中...")
-        self.status_label.setText(f"正在解析 {len(codes)} 个淘口令...")
-        
-        self.parse_worker.start()
+    def start_parsing(self, codes, local_results=None, priority=INTERACTIVE):
+        """Queue codes for parsing; the user's parses go ahead of clipboard ones and replace their previous one"""
+        batch_id = self.parse_service.submit(codes, local_results, priority)
+        if not self.open_batches:
+            self.unfinished_count = 0
+        self.open_batches.add(batch_id)
+        
+        if priority == INTERACTIVE:
+            # The service drops the previous interactive batch, so its late outcomes are not shown
+            self.open_batches.discard(self.interactive_batch)
+            self.interactive_batch = batch_id
+            self.parse_button.setEnabled(False)
+            self.parse_button.setText("解析中...")
+        if codes:
+            self.status_label.setText(f"正在解析 {len(codes)} 个淘口令...")
     
-    def on_parse_result(self, result: ParseResult):
+    def on_parse_result(self, batch_id: int, result: ParseResult):
         """Handle successful parse result"""
+        if batch_id not in self.open_batches:
+            return
         self.results_text.append(str(result))
         self.results_text.append("-" * 40)
     
-    def on_parse_error(self, error_type: str, message: str):
+    def on_parse_error(self, batch_id: int, error_type: str, message: str):
         """Handle parse error"""
+        if batch_id not in self.open_batches:
+            return
         error_msg = self.get_user_friendly_error(error_type, message)
         self.results_text.append(f"❌ {error_msg}")
         self.results_text.append("-" * 40)
     
-    def on_parse_progress(self, message: str):
+    def on_parse_progress(self, batch_id: int, message: str):
         """Handle parse progress update"""
+        if batch_id not in self.open_batches:
+            return
         self.status_label.setText(message)
     
-    def on_parsing_finished(self):
+    def on_codes_unfinished(self, batch_id: int, codes: list):
+        """List the codes the batch deadline cut off"""
+        if batch_id not in self.open_batches:
+            return
+        self.unfinished_count += len(codes)
+        self.results_text.append(f"⏱ {self.get_user_friendly_error('deadline_exceeded', '')}：")
+        for code in codes:
+            self.results_text.append(code)
+        self.results_text.append("-" * 40)
+    
+    def on_parsing_finished(self, batch_id: int):
         """Handle parsing finished"""
-        self.parse_button.setEnabled(True)
-        self.parse_button.setText("解析")
-        self.status_label.setText("就绪")
+        if batch_id not in self.open_batches:
+            return
+        self.open_batches.discard(batch_id)
+        if batch_id == self.interactive_batch:
+            self.parse_button.setEnabled(True)
+            self.parse_button.setText("解析")
+        if self.open_batches:
+            # Clipboard batches paused or queued behind this one still run
+            return
+        if self.unfinished_count:
+            self.status_label.setText(f"已超时，{self.unfinished_count} 个淘口令未完成")
+        else:
+            self.status_label.setText("就绪")
     
-    def on_codes_detected(self, codes):
+    def on_provider_state_changed(self, state: str):
+        """Show whether requests to the provider are paused by the circuit breaker"""
+        states = {
+            "open": "⚠ 服务暂时不可用",
+            "half_open": "正在检测服务...",
+        }
+        self.provider_label.setText(states.get(state, ""))
+        self.provider_label.setVisible(state in states)
+    
+    def on_codes_detected(self, codes, resolution=None):
         """Handle detected codes from clipboard"""
         if not self.clipboard_enabled:
             return
@@ -254,9 +314,13 @@ class MainWindow(QMainWindow):
             if len(codes) > 1:
                 self.status_label.setText(f"检测到 {len(codes)} 个淘口令")
             
-            # Auto-parse if enabled
+            # Auto-parse if enabled; codes already answered by item links in
+            # the text need no provider call
             if self.clipboard_enabled and self.isVisible():
-                self.start_parsing(codes)
+                if resolution and resolution.results:
+                    self.start_parsing(resolution.codes, resolution.results, BACKGROUND)
+                else:
+                    self.start_parsing(codes, priority=BACKGROUND)
     
     def on_clipboard_error(self, error_message: str):
         """Handle clipboard monitoring error"""
@@ -320,6 +384,8 @@ class MainWindow(QMainWindow):
             "no_permission": "没有权限访问",
             "rate_limited": "请求过于频繁，请稍后再试",
             "network_error": "网络连接错误",
+            "circuit_open": "服务暂时不可用，稍后自动重试",
+            "deadline_exceeded": "解析超时，未完成",
             "provider_error": "服务提供商错误"
         }
         
@@ -327,8 +393,10 @@ class MainWindow(QMainWindow):
     
     def quit_application(self):
         """Quit the application"""
-        if self.parse_worker and self.parse_worker.isRunning():
-            self.parse_worker.stop()
+        if self.parse_service and self.parse_service.isRunning():
+            self.parse_service.stop()
+            # Requests in flight are aborted rather than waited out, so this is short
+            self.parse_service.wait(SERVICE_STOP_TIMEOUT_MS)
         
         if self.clipboard_worker and self.clipboard_worker.isRunning():
             self.clipboard_worker.stop()
@@ -356,6 +424,9 @@ class TaokoulingApp(QApplication):
         # Setup logging
         self.setup_logging()
         
+        # Register extra taokouling formats before any parsing starts
+        self.register_formats()
+        
         # Create main window
         self.main_window = MainWindow()
         self.main_window.show()
@@ -366,12 +437,7 @@ class TaokoulingApp(QApplication):
         from logging.handlers import RotatingFileHandler
         
         # Create logs directory
-        appdata = os.environ.get('APPDATA', '')
-        if appdata:
-            log_dir = os.path.join(appdata, 'tkl-float', 'logs')
-        else:
-            log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-        
+        log_dir = str(settings.data_dir / 'logs')
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, 'app.log')
         
@@ -387,6 +453,14 @@ class TaokoulingApp(QApplication):
         
         # Redact secrets in logs
         logging.getLogger().addFilter(SecretRedactionFilter())
+    
+    def register_formats(self):
+        """Register extra delimiter formats configured in settings"""
+        for family, opener, closer in settings.extra_formats:
+            try:
+                FORMAT_REGISTRY.register(family, opener, closer)
+            except ValueError as e:
+                logger.warning(f"Skipping taokouling format {family}: {str(e)}")
 
 class SecretRedactionFilter(logging.Filter):
     """Filter to redact secrets in log messages"""
@@ -402,6 +476,6 @@ class SecretRedactionFilter(logging.Filter):
                 if pattern in msg.lower():
                     # Redact sensitive information
                     import re
-                    msg = re.sub(rf'{pattern}[=:]\s*[^\s,}]+', f'{pattern}=***', msg, flags=re.IGNORECASE)
+                    msg = re.sub(rf'{pattern}[=:]\s*[^\s,}}]+', f'{pattern}=***', msg, flags=re.IGNORECASE)
                     record.msg = msg
         return True
\ No newline at end of file
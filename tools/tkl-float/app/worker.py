@@ -1,84 +1,391 @@
+import time
+import asyncio
+import functools
 import logging
+import threading
+from itertools import chain
 from PySide6.QtCore import QThread, Signal
-from typing import List, Optional, Dict
-from ..parser import TaokoulingParser, ParseResult, ParseError
-from ..providers.lottefuture import LotteFutureProvider
+from typing import Dict, Iterator, List, Optional, Set
+from .parser import TaokoulingParser, ParseResult, ParseError, DeadlineExceededError, Provider
+from .providers.cancel import deadline
+from .providers.cache import CachingProvider
+from .providers.coalesce import CoalescingProvider
+from .providers.hedge import HedgingProvider
+from .providers.registry import PROVIDERS
+from .providers.store import SQLiteResultStore
+from .settings import settings
 
 logger = logging.getLogger(__name__)
 
-class ParseWorker(QThread):
-    """Worker thread for parsing taokouling codes"""
+# Job priorities, most urgent first
+INTERACTIVE = 0  # asked for by the user: parse button, hotkey
+BACKGROUND = 1  # started on its own: clipboard detection
+
+# Seconds after start before the provider is built and warmed up, so
+# launching the app loads no HTTP client
+WARM_UP_DELAY = 2.0
+
+class ParseJob:
+    """A submitted batch and the codes it has yet to report
+    
+    codes are the ones no provider call has been started for yet, and
+    in_flight the ones whose call is running. Codes an interactive job took
+    over from a background one are in the taker's borrowed, mapped to that
+    job, and in the background job's lent until they are reported.
+    """
+    __slots__ = ('batch_id', 'priority', 'codes', 'in_flight', 'borrowed', 'lent',
+                 'local_results', 'total', 'task', 'preempted')
+    
+    def __init__(self, batch_id: int, priority: int, codes: List[str], local_results: List[ParseResult]):
+        self.batch_id = batch_id
+        self.priority = priority
+        self.codes = codes
+        self.in_flight: Set[str] = set()
+        self.borrowed: Dict[str, 'ParseJob'] = {}
+        self.lent: Set[str] = set()
+        self.local_results = local_results
+        self.total = len(codes)
+        self.task: Optional[asyncio.Task] = None
+        self.preempted = False
+    
+    def left(self) -> int:
+        """How many of its codes the job has yet to report"""
+        return len(self.codes) + len(self.in_flight)
+
+class ParseService(QThread):
+    """Long-lived parse service started with the app
+    
+    One asyncio loop in this thread and one provider serve every batch, so a
+    repeat parse reuses the provider's request threads and kept-alive
+    connections instead of paying connection setup again, and codes parsed
+    recently, in this run or an earlier one, are answered from the result
+    cache. Every signal carries the id submit() returned for its batch, and
+    a batch's outcomes all arrive before its batch_finished.
+    
+    Batches run one at a time, INTERACTIVE ones first. An interactive batch
+    replaces the interactive batch submitted before it, and pauses a
+    background batch in progress: that batch starts no more provider calls
+    but still reports the ones running, and resumes with its other codes
+    once no interactive batch is left. Background batches run in the order
+    submitted. Codes already waiting in another batch are merged into it: a
+    batch whose codes are all taken finishes at once, empty. An interactive
+    batch takes over the codes it shares with background batches that have
+    not started a call for them, and hands back the ones it has not reported
+    if it is replaced; a background batch left with only such codes finishes
+    once they are reported. A batch gets `batch_deadline` seconds in all:
+    requests still running then are aborted, the results so far stand, and
+    the codes left are reported through codes_unfinished.
+    """
     
     # Signals
-    result_ready = Signal(object)  # ParseResult
-    error_occurred = Signal(str, str)  # error_type, message
-    progress_updated = Signal(str)  # status message
-    finished = Signal()
+    result_ready = Signal(int, object)  # batch id, ParseResult
+    error_occurred = Signal(int, str, str)  # batch id, error_type, message
+    progress_updated = Signal(int, str)  # batch id, status message
+    batch_finished = Signal(int)  # batch id
+    codes_unfinished = Signal(int, list)  # batch id, codes cut off by the deadline
+    provider_state_changed = Signal(str)  # closed, open or half_open circuit
     
-    def __init__(self, parent=None):
+    def __init__(self, provider: Optional[Provider] = None, parent=None):
         super().__init__(parent)
-        self.codes = []
         self.parser = TaokoulingParser()
-        self.provider = LotteFutureProvider()
-        self._running = False
+        # Cache hits return at once; misses for a code already in flight
+        # share its call, and a call slower than usual is hedged
+        self.provider = provider or CachingProvider(CoalescingProvider(self._configured_provider()),
+                                                    store=SQLiteResultStore.open_default())
+        self.provider.set_state_listener(self.provider_state_changed.emit)
+        self._loop = None
+        self._loop_ready = threading.Event()
+        self._batch_id = 0
+        # Jobs waiting to run, the one running, and paused ones finishing
+        # the calls they started; only touched on the loop thread
+        self._queue: List[ParseJob] = []
+        self._running: Optional[ParseJob] = None
+        self._draining: List[ParseJob] = []
+        self._stopped = False
     
-    def set_codes(self, codes: List[str]):
-        """Set codes to parse"""
-        self.codes = codes
+    def _configured_provider(self) -> Provider:
+        """The LT_PROVIDERS providers, hedged unless hedging is disabled
+        
+        Providers come from the registry and are only imported when first
+        used, so building the service loads no HTTP client.
+        """
+        providers = []
+        for name in settings.providers:
+            try:
+                providers.append(PROVIDERS.create(name))
+            except KeyError:
+                logger.warning(f"Unknown provider in LT_PROVIDERS: {name}")
+        if not providers:
+            providers = [PROVIDERS.create('lottefuture')]
+        
+        if not settings.hedge_percentile:
+            return providers[0]
+        return HedgingProvider(providers, percentile=settings.hedge_percentile,
+                               max_extra=settings.hedge_max_extra)
     
     def run(self):
-        """Execute parsing in background thread"""
-        self._running = True
+        """Run the event loop that drives every batch"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._loop_ready.set()
         
-        if not self.codes:
-            self.error_occurred.emit("invalid_input", "No codes to parse")
-            self.finished.emit()
+        # Off the GUI thread once startup is over; a batch submitted sooner
+        # builds the provider itself
+        loop.call_later(WARM_UP_DELAY, self._warm_up)
+        try:
+            loop.run_forever()
+        finally:
+            # Let cancelled batches unwind, as asyncio.run does
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+            # Here rather than in stop(), so aborting requests never holds up the GUI thread
+            self.provider.close()
+    
+    def _warm_up(self):
+        """Pre-warm connections and preload stored results into the cache"""
+        try:
+            self.provider.warm_up()
+        except Exception as e:
+            logger.warning(f"Failed to warm up provider: {str(e)}")
+    
+    def submit(self, codes: List[str], local_results: Optional[List[ParseResult]] = None,
+               priority: int = INTERACTIVE) -> int:
+        """Queue a batch at priority and return its id"""
+        self._loop_ready.wait()
+        self._batch_id += 1
+        job = ParseJob(self._batch_id, priority, list(codes), list(local_results or []))
+        self._loop.call_soon_threadsafe(self._enqueue, job)
+        return job.batch_id
+    
+    def _enqueue(self, job: ParseJob):
+        """Merge a submitted job with the pending ones and queue it"""
+        had_codes = bool(job.codes)
+        if not had_codes and not job.local_results:
+            self.error_occurred.emit(job.batch_id, "invalid_input", "No codes to parse")
+            self.batch_finished.emit(job.batch_id)
             return
+        job.codes = list(dict.fromkeys(self._valid_codes(job)))
+        job.total = len(job.codes)
+        if not job.codes and not job.local_results:
+            self.batch_finished.emit(job.batch_id)
+            return
+        if job.priority == INTERACTIVE:
+            # Dropped first, so the codes they took over can be taken again
+            for other in self._pending_jobs():
+                if other.priority == INTERACTIVE:
+                    self._drop(other)
+            # This job resolves them sooner; calls already started are left to finish
+            shared = set(job.codes)
+            for other in self._pending_jobs():
+                taken = [code for code in other.codes if code in shared] if other.priority == BACKGROUND else []
+                if taken:
+                    other.codes = [code for code in other.codes if code not in shared]
+                    other.lent.update(taken)
+                    job.borrowed.update(dict.fromkeys(taken, other))
+        else:
+            self._without_pending(job)
         
-        logger.info(f"Starting to parse {len(self.codes)} codes")
-        
-        for i, code in enumerate(self.codes):
-            if not self._running:
-                break
-            
+        if had_codes and not job.codes and not job.local_results:
+            logger.info(f"Batch {job.batch_id} merged into batches already queued")
+            self.batch_finished.emit(job.batch_id)
+            return
+        self._queue.append(job)
+        self._schedule()
+    
+    def _valid_codes(self, job: ParseJob) -> List[str]:
+        """Normalize job's codes, reporting the ones that fail validation"""
+        codes = []
+        for code in job.codes:
             try:
-                # Normalize code
-                normalized_code = self.parser.normalize_code(code)
-                
-                # Update progress
-                self.progress_updated.emit(f"Parsing code {i+1}/{len(self.codes)}: {normalized_code[:8]}...")
-                
-                # Parse using provider
-                result = self.provider.parse(normalized_code)
-                
-                # Emit result
-                self.result_ready.emit(result)
-                
-                logger.info(f"Successfully parsed code {i+1}/{len(self.codes)}")
-                
+                codes.append(self.parser.normalize_code(code))
             except ParseError as e:
-                logger.warning(f"Parse error for code {code[:8]}...: {e.message}")
-                self.error_occurred.emit(e.error_type, e.message)
+                self.error_occurred.emit(job.batch_id, e.error_type, e.message)
+        return codes
+    
+    def _pending_jobs(self) -> List[ParseJob]:
+        """The running job, if any, then the paused and the queued ones"""
+        return ([self._running] if self._running else []) + self._draining + self._queue
+    
+    def _without_pending(self, job: ParseJob):
+        """Remove the codes other pending jobs will report from job"""
+        taken = {code for other in self._pending_jobs() if other is not job
+                 for code in chain(other.codes, other.in_flight)}
+        job.codes = [code for code in job.codes if code not in taken]
+    
+    def _drop(self, job: ParseJob):
+        """Cancel a superseded job, finishing it"""
+        self._return_borrowed(job)
+        if job is self._running:
+            # Its task emits batch_finished as it unwinds
+            job.task.cancel()
+            return
+        self._queue.remove(job)
+        logger.info(f"Batch {job.batch_id} dropped before it ran")
+        self.batch_finished.emit(job.batch_id)
+    
+    def _return_borrowed(self, job: ParseJob):
+        """Hand the codes job took over and has not reported back to their jobs"""
+        for code, lender in job.borrowed.items():
+            lender.lent.discard(code)
+            lender.codes.append(code)
+        job.borrowed.clear()
+    
+    def _reported(self, job: ParseJob, code: str):
+        """Settle a code job took over, finishing its lender if nothing else is left"""
+        lender = job.borrowed.pop(code, None)
+        if lender is None:
+            return
+        lender.lent.discard(code)
+        if lender in self._queue and not (lender.codes or lender.lent or lender.local_results):
+            self._queue.remove(lender)
+            logger.info(f"Batch {lender.batch_id} resolved by batch {job.batch_id}")
+            self.batch_finished.emit(lender.batch_id)
+    
+    def _schedule(self):
+        """Start the most urgent queued job, preempting a less urgent one running"""
+        # A job whose codes are all lent out waits for them to be reported
+        runnable = [queued for queued in self._queue if queued.codes or queued.local_results]
+        if self._stopped or not runnable:
+            return
+        job = min(runnable, key=lambda queued: (queued.priority, queued.batch_id))
+        if self._running:
+            if job.priority >= self._running.priority:
+                return
+            # It starts no more calls, and reports the running ones alongside this job
+            logger.info(f"Batch {self._running.batch_id} paused for batch {job.batch_id}")
+            self._running.preempted = True
+            self._draining.append(self._running)
+            self._running = None
+        self._queue.remove(job)
+        self._running = job
+        job.task = asyncio.ensure_future(self._run_batch(job))
+        # A callback rather than a finally, which a task cancelled before it starts never runs
+        job.task.add_done_callback(functools.partial(self._job_done, job))
+    
+    def _job_done(self, job: ParseJob, task: asyncio.Task):
+        """Finish a job whose task ended, or queue it again if it was paused"""
+        if job is self._running:
+            self._running = None
+        else:
+            self._draining.remove(job)
+        if job.preempted and not task.cancelled() and not self._stopped and (job.codes or job.lent):
+            # Back in the queue with the codes it has not started, minus
+            # those a more urgent job now covers
+            job.preempted = False
+            self._without_pending(job)
+            if job.codes or job.lent:
+                self._queue.append(job)
+            else:
+                self.batch_finished.emit(job.batch_id)
+        else:
+            if not task.cancelled() and task.exception():
+                logger.error(f"Batch {job.batch_id} failed: {task.exception()}")
+            # Codes it took over and could not report go back to their jobs
+            self._return_borrowed(job)
+            self.batch_finished.emit(job.batch_id)
+        self._schedule()
+    
+    async def _run_batch(self, job: ParseJob):
+        """Resolve one batch, emitting results in completion order"""
+        # Results resolved from the text need no provider call
+        local_results, job.local_results = job.local_results, []
+        for result in local_results:
+            self.result_ready.emit(job.batch_id, result)
+        
+        if job.codes:
+            await self._parse_codes(job)
+    
+    def _dispatch(self, job: ParseJob) -> Iterator[str]:
+        """Hand job's codes to parse_all one at a time until the job is paused"""
+        while job.codes and not job.preempted:
+            code = job.codes.pop(0)
+            job.in_flight.add(code)
+            yield code
+    
+    async def _parse_codes(self, job: ParseJob):
+        """Resolve the job's codes concurrently through the shared provider, within the batch deadline
+        
+        Calls are started `concurrency` at a time, so a paused job stops
+        starting calls, reports the ones running, and resumes with the rest.
+        """
+        batch_id, count = job.batch_id, len(job.codes)
+        logger.info(f"Starting to parse {count} codes in batch {batch_id}")
+        self.progress_updated.emit(batch_id, f"Parsing {count} codes...")
+        
+        unfinished = []
+        # Provider calls started in the block, through the tasks parse_all
+        # creates, carry the deadline down to their timeouts and retries
+        with deadline(settings.batch_deadline) as ends_at:
+            outcomes = self.provider.parse_all(self._dispatch(job), limit=settings.concurrency)
+            try:
+                while True:
+                    # The provider gives up by itself at the deadline; this is the backstop
+                    left = None if ends_at is None else max(0.0, ends_at - time.monotonic())
+                    try:
+                        code, outcome = await asyncio.wait_for(outcomes.__anext__(), left)
+                    except StopAsyncIteration:
+                        break
+                    job.in_flight.discard(code)
+                    done = job.total - job.left()
+                    self.progress_updated.emit(batch_id, f"Parsed {done}/{job.total}: {code[:8]}...")
+                    
+                    if isinstance(outcome, DeadlineExceededError):
+                        unfinished.append(code)
+                        continue
+                    self._reported(job, code)
+                    if isinstance(outcome, ParseError):
+                        logger.warning(f"Parse error for code {code[:8]}...: {outcome.message}")
+                        self.error_occurred.emit(batch_id, outcome.error_type, outcome.message)
+                    else:
+                        self.result_ready.emit(batch_id, outcome)
+                        logger.info(f"Successfully parsed code {done}/{job.total}")
+            except asyncio.TimeoutError:
+                unfinished.extend(chain(job.in_flight, job.codes))
+                job.in_flight.clear()
+                job.codes = []
+            except asyncio.CancelledError:
+                logger.info(f"Batch {batch_id} cancelled after {job.total - job.left()}/{job.total} codes")
+                raise
             except Exception as e:
-                logger.exception(f"Unexpected error parsing code {code[:8]}...: {str(e)}")
-                self.error_occurred.emit("provider_error", f"Unexpected error: {str(e)}")
+                logger.exception(f"Unexpected error parsing codes: {str(e)}")
+                self.error_occurred.emit(batch_id, "provider_error", f"Unexpected error: {str(e)}")
+            finally:
+                # Drops requests that have not started when the batch is cancelled or paused
+                await outcomes.aclose()
         
-        self.finished.emit()
+        if unfinished:
+            logger.warning(f"Batch {batch_id} reached its {settings.batch_deadline}s deadline "
+                           f"with {len(unfinished)}/{count} codes unfinished")
+            self.codes_unfinished.emit(batch_id, unfinished)
     
     def stop(self):
-        """Stop the worker thread"""
-        self._running = False
-        self.wait()
-    
-    def __del__(self):
-        """Cleanup"""
-        self.stop()
+        """Cancel the batch in progress and shut the service down without waiting for it
+        
+        The service thread cancels what is left and closes the provider,
+        which aborts requests in flight, then exits; wait() on it where the
+        thread has to be gone, as on quit.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        if not self.isRunning():
+            self.provider.close()
+            return
+        
+        self._loop_ready.wait()
+        # The loop cancels the running job as it winds down; queued ones never start
+        self._loop.call_soon_threadsafe(self._loop.stop)
 
 class ClipboardWorker(QThread):
     """Worker thread for monitoring clipboard"""
     
     # Signals
-    code_detected = Signal(list)  # List of detected codes
+    code_detected = Signal(list, object)  # detected codes, LocalResolution of the text
     error_occurred = Signal(str)  # error message
     
     def __init__(self, parent=None):
@@ -104,11 +411,13 @@ class ClipboardWorker(QThread):
                     
                     # Check if clipboard changed and contains taokouling codes
                     if current_text != self._last_clipboard:
-                        codes = self.parser.extract_codes(current_text)
+                        resolution = self.parser.resolve_local(current_text)
                         
-                        if codes:
-                            logger.info(f"Detected {len(codes)} taokouling codes in clipboard")
-                            self.code_detected.emit(codes)
+                        # Only texts with taokouling codes trigger a parse
+                        if resolution.codes or resolution.resolved_codes:
+                            logger.info(f"Detected {len(resolution.codes) + len(resolution.resolved_codes)} "
+                                        f"taokouling codes in clipboard, {len(resolution.resolved_codes)} resolved locally")
+                            self.code_detected.emit(resolution.codes + resolution.resolved_codes, resolution)
                         
                         self._last_clipboard = current_text
                     
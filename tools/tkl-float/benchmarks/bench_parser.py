@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for taokouling code extraction
+"""
+
+import sys
+import os
+import re
+import random
+import timeit
+import logging
+import tracemalloc
+
+# Import the app as a package, as its modules use relative imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.parser import TaokoulingParser, ParseResult, ResultBatch, fold_delimiters, normalize_codes, strip_invisible
+
+logger = logging.getLogger(__name__)
+
+SIZES = [
+    ('1 KB', 1024),
+    ('100 KB', 100 * 1024),
+    ('10 MB', 10 * 1024 * 1024),
+]
+
+CHAT_LINES = [
+    "好的，收到了，明天再说吧。",
+    "这个价格还可以，你看看？",
+    "晚上一起吃饭吗",
+    "[图片]",
+    "订单号 20240917 已发货",
+]
+SHARE_TEMPLATE = "【淘宝】限时特惠 https://m.tb.cn/h.{short} {code} 复制打开手机淘宝"
+CODE_TEMPLATES = ["￥{}￥", "€{}€", "₤{}₤", "ɂ{}ɂ", "9/{}/"]
+
+# Corpora: share of lines carrying a code, and which formats they use
+CORPORA = [
+    ('no codes', 0.0, CODE_TEMPLATES[:1]),
+    ('one format', 0.4, CODE_TEMPLATES[:1]),
+    ('mixed formats', 0.4, CODE_TEMPLATES),
+]
+
+class LegacyParser:
+    """Five-pass extraction as it was before format probing"""
+    
+    PATTERNS = [
+        r'￥([^￥]+)￥',
+        r'€([^€]+)€',
+        r'₤([^₤]+)₤',
+        r'ɂ([^ɂ]+)ɂ',
+        r'9/([^/]+)/',
+    ]
+    
+    def __init__(self):
+        self.compiled_patterns = [re.compile(pattern) for pattern in self.PATTERNS]
+    
+    def extract_codes(self, text):
+        if not text:
+            return []
+        
+        codes = []
+        for pattern in self.compiled_patterns:
+            codes.extend(pattern.findall(text))
+        
+        seen = set()
+        unique_codes = []
+        for code in codes:
+            if code not in seen:
+                seen.add(code)
+                unique_codes.append(code)
+        
+        logger.debug(f"Extracted {len(unique_codes)} codes from text")
+        return unique_codes
+
+class DictParseResult:
+    """ParseResult as it was before __slots__"""
+    
+    def __init__(self, item_id, item_url, title, provider):
+        self.item_id = item_id
+        self.item_url = item_url
+        self.title = title
+        self.provider = provider
+
+def make_text(size: int, code_ratio: float = 0.4, templates=CODE_TEMPLATES, seed: int = 0) -> str:
+    """Build a chat export of roughly `size` characters"""
+    rng = random.Random(seed)
+    alphabet = 'ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnpqrstuvwxyz0123456789'
+    lines = []
+    length = 0
+    while length < size:
+        if rng.random() < code_ratio:
+            code = ''.join(rng.choice(alphabet) for _ in range(11))
+            line = SHARE_TEMPLATE.format(short=code[:7], code=rng.choice(templates).format(code))
+        else:
+            line = rng.choice(CHAT_LINES)
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)[:size]
+
+def best_of(func, text, repeat: int) -> float:
+    """Best wall time of `repeat` runs in seconds"""
+    return min(timeit.repeat(lambda: func(text), number=1, repeat=repeat))
+
+def bench_extract_codes():
+    """Compare per-format scans of the formats present with the legacy five-pass scan"""
+    legacy = LegacyParser()
+    parser = TaokoulingParser()
+    
+    print(f"{'corpus':>14} {'input':>8} {'legacy (ms)':>12} {'per-format (ms)':>17} {'speedup':>8}")
+    for corpus, code_ratio, templates in CORPORA:
+        for label, size in SIZES:
+            text = make_text(size, code_ratio, templates)
+            repeat = 3 if size > 1024 * 1024 else 20
+            
+            # Same codes must come out of both versions, the new one in first-seen order
+            codes = parser.extract_codes(text)
+            assert codes == list(dict.fromkeys(m.code for m in parser.extract_matches(text)))
+            assert sorted(codes) == sorted(legacy.extract_codes(text))
+            
+            old = best_of(legacy.extract_codes, text, repeat)
+            new = best_of(parser.extract_codes, text, repeat)
+            print(f"{corpus:>14} {label:>8} {old * 1000:>12.3f} {new * 1000:>17.3f} {old / new:>7.2f}x")
+
+def make_messages(count: int, code_ratio: float = 0.05, seed: int = 0) -> list:
+    """Build `count` short chat messages, a few of them carrying a code"""
+    rng = random.Random(seed)
+    text = make_text(count * 60, code_ratio, CODE_TEMPLATES, seed)
+    messages = text.split('\n')
+    while len(messages) < count:
+        messages.append(rng.choice(CHAT_LINES))
+    return messages[:count]
+
+def bench_extract_codes_many():
+    """Compare extract_codes_many with calling extract_codes in a loop"""
+    parser = TaokoulingParser()
+    messages = make_messages(100_000)
+    
+    def loop(texts):
+        return [parser.extract_codes(text) for text in texts]
+    
+    assert loop(messages) == parser.extract_codes_many(messages).codes
+    
+    old = best_of(loop, messages, 5)
+    new = best_of(parser.extract_codes_many, messages, 5)
+    print(f"{'messages':>10} {'loop (ms)':>10} {'many (ms)':>10} {'speedup':>8} {'msg/s':>12}")
+    print(f"{len(messages):>10} {old * 1000:>10.1f} {new * 1000:>10.1f} {old / new:>7.2f}x {len(messages) / new:>12,.0f}")
+
+def fold_text(text):
+    """The text half of normalization, as extract_codes applies it"""
+    return strip_invisible(fold_delimiters(text))
+
+def bench_normalization():
+    """Measure the normalization stage next to the matcher it feeds"""
+    parser = TaokoulingParser()
+    
+    print(f"{'corpus':>14} {'input':>8} {'fold (ms)':>10} {'codes (ms)':>11} {'extract (ms)':>13} {'overhead':>9}")
+    for corpus, code_ratio, templates in CORPORA:
+        for label, size in SIZES[:2]:
+            text = make_text(size, code_ratio, templates)
+            codes = parser.extract_codes(text)
+            
+            fold = best_of(fold_text, text, 20)
+            normalize = best_of(normalize_codes, codes, 20)
+            extract = best_of(parser.extract_codes, text, 20)
+            overhead = (fold + normalize) / extract
+            print(f"{corpus:>14} {label:>8} {fold * 1000:>10.3f} {normalize * 1000:>11.3f} "
+                  f"{extract * 1000:>13.3f} {overhead:>8.1%}")
+    
+    # All-ASCII text skips folding and code translation altogether
+    text = make_text(100 * 1024, 0.4, ["9/{}/"]).encode('ascii', 'ignore').decode()
+    codes = parser.extract_codes(text)
+    fold = best_of(fold_text, text, 20)
+    normalize = best_of(normalize_codes, codes, 20)
+    extract = best_of(parser.extract_codes, text, 20)
+    print(f"{'ascii':>14} {'100 KB':>8} {fold * 1000:>10.3f} {normalize * 1000:>11.3f} "
+          f"{extract * 1000:>13.3f} {(fold + normalize) / extract:>8.1%}")
+    
+    # Worst case: a look-alike delimiter forces a replace pass
+    text = make_text(100 * 1024, 0.4, ["¥{}¥"])
+    fold = best_of(fold_text, text, 20)
+    extract = best_of(parser.extract_codes, text, 20)
+    print(f"{'look-alikes':>14} {'100 KB':>8} {fold * 1000:>10.3f} {'':>11} {extract * 1000:>13.3f} {fold / extract:>8.1%}")
+
+def measure_memory(build) -> int:
+    """Bytes still allocated after build() returns, with its result alive"""
+    tracemalloc.start()
+    try:
+        result = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return current
+
+def bench_result_memory(count: int = 1_000_000):
+    """Memory held by `count` results in each container"""
+    # Field strings are built up front and shared by every container, so
+    # the measurements show container overhead only
+    ids = [str(4_000_000_000 + i) for i in range(count)]
+    urls = [f"https://item.taobao.com/item.htm?id={item_id}" for item_id in ids]
+    titles = [f"商品标题 {i}" for i in range(count)]
+    providers = [''.join(['Lotte', 'Future']) for _ in range(count)]  # distinct string objects
+    
+    containers = [
+        ('list[ParseResult] (dict)', lambda: [DictParseResult(*row) for row in zip(ids, urls, titles, providers)]),
+        ('list[ParseResult] (slots)', lambda: [ParseResult(*row) for row in zip(ids, urls, titles, providers)]),
+        ('ResultBatch', lambda: ResultBatch(ParseResult(*row) for row in zip(ids, urls, titles, providers))),
+    ]
+    
+    print(f"{'container':>26} {'MB':>8} {'bytes/result':>13}")
+    for name, build in containers:
+        size = measure_memory(build)
+        print(f"{name:>26} {size / 1e6:>8.1f} {size / count:>13.1f}")
+
+def main():
+    """Run all parser benchmarks"""
+    print("Taokouling Parser Benchmarks")
+    print("=" * 50)
+    
+    print("\nextract_codes")
+    bench_extract_codes()
+    
+    print("\nextract_codes_many")
+    bench_extract_codes_many()
+    
+    print("\nnormalization")
+    bench_normalization()
+    
+    print("\nresult memory (1M results)")
+    bench_result_memory()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
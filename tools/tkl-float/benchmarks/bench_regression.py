@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Parser micro-benchmark suite with regression thresholds
+
+Measures extract_codes, normalize_code and ParseResult construction across
+text sizes, code densities and format mixes, writes the results as JSON and
+exits non-zero when any result is slower than the stored baseline by more
+than the allowed margin.
+"""
+
+import sys
+import os
+import json
+import time
+import timeit
+import argparse
+import platform
+
+# Import the app as a package, as its modules use relative imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.parser import TaokoulingParser, ParseResult, ResultBatch
+from bench_parser import make_text, CODE_TEMPLATES
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_MARGIN = 0.30
+
+SIZES = [
+    ('1KB', 1024),
+    ('100KB', 100 * 1024),
+    ('1MB', 1024 * 1024),
+]
+
+DENSITIES = [
+    ('none', 0.0),
+    ('sparse', 0.05),
+    ('dense', 0.4),
+]
+
+MIXES = [
+    ('one', CODE_TEMPLATES[:1]),
+    ('mixed', CODE_TEMPLATES),
+]
+
+CODES = [
+    ('ascii', "  AbC123dEf45  "),
+    ('fullwidth', "ＡｂＣ１２３ｄＥｆ４５"),
+    ('invisible', "AbC\u200b123\u200ddEf45"),
+]
+
+def measure(func, repeat: int = 7, min_time: float = 0.05) -> float:
+    """Best seconds per call of func over `repeat` samples of at least min_time"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def bench_extract_codes(results: dict):
+    parser = TaokoulingParser()
+    for size_name, size in SIZES:
+        for density_name, density in DENSITIES:
+            # Without codes the format mix makes no difference
+            mixes = MIXES[:1] if density == 0 else MIXES
+            for mix_name, templates in mixes:
+                text = make_text(size, density, templates)
+                name = f"extract_codes/{size_name}/{density_name}"
+                if density:
+                    name += f"/{mix_name}"
+                results[name] = measure(lambda: parser.extract_codes(text))
+
+def bench_normalize_code(results: dict):
+    parser = TaokoulingParser()
+    for code_name, code in CODES:
+        results[f"normalize_code/{code_name}"] = measure(lambda: parser.normalize_code(code))
+
+def bench_parse_result(results: dict, count: int = 10_000):
+    rows = [(str(600000000000 + i), f"https://item.taobao.com/item.htm?id={600000000000 + i}",
+             f"商品 {i}", "LotteFuture") for i in range(count)]
+    results[f"parse_result/construct/{count}"] = measure(lambda: [ParseResult(*row) for row in rows])
+    results[f"parse_result/batch/{count}"] = measure(lambda: ResultBatch(ParseResult(*row) for row in rows))
+
+def run_suite() -> dict:
+    """Run every benchmark and return {name: seconds per call}"""
+    results = {}
+    bench_extract_codes(results)
+    bench_normalize_code(results)
+    bench_parse_result(results)
+    return results
+
+def compare(results: dict, baseline: dict, margin: float) -> list:
+    """Names of results slower than baseline by more than margin"""
+    regressions = []
+    for name, seconds in results.items():
+        reference = baseline.get(name)
+        if reference and seconds > reference * (1 + margin):
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Parser benchmark suite with regression thresholds")
+    arg_parser.add_argument('--output', help="write results as JSON to this file")
+    arg_parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    arg_parser.add_argument('--margin', type=float, default=DEFAULT_MARGIN,
+                            help="allowed slowdown over baseline, as a fraction (default %(default)s)")
+    arg_parser.add_argument('--update-baseline', action='store_true', help="store these results as the baseline")
+    args = arg_parser.parse_args(argv)
+    
+    results = run_suite()
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'results': results,
+    }
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+    else:
+        print(f"No baseline at {args.baseline}; nothing to compare")
+    
+    regressions = compare(results, baseline, args.margin)
+    print(f"{'benchmark':<40} {'time (us)':>12} {'baseline (us)':>14} {'change':>8}")
+    for name, seconds in results.items():
+        reference = baseline.get(name)
+        change = f"{seconds / reference - 1:+.0%}" if reference else "new"
+        flag = "  REGRESSION" if name in regressions else ""
+        reference_us = f"{reference * 1e6:.2f}" if reference else "-"
+        print(f"{name:<40} {seconds * 1e6:>12.2f} {reference_us:>14} {change:>8}{flag}")
+    
+    if regressions:
+        print(f"\n✗ {len(regressions)} benchmarks regressed by more than {args.margin:.0%}")
+        return 1
+    print(f"\n✓ No regressions beyond {args.margin:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Load test for the provider and parse service against the local stand-in
+
+Starts benchmarks/stub_server.py in-process (or targets --url), points the
+app settings at it and parses unique codes at a target rate:
+
+- provider: LotteFutureProvider.parse_async calls started on schedule,
+  whether or not earlier ones have finished (open loop);
+- service: the ParseService stack the app uses, fed batches of --batch
+  codes on schedule, each batch waiting for the previous one as the UI
+  does.
+
+Latency is measured from when a code was due, so time spent queued behind
+a slow provider counts. Reports throughput, p50/p95/p99 latency, errors by
+type, the stand-in's counters and the provider's own statistics, per-phase
+request latency histograms included.
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import platform
+from collections import Counter
+
+# The app is imported as a package, as the providers use relative imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from stub_server import StubServer, add_arguments, config_from_args
+from app.settings import settings
+from app.parser import ParseError
+
+def percentile(samples: list, p: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    return samples[max(0, min(len(samples), int(-(-p * len(samples) // 100))) - 1)]
+
+def configure(base_url: str, args):
+    """Point the app settings at the stand-in"""
+    settings.base_url = base_url
+    settings.app_key = settings.app_secret = settings.invite_code = 'load-test'
+    settings.timeout = args.timeout
+    settings.batch_deadline = args.deadline
+    settings.concurrency = args.concurrency
+    settings.rate_limit = args.rate_limit
+    settings.batch_size = args.batch_size
+    settings.hedge_percentile = args.hedge
+    settings.keep_warm = 0
+    settings.cache_persist = False
+
+class Recorder:
+    """Per-code latencies and outcomes"""
+    
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+        self.started = time.monotonic()
+        self.finished = None
+    
+    def record(self, due: float, error_type: str = None):
+        self.latencies.append(time.monotonic() - due)
+        if error_type:
+            self.errors[error_type] += 1
+    
+    def report(self) -> dict:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        latencies = sorted(self.latencies)
+        completed = len(latencies)
+        return {
+            'completed': completed,
+            'succeeded': completed - sum(self.errors.values()),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_per_s': round(completed / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                name: round(percentile(latencies, p) * 1000, 1)
+                for name, p in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+            },
+            'errors': dict(self.errors),
+        }
+
+async def drive_provider(args, recorder: Recorder) -> dict:
+    """Open loop: start one parse every 1/rate seconds"""
+    from app.providers.cancel import deadline
+    from app.providers.lottefuture import AsyncLotteFutureProvider
+    provider = AsyncLotteFutureProvider()
+    
+    async def one(code: str, due: float):
+        try:
+            with deadline(args.deadline):
+                await provider.parse_async(code)
+            recorder.record(due)
+        except ParseError as e:
+            recorder.record(due, e.error_type)
+    
+    tasks = []
+    total = int(args.rate * args.duration)
+    start = time.monotonic()
+    for i in range(total):
+        due = start + i / args.rate
+        await asyncio.sleep(max(0.0, due - time.monotonic()))
+        tasks.append(asyncio.ensure_future(one(f"LOAD{i:07d}", due)))
+    await asyncio.gather(*tasks)
+    recorder.finished = time.monotonic()
+    
+    stats = {
+        'limiter': provider.limiter.stats(),
+        'breaker': provider.breaker.stats(),
+        'connections': provider.connection_stats(),
+        'requests': provider.request_stats(),
+    }
+    provider.close()
+    return stats
+
+def drive_service(args, recorder: Recorder) -> dict:
+    """Batches of --batch codes every batch/rate seconds, one batch at a time"""
+    from PySide6.QtCore import QCoreApplication, QTimer
+    from app.worker import ParseService
+    
+    app = QCoreApplication.instance() or QCoreApplication([])
+    service = ParseService()
+    batches = max(1, int(args.rate * args.duration / args.batch))
+    interval = args.batch / args.rate
+    start = time.monotonic()
+    state = {'batch': 0, 'due': start}
+    
+    def submit():
+        index = state['batch']
+        state['due'] = start + index * interval
+        codes = [f"LOAD{index * args.batch + i:07d}" for i in range(args.batch)]
+        service.submit(codes)
+    
+    def finished(batch_id: int):
+        state['batch'] += 1
+        if state['batch'] >= batches:
+            recorder.finished = time.monotonic()
+            app.quit()
+            return
+        delay = start + state['batch'] * interval - time.monotonic()
+        QTimer.singleShot(max(0, int(delay * 1000)), submit)
+    
+    service.result_ready.connect(lambda batch_id, result: recorder.record(state['due']))
+    service.error_occurred.connect(lambda batch_id, error_type, message: recorder.record(state['due'], error_type))
+    service.codes_unfinished.connect(
+        lambda batch_id, codes: [recorder.record(state['due'], 'deadline_exceeded') for _ in codes])
+    service.batch_finished.connect(finished)
+    service.start()
+    QTimer.singleShot(0, submit)
+    app.exec()
+    
+    stats = {'cache': service.provider.stats()}
+    service.stop()
+    service.wait()
+    return stats
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Load test the provider or parse service offline")
+    arg_parser.add_argument('--target', choices=('provider', 'service'), default='provider',
+                            help="what to drive (default %(default)s)")
+    arg_parser.add_argument('--rate', type=float, default=20, help="codes per second (default %(default)s)")
+    arg_parser.add_argument('--duration', type=float, default=10, help="seconds of load (default %(default)s)")
+    arg_parser.add_argument('--batch', type=int, default=10, help="codes per service batch (default %(default)s)")
+    arg_parser.add_argument('--concurrency', type=int, default=settings.concurrency,
+                            help="provider request threads (default %(default)s)")
+    arg_parser.add_argument('--rate-limit', type=float, default=0.0, help="client-side requests per second")
+    arg_parser.add_argument('--batch-size', type=int, default=1, help="codes per provider request")
+    arg_parser.add_argument('--hedge', type=float, default=0.0, help="hedging percentile, 0 for none")
+    arg_parser.add_argument('--timeout', type=int, default=10, help="provider request timeout")
+    arg_parser.add_argument('--deadline', type=float, default=0.0,
+                            help="seconds per code (provider) or batch (service), 0 for none")
+    arg_parser.add_argument('--url', help="use a stand-in already running at this base URL")
+    arg_parser.add_argument('--output', help="write the report as JSON to this file")
+    add_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+    
+    server = None if args.url else StubServer(config_from_args(args)).start()
+    configure(args.url or server.url, args)
+    
+    recorder = Recorder()
+    if args.target == 'provider':
+        provider_stats = asyncio.run(drive_provider(args, recorder))
+    else:
+        provider_stats = drive_service(args, recorder)
+    
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'target': args.target,
+            'rate': args.rate,
+            'duration': args.duration,
+            'latency': args.latency,
+        },
+        'results': recorder.report(),
+        'server': server.stats() if server else None,
+        'provider': provider_stats,
+    }
+    if server:
+        server.stop()
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    
+    results = report['results']
+    print(f"{args.target}: {results['completed']} codes in {results['elapsed_s']}s, "
+          f"{results['throughput_per_s']}/s")
+    print("latency ms: " + ", ".join(f"{name} {value}" for name, value in results['latency_ms'].items()))
+    if results['errors']:
+        print("errors: " + ", ".join(f"{name} {count}" for name, count in results['errors'].items()))
+    if report['server']:
+        print("server: " + ", ".join(f"{name} {count}" for name, count in report['server'].items()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the LotteFuture /api/parse endpoint
+
+Answers single-code (`code`) and multi-code (`codes`) requests like the real
+API, with configurable latency distributions, 5xx and API error rates,
+dropped connections, periodic 429 bursts and response payload sizes. Runs
+offline on 127.0.0.1 for load tests and for exercising the provider over
+real HTTP.
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit, parse_qs
+
+LATENCY_SHAPES = {
+    # Parameters in seconds, except the lognormal sigma
+    'fixed': lambda rng, seconds: seconds,
+    'uniform': lambda rng, low, high: rng.uniform(low, high),
+    'normal': lambda rng, mean, sd: max(0.0, rng.gauss(mean, sd)),
+    'lognormal': lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma),
+    'exp': lambda rng, mean: rng.expovariate(1 / mean),
+}
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Latency sampler from shape:param[:param], e.g. fixed:0.05 or lognormal:0.08:0.6"""
+    shape, *params = spec.split(':')
+    if shape not in LATENCY_SHAPES:
+        raise ValueError(f"Unknown latency shape {shape!r}, expected one of {', '.join(LATENCY_SHAPES)}")
+    values = [float(param) for param in params]
+    sample = LATENCY_SHAPES[shape]
+    sample(random.Random(), *values)  # Reject wrong parameter counts up front
+    return lambda rng: sample(rng, *values)
+
+class StubConfig:
+    """How the stand-in behaves
+    
+    latency: shape:params spec for the time each request takes
+    error_rate: share of requests answered with HTTP 500, 502 or 503
+    api_error_rate: share of codes answered with an API-level error code
+    reset_rate: share of requests whose connection is closed unanswered
+    throttle: (period, duration) to answer 429 for the first `duration`
+        seconds of every `period` seconds, with Retry-After
+    payload_size: bytes of filler added to each code's result
+    """
+    
+    def __init__(self, latency: str = 'fixed:0', error_rate: float = 0.0, api_error_rate: float = 0.0,
+                 reset_rate: float = 0.0, throttle: Optional[tuple] = None, payload_size: int = 0,
+                 seed: Optional[int] = None):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.api_error_rate = api_error_rate
+        self.reset_rate = reset_rate
+        self.throttle = throttle
+        self.payload_size = payload_size
+        self.seed = seed
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, Nagle's
+    # algorithm holds the body back until the client's delayed ACK
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        server: StubServer = self.server.stub
+        url = urlsplit(self.path)
+        if url.path != '/api/parse':
+            self.reply(404, {'code': 404, 'message': 'Not found'})
+            return
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        server.serve(self, params)
+    
+    def reply(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+        except ConnectionError:
+            # The client gave up waiting, as a cancelled or timed-out request does
+            self.close_connection = True
+    
+    def log_message(self, format, *args):
+        pass
+
+class StubServer:
+    """The stand-in on a background thread; `url` is its base URL"""
+    
+    def __init__(self, config: Optional[StubConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or StubConfig()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('requests', 'codes', 'ok', 'throttled', 'server_errors',
+                                        'api_errors', 'resets'), 0)
+        self._httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+        self._started_at = time.monotonic()
+    
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='stub-server', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+    
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+    
+    def _throttled_for(self) -> Optional[float]:
+        """Seconds left in the current 429 burst, None outside one"""
+        if not self.config.throttle:
+            return None
+        period, duration = self.config.throttle
+        into = (time.monotonic() - self._started_at) % period
+        return duration - into if into < duration else None
+    
+    def serve(self, handler: StubHandler, params: Dict[str, str]):
+        """Answer one /api/parse request"""
+        self._count('requests')
+        with self._rng_lock:
+            latency = self.config.latency(self._rng)
+        time.sleep(latency)
+        
+        if self._random() < self.config.reset_rate:
+            self._count('resets')
+            handler.close_connection = True
+            handler.connection.shutdown(socket.SHUT_RDWR)
+            return
+        
+        retry_after = self._throttled_for()
+        if retry_after is not None:
+            self._count('throttled')
+            handler.reply(429, {'code': 429, 'message': 'Too many requests'},
+                          {'Retry-After': str(max(1, math.ceil(retry_after)))})
+            return
+        
+        if self._random() < self.config.error_rate:
+            self._count('server_errors')
+            status = (500, 502, 503)[int(self._random() * 3)]
+            handler.reply(status, {'code': status, 'message': 'Upstream unavailable'})
+            return
+        
+        if not params.get('app_key') or not params.get('app_secret'):
+            handler.reply(200, {'code': 401, 'message': 'Missing credentials'})
+            return
+        
+        if 'codes' in params:
+            codes = [code for code in params['codes'].split(',') if code]
+            self._count('codes', len(codes))
+            handler.reply(200, {'code': 0, 'data': {code: self._envelope(code) for code in codes}})
+        else:
+            self._count('codes')
+            handler.reply(200, self._envelope(params.get('code', '')))
+    
+    def _envelope(self, code: str) -> Dict:
+        """The response envelope for one code"""
+        if not code:
+            self._count('api_errors')
+            return {'code': 400, 'message': 'Missing code'}
+        if self._random() < self.config.api_error_rate:
+            self._count('api_errors')
+            return {'code': 500, 'message': 'Item lookup failed'}
+        self._count('ok')
+        item_id = str(600000000000 + sum(map(ord, code)) * 7919 % 10 ** 9)
+        data = {
+            'item_id': item_id,
+            'item_url': f"https://item.taobao.com/item.htm?id={item_id}",
+            'title': f"商品 {code}",
+        }
+        if self.config.payload_size:
+            data['description'] = 'x' * self.config.payload_size
+        return {'code': 0, 'data': data}
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+def parse_throttle(value: str) -> tuple:
+    period, _, duration = value.partition(':')
+    return float(period), float(duration or 1)
+
+def add_arguments(arg_parser: argparse.ArgumentParser):
+    """Stand-in behaviour options shared with the load test"""
+    arg_parser.add_argument('--latency', default='lognormal:0.08:0.5',
+                            help="latency distribution, shape:params (default %(default)s); shapes: "
+                                 + ', '.join(LATENCY_SHAPES))
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help="share of HTTP 5xx responses")
+    arg_parser.add_argument('--api-error-rate', type=float, default=0.0, help="share of API error codes")
+    arg_parser.add_argument('--reset-rate', type=float, default=0.0, help="share of dropped connections")
+    arg_parser.add_argument('--throttle', type=parse_throttle, metavar='PERIOD:DURATION',
+                            help="answer 429 for DURATION seconds of every PERIOD seconds")
+    arg_parser.add_argument('--payload', type=int, default=0, help="filler bytes per result")
+    arg_parser.add_argument('--seed', type=int, help="random seed")
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(latency=args.latency, error_rate=args.error_rate, api_error_rate=args.api_error_rate,
+                      reset_rate=args.reset_rate, throttle=args.throttle, payload_size=args.payload,
+                      seed=args.seed)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Local stand-in for the LotteFuture /api/parse endpoint")
+    arg_parser.add_argument('--port', type=int, default=8765, help="port to listen on (default %(default)s)")
+    add_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+    
+    server = StubServer(config_from_args(args), port=args.port)
+    print(f"Serving /api/parse on {server.url} (LT_BASE_URL={server.url}); Ctrl+C to stop")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.stats(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,27 +6,40 @@ Simple test runner that can work without all dependencies
 import sys
 import os
 
-# Add the app directory to the Python path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+# Import the app as a package, as its modules use relative imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-def run_parser_tests():
-    """Run parser tests (no external dependencies)"""
+# The UI tests only need widgets, not a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+def run_test_module(name, requires=()):
+    """Run one tests/ module, skipping it when a dependency it needs is missing"""
+    import importlib
+    import unittest
+    
+    for dependency in requires:
+        try:
+            importlib.import_module(dependency)
+        except ImportError:
+            print(f"- Skipping {name}: {dependency} is not installed")
+            return True
+    
     try:
-        import unittest
-        from tests.test_parser import TestTaokoulingParser
-        
-        suite = unittest.TestLoader().loadTestsFromTestCase(TestTaokoulingParser)
+        module = importlib.import_module(f"tests.{name}")
+        suite = unittest.TestLoader().loadTestsFromModule(module)
         runner = unittest.TextTestRunner(verbosity=2)
         result = runner.run(suite)
         return result.wasSuccessful()
     except Exception as e:
-        print(f"Error running parser tests: {e}")
+        print(f"Error running {name}: {e}")
         return False
 
 def run_basic_imports_test():
     """Test basic imports work"""
+    import importlib
+    
     try:
-        from parser import TaokoulingParser, ParseResult
+        importlib.import_module("app.parser")
         print("✓ Core parser imports work")
         return True
     except Exception as e:
@@ -46,7 +59,15 @@ def main():
     
     # Run parser tests
     print("\n2. Running parser tests...")
-    success &= run_parser_tests()
+    success &= run_test_module("test_parser")
+    
+    # Run provider tests
+    print("\n3. Running provider tests...")
+    success &= run_test_module("test_provider", requires=("requests",))
+    
+    # Run UI tests
+    print("\n4. Running UI tests...")
+    success &= run_test_module("test_ui", requires=("requests", "PySide6"))
     
     print("\n" + "=" * 50)
     if success:
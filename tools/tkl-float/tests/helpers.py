@@ -0,0 +1,87 @@
+"""
+Stub providers and settings shared by the provider and UI tests
+"""
+
+import time
+import asyncio
+from unittest.mock import patch
+
+from app.parser import Provider, ParseResult
+
+# Provider settings the tests start from; each test overrides what it exercises
+PROVIDER_SETTINGS = {
+    'base_url': "https://api.example.com",
+    'app_key': "test_key",
+    'app_secret': "test_secret",
+    'invite_code': "test_invite",
+    'timeout': 30,
+    'concurrency': 4,
+    'rate_limit': 0,
+    'batch_size': 1,
+    'dns_ttl': 300,
+    'keep_warm': 0,
+    'breaker_threshold': 5,
+    'breaker_reset': 30,
+    'trace_file': "",
+}
+
+def configure_settings(mock_settings, **overrides):
+    """Fill a mocked settings object with PROVIDER_SETTINGS plus overrides"""
+    for name, value in {**PROVIDER_SETTINGS, **overrides}.items():
+        setattr(mock_settings, name, value)
+    return mock_settings
+
+def patch_provider_settings(test, **overrides):
+    """Patch the provider settings for the duration of a test case"""
+    patcher = patch('app.providers.lottefuture.settings')
+    mock_settings = patcher.start()
+    test.addCleanup(patcher.stop)
+    return configure_settings(mock_settings, **overrides)
+
+class FakeProvider(Provider):
+    """Provider answering from a dict of code -> ParseResult or ParseError"""
+    
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+    
+    def get_name(self) -> str:
+        return "Fake"
+    
+    def parse(self, code: str) -> ParseResult:
+        self.calls.append(code)
+        outcome = self.outcomes[code]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+class SlowProvider(Provider):
+    """Provider taking `delay` seconds per call, sync or async, recording the codes asked for"""
+    
+    def __init__(self, delay=0.1, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.cancelled = 0
+    
+    def get_name(self) -> str:
+        return "Slow"
+    
+    def _answer(self, code):
+        if self.error:
+            raise self.error
+        return ParseResult(code, f"https://item.taobao.com/item.htm?id={code}", code, self.get_name())
+    
+    def parse(self, code: str) -> ParseResult:
+        self.calls.append(code)
+        time.sleep(self.delay)
+        return self._answer(code)
+    
+    async def parse_async(self, code: str) -> ParseResult:
+        self.calls.append(code)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self._answer(code)
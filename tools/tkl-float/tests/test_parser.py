@@ -1,11 +1,34 @@
 import unittest
 import sys
 import os
+import io
+import time
+import tracemalloc
+from unittest.mock import patch
 
-# Add the app directory to the Python path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+# Import the app as a package, as its modules use relative imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from parser import TaokoulingParser, InvalidInputError
+import csv
+import json
+from app import parser
+from app.parser import (
+    TaokoulingParser, InvalidInputError, FormatRegistry, FORMAT_REGISTRY, ParseResult, ResultBatch,
+    LOCAL_PROVIDER
+)
+
+# Adversarial inputs for the extraction worst case: name -> builder of a text
+# of about n characters
+ADVERSARIAL_CORPUS = {
+    'unterminated_yuan': lambda n: "￥" + "A" * n,
+    'unterminated_slash': lambda n: "9/" + "A" * n,
+    'slash_prefix_flood': lambda n: "9/A" * (n // 3),
+    'digit_flood': lambda n: "9" * n,
+    'digit_flood_one_slash': lambda n: "9/" + "9" * n,
+    'opener_flood': lambda n: "€₤ɂ" * (n // 3),
+    'alternating_openers': lambda n: ("￥" + "A" * 70 + "€" + "B" * 70) * (n // 142),
+    'mixed_unicode': lambda n: ("淘宝😀\u200b9€ｘ₤/ɂ" + "ÄÖ" * 5) * (n // 19),
+}
 
 class TestTaokoulingParser(unittest.TestCase):
     """Test cases for TaokoulingParser"""
@@ -43,6 +66,34 @@ class TestTaokoulingParser(unittest.TestCase):
         codes = self.parser.extract_codes(text)
         self.assertEqual(codes, ["ABC123"])
     
+    def test_extract_codes_first_seen_order(self):
+        """Test codes keep text order across formats"""
+        text = "9/GHI789/然后€DEF456€最后￥ABC123￥"
+        codes = self.parser.extract_codes(text)
+        self.assertEqual(codes, ["GHI789", "DEF456", "ABC123"])
+    
+    def test_interleaved_families(self):
+        """Test codes of interleaved families keep first-seen order"""
+        text = "￥ABC123￥€DEF456€￥GHI789￥"
+        self.assertEqual(self.parser.extract_codes(text), ["ABC123", "DEF456", "GHI789"])
+        self.assertEqual(self.parser.extract_codes("€B1€ ￥A1￥ €B2€ ￥A1￥"), ["B1", "A1", "B2"])
+        matches = self.parser.extract_matches(text)
+        self.assertEqual([m.code for m in matches], ["ABC123", "DEF456", "GHI789"])
+    
+    def test_extract_matches_families(self):
+        """Test matches report delimiter family and span"""
+        text = "￥ABC123￥₤JKL012₤ɂMNO345ɂ9/GHI789/"
+        matches = self.parser.extract_matches(text)
+        self.assertEqual([m.code for m in matches], ["ABC123", "JKL012", "MNO345", "GHI789"])
+        self.assertEqual([m.family for m in matches], ["yuan", "pound", "glottal", "slash"])
+        self.assertEqual(text[matches[0].start:matches[0].end], "￥ABC123￥")
+    
+    def test_extract_matches_keeps_duplicates(self):
+        """Test matches include repeated occurrences"""
+        matches = self.parser.extract_matches("￥ABC123￥和￥ABC123￥")
+        self.assertEqual(len(matches), 2)
+        self.assertLess(matches[0].start, matches[1].start)
+    
     def test_extract_codes_empty(self):
         """Test extracting from empty text"""
         codes = self.parser.extract_codes("")
@@ -68,6 +119,16 @@ class TestTaokoulingParser(unittest.TestCase):
         code = self.parser.normalize_code("ABC_123")
         self.assertEqual(code, "ABC_123")
     
+    def test_normalize_code_fullwidth(self):
+        """Test normalizing folds fullwidth letters and digits"""
+        code = self.parser.normalize_code("ＡＢＣ１２３")
+        self.assertEqual(code, "ABC123")
+    
+    def test_normalize_code_invisible_chars(self):
+        """Test normalizing strips zero-width characters"""
+        code = self.parser.normalize_code("\ufeffABC\u200b12\u200d3")
+        self.assertEqual(code, "ABC123")
+    
     def test_normalize_code_empty(self):
         """Test normalizing empty code"""
         with self.assertRaises(InvalidInputError):
@@ -83,5 +144,425 @@ class TestTaokoulingParser(unittest.TestCase):
         with self.assertRaises(InvalidInputError):
             self.parser.normalize_code("   ")
 
+class TestLocalResolution(unittest.TestCase):
+    """Test cases for resolving item links without a provider"""
+    
+    SHARE = "【淘宝】https://item.taobao.com/item.htm?spm=a1z10&id=680123456789 ￥ABC123￥「夏季新款T恤」"
+    
+    def setUp(self):
+        self.parser = TaokoulingParser()
+    
+    def test_extract_item_from_url(self):
+        """Test a Taobao item URL becomes a local result"""
+        results = self.parser.extract_items(self.SHARE)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].item_id, "680123456789")
+        self.assertEqual(results[0].item_url, "https://item.taobao.com/item.htm?id=680123456789")
+        self.assertEqual(results[0].title, "夏季新款T恤")
+        self.assertEqual(results[0].provider, LOCAL_PROVIDER)
+    
+    def test_extract_item_from_tmall_url(self):
+        """Test Tmall URLs keep a Tmall item URL"""
+        results = self.parser.extract_items("https://detail.tmall.com/item.htm?id=612345678901&skuId=1")
+        self.assertEqual(results[0].item_url, "https://detail.tmall.com/item.htm?id=612345678901")
+    
+    def test_extract_bare_id_parameter(self):
+        """Test a pasted id= parameter is recognized"""
+        results = self.parser.extract_items("商品 id=612345678901 请看")
+        self.assertEqual([r.item_id for r in results], ["612345678901"])
+    
+    def test_ignore_other_hosts(self):
+        """Test id= parameters of unrelated sites are ignored"""
+        self.assertEqual(self.parser.extract_items("https://example.com/page?id=612345678901"), [])
+        self.assertEqual(self.parser.extract_items("user_id=612345678901 uid=612345678901"), [])
+    
+    def test_code_resolved_locally(self):
+        """Test a code next to its item link needs no provider"""
+        resolution = self.parser.resolve_local(self.SHARE)
+        self.assertEqual(resolution.codes, [])
+        self.assertEqual(resolution.resolved_codes, ["ABC123"])
+        self.assertEqual([r.item_id for r in resolution.results], ["680123456789"])
+    
+    def test_code_without_item_needs_provider(self):
+        """Test codes without item references are left for the provider"""
+        resolution = self.parser.resolve_local("￥ABC123￥")
+        self.assertEqual(resolution.codes, ["ABC123"])
+        self.assertEqual(resolution.results, [])
+    
+    def test_ambiguous_pairing_needs_provider(self):
+        """Test codes stay unresolved when items cannot be paired with them"""
+        text = "￥ABC123￥ €DEF456€ 9/GHI789/ id=612345678901 id=612345678902"
+        resolution = self.parser.resolve_local(text)
+        self.assertEqual(resolution.codes, ["ABC123", "DEF456", "GHI789"])
+        self.assertEqual(len(resolution.results), 2)
+        self.assertEqual(resolution.results[0].title, "")
+    
+    def test_single_item_does_not_answer_several_codes(self):
+        """Test one item link among several codes leaves every code to the provider"""
+        text = "￥ABC123￥ €DEF456€ https://item.taobao.com/item.htm?id=680123456789"
+        resolution = self.parser.resolve_local(text)
+        self.assertEqual(resolution.codes, ["ABC123", "DEF456"])
+        self.assertEqual(resolution.resolved_codes, [])
+        self.assertEqual([r.item_id for r in resolution.results], ["680123456789"])
+
+    def test_items_in_url_list(self):
+        """Test every item URL in a list without whitespace is recognized"""
+        text = '["https://item.taobao.com/item.htm?id=680123456789","https://example.com/a?id=612345678901",' \
+               '"https://detail.tmall.com/item.htm?spm=1&id=612345678902"]'
+        results = self.parser.extract_items(text)
+        self.assertEqual([r.item_id for r in results], ["680123456789", "612345678902"])
+        self.assertEqual(results[1].item_url, "https://detail.tmall.com/item.htm?id=612345678902")
+    
+    def test_url_list_scales_linearly(self):
+        """Test item lookup time grows linearly with a long run of URLs"""
+        def best_time(text):
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                self.parser.resolve_local(text)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+        
+        url_list = lambda n: '[' + ','.join(['"https://img.example.com/i/1.jpg?id=1234"'] * n) + ']'
+        bare_urls = lambda n: "id= " + "https://x/" * n
+        for name, build in (('url_list', url_list), ('bare_urls', bare_urls)):
+            with self.subTest(corpus=name):
+                small = best_time(build(1_000))
+                large = best_time(build(4_000))
+                # Linear growth gives ~4x; quadratic would give ~16x
+                self.assertLess(large, max(small, 1e-4) * 10)
+                self.assertLess(best_time(build(20_000)), 2.0)
+
+class TestUnicodeNormalization(unittest.TestCase):
+    """Test cases for confusable folding before and after matching"""
+    
+    def setUp(self):
+        self.parser = TaokoulingParser()
+    
+    def test_lookalike_delimiters(self):
+        """Test look-alike delimiters match their canonical family"""
+        matches = self.parser.extract_matches("¥ABC123¥和£DEF456£还有９／GHI789／")
+        self.assertEqual([(m.code, m.family) for m in matches],
+                         [("ABC123", "yuan"), ("DEF456", "pound"), ("GHI789", "slash")])
+    
+    def test_fullwidth_code_folded(self):
+        """Test fullwidth code characters come out as ASCII"""
+        self.assertEqual(self.parser.extract_codes("￥ＡＢＣ１２３￥"), ["ABC123"])
+    
+    def test_invisible_chars_stripped(self):
+        """Test zero-width characters inside a code are removed"""
+        self.assertEqual(self.parser.extract_codes("￥AB\u200bC1\u200d23￥"), ["ABC123"])
+    
+    def test_invisible_char_inside_delimiter(self):
+        """Test a zero-width character cannot split a two-character opener"""
+        text = "前缀9\u200b/ABC123/"
+        self.assertEqual(self.parser.extract_codes(text), ["ABC123"])
+        self.assertEqual(self.parser.extract_codes_many([text]).codes, [["ABC123"]])
+        match = self.parser.extract_matches(text)[0]
+        self.assertEqual(text[match.start:match.end], "9\u200b/ABC123/")
+    
+    def test_invisible_chars_not_counted_toward_length(self):
+        """Test zero-width characters do not count toward max_code_length"""
+        text_parser = TaokoulingParser(max_code_length=6)
+        self.assertEqual(text_parser.extract_codes("￥A\u200bB\u200bC\u200b123￥"), ["ABC123"])
+    
+    def test_normalized_duplicates_merged(self):
+        """Test codes equal after normalization are de-duplicated"""
+        self.assertEqual(self.parser.extract_codes("￥ABC123￥和¥ＡＢＣ１２３¥"), ["ABC123"])
+    
+    def test_spans_index_original_text(self):
+        """Test spans still point into the unfolded text"""
+        text = "前缀¥ABC123¥"
+        match = self.parser.extract_matches(text)[0]
+        self.assertEqual(text[match.start:match.end], "¥ABC123¥")
+    
+    def test_batch_prefilter_keeps_lookalikes(self):
+        """Test the batch prefilter does not skip look-alike delimiters"""
+        batch = self.parser.extract_codes_many(["¥ABC123¥"])
+        self.assertEqual(batch.codes, [["ABC123"]])
+
+class TestFormatRegistry(unittest.TestCase):
+    """Test cases for the shared compiled format registry"""
+    
+    def setUp(self):
+        self.registry = FormatRegistry(FORMAT_REGISTRY.formats)
+    
+    def test_constructing_parser_compiles_nothing(self):
+        """Test parser construction does no regex compilation"""
+        with patch('app.parser.re.compile') as compile_mock:
+            TaokoulingParser()
+            TaokoulingParser(max_code_length=16, registry=self.registry)
+        compile_mock.assert_not_called()
+    
+    def test_matchers_shared_between_parsers(self):
+        """Test a second parser reuses the already compiled matcher"""
+        TaokoulingParser().extract_codes("￥ABC123￥")
+        misses = parser._compile_format.cache_info().misses
+        TaokoulingParser().extract_codes("￥DEF456￥")
+        self.assertEqual(parser._compile_format.cache_info().misses, misses)
+    
+    def test_register_new_format(self):
+        """Test a registered format is extracted with its family"""
+        self.registry.register('star', '★')
+        matches = TaokoulingParser(registry=self.registry).extract_matches("★ABC123★和￥DEF456￥")
+        self.assertEqual([(m.code, m.family) for m in matches], [("ABC123", "star"), ("DEF456", "yuan")])
+    
+    def test_register_keeps_other_matchers_compiled(self):
+        """Test registering a format does not recompile existing matchers"""
+        text_parser = TaokoulingParser(registry=self.registry)
+        text_parser.extract_codes("￥ABC123￥和€DEF456€")
+        misses = parser._compile_format.cache_info().misses
+        
+        self.registry.register('star', '★')
+        self.assertEqual(text_parser.extract_codes("￥ABC123￥和€DEF456€"), ["ABC123", "DEF456"])
+        self.assertEqual(parser._compile_format.cache_info().misses, misses)
+    
+    def test_register_does_not_touch_default_registry(self):
+        """Test formats stay in the registry they were registered with"""
+        self.registry.register('star', '★')
+        self.assertEqual(TaokoulingParser().extract_codes("★ABC123★"), [])
+    
+    def test_formats_are_immutable(self):
+        """Test registration replaces rather than mutates the format tuple"""
+        formats = self.registry.formats
+        self.registry.register('star', '★')
+        self.assertEqual(len(formats), 5)
+        self.assertEqual(len(self.registry.formats), 6)
+    
+    def test_register_duplicate_family(self):
+        """Test registering an existing family name is rejected"""
+        with self.assertRaises(ValueError):
+            self.registry.register('yuan', '¥')
+    
+    def test_register_multi_character_closer(self):
+        """Test closing delimiters must be one character"""
+        with self.assertRaises(ValueError):
+            self.registry.register('double', '<<', '>>')
+
+class TestBatchExtraction(unittest.TestCase):
+    """Test cases for TaokoulingParser.extract_codes_many"""
+    
+    def setUp(self):
+        self.parser = TaokoulingParser()
+    
+    def test_per_text_results(self):
+        """Test results stay aligned with the input texts"""
+        texts = ["没有口令", "￥ABC123￥", "", None, "€DEF456€和9/GHI789/", "￥ABC123￥"]
+        batch = self.parser.extract_codes_many(texts)
+        self.assertEqual(batch.codes, [[], ["ABC123"], [], [], ["DEF456", "GHI789"], ["ABC123"]])
+        for text, codes in zip(texts, batch.codes):
+            self.assertEqual(codes, self.parser.extract_codes(text))
+    
+    def test_aggregate_counts(self):
+        """Test aggregate counts over the batch"""
+        texts = ["没有口令", "￥ABC123￥", "", "€DEF456€和9/GHI789/", "￥ABC123￥", "9/不完整"]
+        batch = self.parser.extract_codes_many(texts)
+        self.assertEqual(batch.to_dict(), {
+            'total_texts': 6,
+            'texts_with_codes': 3,
+            'skipped': 2,
+            'total_codes': 4,
+            'unique_codes': 3
+        })
+    
+    def test_empty_batch(self):
+        """Test an empty batch"""
+        batch = self.parser.extract_codes_many([])
+        self.assertEqual(batch.codes, [])
+        self.assertEqual(batch.total_codes, 0)
+    
+    def test_prefilter_skips_regex_work(self):
+        """Test texts without delimiters never reach the matcher"""
+        with patch.object(self.parser, '_extract_codes', wraps=self.parser._extract_codes) as extract:
+            self.parser.extract_codes_many(["普通消息", "hello 9 world", "￥ABC123￥"])
+        extract.assert_called_once_with("￥ABC123￥")
+
+class TestStreamingExtraction(unittest.TestCase):
+    """Test cases for TaokoulingParser.extract_codes_iter"""
+    
+    TEXT = "开头￥ABC123￥中间€DEF456€，9/GHI789/和ɂMNO345ɂ以及￥ABC123￥结束"
+    
+    def setUp(self):
+        self.parser = TaokoulingParser()
+    
+    def test_matches_whole_text_extraction(self):
+        """Test a single chunk gives the same matches as extract_matches"""
+        expected = self.parser.extract_matches(self.TEXT)
+        self.assertEqual(list(self.parser.extract_codes_iter([self.TEXT])), expected)
+    
+    def test_codes_straddling_chunk_boundaries(self):
+        """Test every split point yields the same matches and offsets"""
+        expected = self.parser.extract_matches(self.TEXT)
+        for split in range(len(self.TEXT) + 1):
+            with self.subTest(split=split):
+                chunks = [self.TEXT[:split], self.TEXT[split:]]
+                self.assertEqual(list(self.parser.extract_codes_iter(chunks)), expected)
+    
+    def test_single_character_chunks(self):
+        """Test one-character chunks still find every code"""
+        expected = self.parser.extract_matches(self.TEXT)
+        self.assertEqual(list(self.parser.extract_codes_iter(iter(self.TEXT))), expected)
+    
+    def test_offsets_index_the_stream(self):
+        """Test spans are offsets into the concatenated input"""
+        chunks = ["x" * 100, "￥ABC123￥", "y" * 100, "9/GHI789/"]
+        text = ''.join(chunks)
+        for match in self.parser.extract_codes_iter(chunks, chunk_size=7):
+            self.assertIn(match.code, text[match.start:match.end])
+    
+    def test_text_file_object(self):
+        """Test reading from a text file object in small chunks"""
+        expected = self.parser.extract_matches(self.TEXT)
+        stream = io.StringIO(self.TEXT)
+        self.assertEqual(list(self.parser.extract_codes_iter(stream, chunk_size=5)), expected)
+    
+    def test_binary_file_object(self):
+        """Test multi-byte characters split across binary chunks are decoded"""
+        expected = self.parser.extract_matches(self.TEXT)
+        stream = io.BytesIO(self.TEXT.encode('utf-8'))
+        self.assertEqual(list(self.parser.extract_codes_iter(stream, chunk_size=3)), expected)
+    
+    def test_long_unterminated_match_near_boundary(self):
+        """Test a long code ending just past a chunk boundary is kept"""
+        text = "z" * 50 + "￥" + "A" * 60 + "￥" + "z" * 50
+        expected = self.parser.extract_matches(text)
+        for split in range(40, 120):
+            with self.subTest(split=split):
+                self.assertEqual(list(self.parser.extract_codes_iter([text[:split], text[split:]])), expected)
+    
+    def test_memory_bounded(self):
+        """Test memory does not grow with the stream length"""
+        def chunks(count):
+            for i in range(count):
+                yield "9/" + "A" * 4000 + f"￥CODE{i}￥"
+        
+        tracemalloc.start()
+        try:
+            found = sum(1 for _ in self.parser.extract_codes_iter(chunks(2000)))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        # The stream is about 8 MB; only chunk-sized buffers may be live
+        self.assertEqual(found, 2000)
+        self.assertLess(peak, 1024 * 1024)
+
+class TestParseResult(unittest.TestCase):
+    """Test cases for ParseResult"""
+    
+    def test_slots(self):
+        """Test results carry no per-instance __dict__"""
+        result = ParseResult("1", "https://item.taobao.com/item.htm?id=1", "Item", "LotteFuture")
+        self.assertFalse(hasattr(result, '__dict__'))
+        with self.assertRaises(AttributeError):
+            result.extra = "value"
+    
+    def test_to_dict(self):
+        """Test dictionary form"""
+        result = ParseResult("1", "https://example.com/1", "Item", "LotteFuture")
+        self.assertEqual(result.to_dict(), {
+            'item_id': "1",
+            'item_url': "https://example.com/1",
+            'title': "Item",
+            'provider': "LotteFuture"
+        })
+
+class TestResultBatch(unittest.TestCase):
+    """Test cases for the columnar ResultBatch"""
+    
+    def setUp(self):
+        self.results = [
+            ParseResult("1", "https://example.com/1", "第一个", "LotteFuture"),
+            ParseResult("2", "https://example.com/2", "Second, \"quoted\"", "Local"),
+            ParseResult("3", "https://example.com/3", "Third", "LotteFuture"),
+        ]
+        self.batch = ResultBatch(self.results)
+    
+    def test_round_trip(self):
+        """Test results come back unchanged"""
+        self.assertEqual(len(self.batch), 3)
+        self.assertEqual([r.to_dict() for r in self.batch], [r.to_dict() for r in self.results])
+        self.assertEqual(self.batch[1].to_dict(), self.results[1].to_dict())
+    
+    def test_provider_names_interned(self):
+        """Test each provider name is stored once"""
+        self.assertEqual(self.batch.provider_names, ["LotteFuture", "Local"])
+        self.assertEqual(list(self.batch.provider_indexes), [0, 1, 0])
+        self.assertIs(self.batch[0].provider, self.batch[2].provider)
+    
+    def test_iter_dicts(self):
+        """Test streamed dictionaries match to_dict"""
+        self.assertEqual(list(self.batch.iter_dicts()), [r.to_dict() for r in self.results])
+    
+    def test_write_jsonl(self):
+        """Test JSON lines output"""
+        stream = io.StringIO()
+        self.batch.write_jsonl(stream)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [r.to_dict() for r in self.results])
+        self.assertIn("第一个", lines[0])
+    
+    def test_write_csv(self):
+        """Test CSV output with header row"""
+        stream = io.StringIO()
+        self.batch.write_csv(stream)
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        self.assertEqual(rows[0], list(ResultBatch.FIELDS))
+        self.assertEqual(rows[2], ["2", "https://example.com/2", "Second, \"quoted\"", "Local"])
+    
+    def test_exports_are_lazy(self):
+        """Test export methods return iterators rather than lists"""
+        for rows in (self.batch.iter_dicts(), self.batch.iter_jsonl(), self.batch.iter_csv_rows()):
+            self.assertIs(iter(rows), rows)
+
+class TestExtractionWorstCase(unittest.TestCase):
+    """Perf regression corpus: extraction time must grow linearly"""
+    
+    SIZE = 50_000
+    
+    def setUp(self):
+        self.parser = TaokoulingParser()
+    
+    def _best_time(self, text: str) -> float:
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            self.parser.extract_codes(text)
+            self.parser.extract_matches(text)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    
+    def test_adversarial_corpus_scales_linearly(self):
+        """Test quadrupling adversarial input stays well below quadratic cost"""
+        for name, build in ADVERSARIAL_CORPUS.items():
+            with self.subTest(corpus=name):
+                small = self._best_time(build(self.SIZE))
+                large = self._best_time(build(self.SIZE * 4))
+                # Linear growth gives ~4x; quadratic would give ~16x
+                self.assertLess(large, max(small, 1e-4) * 10)
+    
+    def test_adversarial_corpus_absolute_budget(self):
+        """Test a megabyte of adversarial input is scanned quickly"""
+        # Generous for slow machines; a quadratic scan of 1 MB takes minutes
+        for name, build in ADVERSARIAL_CORPUS.items():
+            with self.subTest(corpus=name):
+                self.assertLess(self._best_time(build(1_000_000)), 2.0)
+    
+    def test_code_longer_than_limit_is_ignored(self):
+        """Test codes above max_code_length are not extracted"""
+        parser = TaokoulingParser(max_code_length=8)
+        self.assertEqual(parser.extract_codes("￥ABCDEFGH￥"), ["ABCDEFGH"])
+        self.assertEqual(parser.extract_codes("￥ABCDEFGHI￥"), [])
+    
+    def test_limit_does_not_hide_following_code(self):
+        """Test an unterminated delimiter does not swallow a later code"""
+        text = "9/" + "A" * 1000 + " ￥ABC123￥"
+        self.assertEqual(self.parser.extract_codes(text), ["ABC123"])
+    
+    def test_invalid_max_code_length(self):
+        """Test non-positive max_code_length is rejected"""
+        with self.assertRaises(ValueError):
+            TaokoulingParser(max_code_length=0)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
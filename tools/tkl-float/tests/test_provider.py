@@ -2,12 +2,33 @@ import unittest
 from unittest.mock import Mock, patch, MagicMock
 import sys
 import os
+import time
+import asyncio
+import tempfile
+import socket
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Add the app directory to the Python path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+# Import the app as a package, as its modules use relative imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
 
-from providers.lottefuture import LotteFutureProvider
-from parser import NetworkError, ProviderError, ExpiredTokenError, NoPermissionError, RateLimitedError
+from app.providers.lottefuture import LotteFutureProvider, AsyncLotteFutureProvider, ServerErrorRetry
+from app.providers.cancel import CancelToken, deadline, current_deadline
+from app.providers.cache import CachingProvider
+from app.providers.store import SQLiteResultStore
+from app.settings import settings
+from app.providers.coalesce import CoalescingProvider
+from app.providers.ratelimit import RateLimiter, parse_retry_after
+from app.providers.pool import DNSCache, PooledAdapter
+from app.providers.breaker import CircuitBreaker
+from app.providers.hedge import HedgingProvider, LatencyTracker
+from app.providers.registry import ProviderRegistry
+from app.providers.trace import RequestTracer, LatencyHistogram, phase, attempt
+from stub_server import StubServer, StubConfig, parse_latency
+from app.parser import ParseResult, ParseError, NetworkError, ProviderError, ExpiredTokenError, NoPermissionError, RateLimitedError, CircuitOpenError, RequestCancelledError, DeadlineExceededError
+from tests.helpers import FakeProvider, SlowProvider, configure_settings, patch_provider_settings
 
 class TestLotteFutureProvider(unittest.TestCase):
     """Test cases for LotteFutureProvider"""
@@ -19,29 +40,23 @@ class TestLotteFutureProvider(unittest.TestCase):
         """Test provider name"""
         self.assertEqual(self.provider.get_name(), "LotteFuture")
     
-    @patch('providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.settings')
     def test_missing_configuration(self, mock_settings):
         """Test behavior with missing configuration"""
-        mock_settings.base_url = ""
-        mock_settings.app_key = ""
-        mock_settings.app_secret = ""
-        mock_settings.invite_code = ""
+        configure_settings(mock_settings, base_url="", app_key="", app_secret="", invite_code="")
+        self.provider = LotteFutureProvider()
         
         with self.assertRaises(ProviderError) as context:
             self.provider.parse("TEST123")
         
         self.assertIn("Missing required configuration", str(context.exception))
     
-    @patch('providers.lottefuture.settings')
-    @patch('providers.lottefuture.requests.Session.get')
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
     def test_successful_parse(self, mock_get, mock_settings):
         """Test successful parsing"""
-        # Mock settings
-        mock_settings.base_url = "https://api.example.com"
-        mock_settings.app_key = "test_key"
-        mock_settings.app_secret = "test_secret"
-        mock_settings.invite_code = "test_invite"
-        mock_settings.timeout = 30
+        configure_settings(mock_settings)
+        self.provider = LotteFutureProvider()
         
         # Mock response
         mock_response = Mock()
@@ -64,16 +79,12 @@ class TestLotteFutureProvider(unittest.TestCase):
         self.assertEqual(result.title, "Test Item")
         self.assertEqual(result.provider, "LotteFuture")
     
-    @patch('providers.lottefuture.settings')
-    @patch('providers.lottefuture.requests.Session.get')
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
     def test_api_error_response(self, mock_get, mock_settings):
         """Test API error response"""
-        # Mock settings
-        mock_settings.base_url = "https://api.example.com"
-        mock_settings.app_key = "test_key"
-        mock_settings.app_secret = "test_secret"
-        mock_settings.invite_code = "test_invite"
-        mock_settings.timeout = 30
+        configure_settings(mock_settings)
+        self.provider = LotteFutureProvider()
         
         # Mock error response
         mock_response = Mock()
@@ -90,16 +101,12 @@ class TestLotteFutureProvider(unittest.TestCase):
         
         self.assertIn("Authentication failed", str(context.exception))
     
-    @patch('providers.lottefuture.settings')
-    @patch('providers.lottefuture.requests.Session.get')
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
     def test_network_timeout(self, mock_get, mock_settings):
         """Test network timeout"""
-        # Mock settings
-        mock_settings.base_url = "https://api.example.com"
-        mock_settings.app_key = "test_key"
-        mock_settings.app_secret = "test_secret"
-        mock_settings.invite_code = "test_invite"
-        mock_settings.timeout = 30
+        configure_settings(mock_settings)
+        self.provider = LotteFutureProvider()
         
         # Mock timeout exception
         import requests
@@ -111,16 +118,12 @@ class TestLotteFutureProvider(unittest.TestCase):
         
         self.assertIn("Request timeout", str(context.exception))
     
-    @patch('providers.lottefuture.settings')
-    @patch('providers.lottefuture.requests.Session.get')
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
     def test_http_error_403(self, mock_get, mock_settings):
         """Test HTTP 403 error"""
-        # Mock settings
-        mock_settings.base_url = "https://api.example.com"
-        mock_settings.app_key = "test_key"
-        mock_settings.app_secret = "test_secret"
-        mock_settings.invite_code = "test_invite"
-        mock_settings.timeout = 30
+        configure_settings(mock_settings)
+        self.provider = LotteFutureProvider()
         
         # Mock HTTP error
         import requests
@@ -132,16 +135,12 @@ class TestLotteFutureProvider(unittest.TestCase):
         with self.assertRaises(NoPermissionError):
             self.provider.parse("TEST123")
     
-    @patch('providers.lottefuture.settings')
-    @patch('providers.lottefuture.requests.Session.get')
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
     def test_incomplete_response_data(self, mock_get, mock_settings):
         """Test incomplete response data"""
-        # Mock settings
-        mock_settings.base_url = "https://api.example.com"
-        mock_settings.app_key = "test_key"
-        mock_settings.app_secret = "test_secret"
-        mock_settings.invite_code = "test_invite"
-        mock_settings.timeout = 30
+        configure_settings(mock_settings)
+        self.provider = LotteFutureProvider()
         
         # Mock incomplete response
         mock_response = Mock()
@@ -161,5 +160,1340 @@ class TestLotteFutureProvider(unittest.TestCase):
         
         self.assertIn("Incomplete response data", str(context.exception))
 
+class TestAsyncLotteFutureProvider(unittest.TestCase):
+    """Test cases for concurrent parsing with AsyncLotteFutureProvider"""
+    
+    def setUp(self):
+        patch_provider_settings(self)
+        
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+    
+    def slow_get(self, delays):
+        """Session.get stand-in answering each code after its delay"""
+        def get(url, params=None, timeout=None, stream=False):
+            code = params['code']
+            with self.lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(delays.get(code, 0.05))
+            with self.lock:
+                self.in_flight -= 1
+            
+            response = Mock()
+            response.raise_for_status.return_value = None
+            if code.startswith('BAD'):
+                response.json.return_value = {'code': 401, 'message': 'Authentication failed'}
+            else:
+                response.json.return_value = {'code': 0, 'data': {
+                    'item_id': code, 'item_url': f"https://example.com/{code}", 'title': code}}
+            return response
+        return get
+    
+    def collect(self, provider, codes, limit=None):
+        async def run():
+            outcomes = []
+            iterator = provider.parse_all(codes)
+            try:
+                async for outcome in iterator:
+                    outcomes.append(outcome)
+                    if limit and len(outcomes) == limit:
+                        break
+            finally:
+                await iterator.aclose()
+            return outcomes
+        return asyncio.run(run())
+    
+    def test_concurrency_is_bounded(self):
+        """Test requests overlap up to the concurrency limit and no further"""
+        codes = [f"CODE{i}" for i in range(12)]
+        provider = AsyncLotteFutureProvider(concurrency=4)
+        
+        with patch('app.providers.lottefuture.requests.Session.get', side_effect=self.slow_get({})):
+            start = time.perf_counter()
+            outcomes = self.collect(provider, codes)
+            elapsed = time.perf_counter() - start
+        
+        self.assertEqual(sorted(code for code, _ in outcomes), sorted(codes))
+        self.assertEqual(self.max_in_flight, 4)
+        # 12 codes at 50 ms each take 600 ms one after another
+        self.assertLess(elapsed, 0.4)
+    
+    def test_results_arrive_in_completion_order(self):
+        """Test a fast code is not held back by a slow one"""
+        provider = AsyncLotteFutureProvider(concurrency=2)
+        delays = {'SLOW': 0.3, 'FAST': 0.01}
+        
+        with patch('app.providers.lottefuture.requests.Session.get', side_effect=self.slow_get(delays)):
+            outcomes = self.collect(provider, ['SLOW', 'FAST'])
+        
+        self.assertEqual([code for code, _ in outcomes], ['FAST', 'SLOW'])
+        self.assertIsInstance(outcomes[0][1], ParseResult)
+    
+    def test_errors_are_reported_per_code(self):
+        """Test a failing code yields its error without stopping the others"""
+        provider = AsyncLotteFutureProvider(concurrency=2)
+        
+        with patch('app.providers.lottefuture.requests.Session.get', side_effect=self.slow_get({})):
+            outcomes = dict(self.collect(provider, ['GOOD1', 'BAD1', 'GOOD2']))
+        
+        self.assertIsInstance(outcomes['BAD1'], ExpiredTokenError)
+        self.assertEqual(outcomes['GOOD1'].item_id, 'GOOD1')
+        self.assertEqual(outcomes['GOOD2'].item_id, 'GOOD2')
+    
+    def test_closing_early_skips_pending_codes(self):
+        """Test codes still queued are never requested after the caller stops"""
+        codes = [f"CODE{i}" for i in range(10)]
+        provider = AsyncLotteFutureProvider(concurrency=1)
+        
+        with patch('app.providers.lottefuture.requests.Session.get',
+                   side_effect=self.slow_get({})) as mock_get:
+            outcomes = self.collect(provider, codes, limit=1)
+            time.sleep(0.2)
+        
+        self.assertEqual(len(outcomes), 1)
+        self.assertLess(mock_get.call_count, len(codes))
+
+class TestCachingProvider(unittest.TestCase):
+    """Test cases for the LRU+TTL result cache"""
+    
+    def setUp(self):
+        self.now = 1000.0
+        self.inner = FakeProvider({
+            'CODE1': ParseResult('1', 'https://example.com/1', 'One', 'Fake'),
+            'CODE2': ParseResult('2', 'https://example.com/2', 'Two', 'Fake'),
+            'CODE3': ParseResult('3', 'https://example.com/3', 'Three', 'Fake'),
+            'EXPIRED': ExpiredTokenError("Token has expired"),
+            'DOWN': NetworkError("Connection failed"),
+        })
+        self.cache = CachingProvider(self.inner, max_entries=2, ttl=60, stale_ttl=300,
+                                     negative_ttl=10, clock=lambda: self.now)
+    
+    def wait_for_refresh(self):
+        self.cache._refresher.submit(lambda: None).result(timeout=5)
+    
+    def test_fresh_hit_skips_provider(self):
+        """Test a repeat parse within the TTL is answered from the cache"""
+        first = self.cache.parse("CODE1")
+        second = self.cache.parse("  CODE1 ")
+        
+        self.assertIs(first, second)
+        self.assertEqual(self.inner.calls, ['CODE1'])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+    
+    def test_stale_entry_served_while_refreshing(self):
+        """Test a stale entry is returned at once and refreshed in the background"""
+        self.cache.parse("CODE1")
+        self.now += 120
+        
+        result = self.cache.parse("CODE1")
+        self.wait_for_refresh()
+        
+        self.assertEqual(result.item_id, '1')
+        self.assertEqual(self.inner.calls, ['CODE1', 'CODE1'])
+        self.assertEqual(self.cache.stats()['stale_hits'], 1)
+        self.assertEqual(self.cache.stats()['refreshes'], 1)
+        
+        # The refresh made the entry fresh again
+        self.cache.parse("CODE1")
+        self.assertEqual(self.cache.stats()['hits'], 1)
+    
+    def test_entry_past_stale_window_is_refetched(self):
+        """Test an entry is dropped once its stale window has passed"""
+        self.cache.parse("CODE1")
+        self.now += 400
+        
+        self.cache.parse("CODE1")
+        self.assertEqual(self.inner.calls, ['CODE1', 'CODE1'])
+        self.assertEqual(self.cache.stats()['misses'], 2)
+    
+    def test_negative_caching(self):
+        """Test expired-token errors are cached briefly and other errors not at all"""
+        for _ in range(2):
+            with self.assertRaises(ExpiredTokenError):
+                self.cache.parse("EXPIRED")
+            with self.assertRaises(NetworkError):
+                self.cache.parse("DOWN")
+        
+        self.assertEqual(self.inner.calls, ['EXPIRED', 'DOWN', 'DOWN'])
+        self.assertEqual(self.cache.stats()['negative_hits'], 1)
+        
+        self.now += 11
+        with self.assertRaises(ExpiredTokenError):
+            self.cache.parse("EXPIRED")
+        self.assertEqual(self.inner.calls.count('EXPIRED'), 2)
+    
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test the cache stays within max_entries, dropping the oldest use first"""
+        self.cache.parse("CODE1")
+        self.cache.parse("CODE2")
+        self.cache.parse("CODE1")
+        self.cache.parse("CODE3")
+        
+        stats = self.cache.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        
+        self.cache.parse("CODE1")
+        self.cache.parse("CODE2")
+        self.assertEqual(self.inner.calls, ['CODE1', 'CODE2', 'CODE3', 'CODE2'])
+    
+    def test_parse_all_answers_hits_without_provider(self):
+        """Test cached codes come back through parse_all without a provider call"""
+        self.cache.parse("CODE1")
+        
+        async def run():
+            return [outcome async for outcome in self.cache.parse_all(['CODE1', 'CODE2', 'EXPIRED'])]
+        
+        outcomes = dict(asyncio.run(run()))
+        self.assertEqual(outcomes['CODE1'].item_id, '1')
+        self.assertEqual(outcomes['CODE2'].item_id, '2')
+        self.assertIsInstance(outcomes['EXPIRED'], ExpiredTokenError)
+        self.assertEqual(self.inner.calls, ['CODE1', 'CODE2', 'EXPIRED'])
+
+class TestSQLiteResultStore(unittest.TestCase):
+    """Test cases for the persistent result cache"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.db')
+        self.now = 1_700_000_000.0
+        self.inner = FakeProvider({
+            f'CODE{i}': ParseResult(str(i), f"https://example.com/{i}", f"Item {i}", 'Fake') for i in range(5)
+        })
+    
+    def open_cache(self, max_entries=10):
+        store = SQLiteResultStore(self.path, clock=lambda: self.now)
+        cache = CachingProvider(self.inner, max_entries=max_entries, ttl=60, stale_ttl=300,
+                                negative_ttl=10, store=store, clock=lambda: self.now,
+                                wall_clock=lambda: self.now)
+        return store, cache
+    
+    def test_results_survive_restart(self):
+        """Test a result parsed before a restart is answered from disk after it"""
+        store, cache = self.open_cache()
+        cache.parse("CODE1")
+        cache.close()
+        
+        store, cache = self.open_cache()
+        self.addCleanup(cache.close)
+        result = cache.parse("CODE1")
+        
+        self.assertEqual(result.title, "Item 1")
+        self.assertEqual(self.inner.calls, ['CODE1'])
+        self.assertEqual(cache.stats()['store_hits'], 1)
+    
+    def test_writes_are_batched_off_the_caller(self):
+        """Test put returns at once and flush commits every queued write"""
+        store, cache = self.open_cache()
+        self.addCleanup(cache.close)
+        for i in range(5):
+            cache.parse(f"CODE{i}")
+        store.flush()
+        
+        self.assertEqual(len(store.load_recent(10)), 5)
+    
+    def test_warm_up_preloads_most_recent(self):
+        """Test warm-up fills memory with the newest stored results"""
+        store, cache = self.open_cache()
+        for i in range(5):
+            cache.parse(f"CODE{i}")
+            self.now += 1
+        cache.close()
+        
+        store, cache = self.open_cache(max_entries=3)
+        self.addCleanup(cache.close)
+        self.assertEqual(cache.warm_up(), 3)
+        
+        cache.parse("CODE4")
+        cache.parse("CODE2")
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['store_hits'], 0)
+        self.assertEqual(len(self.inner.calls), 5)
+    
+    def test_expired_rows_are_compacted(self):
+        """Test rows past their stale time are neither served nor kept"""
+        store, cache = self.open_cache()
+        self.addCleanup(cache.close)
+        cache.parse("CODE1")
+        store.flush()
+        
+        self.now += 400
+        self.assertIsNone(store.get("CODE1"))
+        self.assertEqual(store.compact(), 1)
+        self.assertEqual(store.load_recent(10), [])
+    
+    def test_wal_mode(self):
+        """Test the database uses write-ahead logging"""
+        store, cache = self.open_cache()
+        self.addCleanup(cache.close)
+        with store._read_lock:
+            mode = store._reader.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, 'wal')
+    
+    def test_default_store_is_per_user(self):
+        """Test the default store lives in the XDG data directory when there is no %APPDATA%"""
+        data_home = os.path.dirname(self.path)
+        environ = {name: value for name, value in os.environ.items() if name != 'APPDATA'}
+        environ['XDG_DATA_HOME'] = data_home
+        with patch.dict(os.environ, environ, clear=True), patch.object(settings, 'cache_persist', True):
+            store = SQLiteResultStore.open_default()
+        self.addCleanup(store.close)
+        
+        self.assertEqual(store.path, os.path.join(data_home, 'tkl-float', 'cache.db'))
+
+class TestCoalescingProvider(unittest.TestCase):
+    """Test cases for single-flight request coalescing"""
+    
+    def test_concurrent_threads_share_one_call(self):
+        """Test threads parsing the same code make one call and get one result"""
+        inner = SlowProvider()
+        provider = CoalescingProvider(inner)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(provider.parse(" CODE1 ")))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(inner.calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(provider.stats(), {'calls': 1, 'coalesced': 7, 'in_flight': 0})
+    
+    def test_errors_are_shared(self):
+        """Test every waiter receives the error of the shared call"""
+        provider = CoalescingProvider(SlowProvider(error=NetworkError("Connection failed")))
+        
+        async def run():
+            return await asyncio.gather(*(provider.parse_async("CODE1") for _ in range(3)),
+                                        return_exceptions=True)
+        
+        errors = asyncio.run(run())
+        self.assertTrue(all(isinstance(error, NetworkError) for error in errors))
+        self.assertEqual(provider.stats()['calls'], 1)
+    
+    def test_sequential_parses_are_not_coalesced(self):
+        """Test a parse after the call has finished makes a new call"""
+        inner = SlowProvider(delay=0)
+        provider = CoalescingProvider(inner)
+        provider.parse("CODE1")
+        provider.parse("CODE1")
+        self.assertEqual(len(inner.calls), 2)
+    
+    def test_superseding_caller_adopts_abandoned_call(self):
+        """Test a cancelled caller's call is reused by a caller arriving right after"""
+        inner = SlowProvider(delay=0.2)
+        provider = CoalescingProvider(inner)
+        
+        async def run():
+            first = asyncio.ensure_future(provider.parse_async("CODE1"))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            return await provider.parse_async("CODE1")
+        
+        result = asyncio.run(run())
+        self.assertEqual(result.item_id, "CODE1")
+        self.assertEqual(len(inner.calls), 1)
+        self.assertEqual(inner.cancelled, 0)
+    
+    def test_abandoned_call_is_cancelled(self):
+        """Test a call nobody waits on is cancelled after the grace period"""
+        inner = SlowProvider(delay=5)
+        provider = CoalescingProvider(inner)
+        
+        async def run():
+            caller = asyncio.ensure_future(provider.parse_async("CODE1"))
+            await asyncio.sleep(0.05)
+            caller.cancel()
+            await asyncio.sleep(0.5)
+        
+        asyncio.run(run())
+        self.assertEqual(inner.cancelled, 1)
+        self.assertEqual(provider.stats()['in_flight'], 0)
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for the token bucket and adaptive concurrency"""
+    
+    def test_token_bucket_paces_requests(self):
+        """Test requests beyond the burst go out at the configured rate"""
+        limiter = RateLimiter(rate=50, burst=1, max_concurrency=4)
+        start = time.perf_counter()
+        for _ in range(11):
+            limiter.acquire()
+            limiter.release(latency=0.01)
+        elapsed = time.perf_counter() - start
+        
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertLess(elapsed, 0.5)
+    
+    def test_concurrency_limit_blocks_until_release(self):
+        """Test a request waits while the limit is reached"""
+        limiter = RateLimiter(max_concurrency=2)
+        limiter.acquire()
+        limiter.acquire()
+        
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        
+        limiter.release(latency=0.01)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+        self.assertEqual(limiter.stats()['waits'], 1)
+    
+    def test_acquire_gives_up_after_timeout(self):
+        """Test a bounded acquire returns False without taking a slot"""
+        limiter = RateLimiter(max_concurrency=1)
+        self.assertTrue(limiter.acquire(timeout=0.1))
+        
+        start = time.monotonic()
+        self.assertFalse(limiter.acquire(timeout=0.1))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(limiter.stats()['in_flight'], 1)
+    
+    def test_wake_stops_a_cancelled_acquire(self):
+        """Test a waiting acquire raises once its token is cancelled and the limiter woken"""
+        limiter = RateLimiter(max_concurrency=1)
+        limiter.acquire()
+        token = CancelToken()
+        errors = []
+        def acquire():
+            try:
+                limiter.acquire(token=token)
+            except RequestCancelledError as e:
+                errors.append(e)
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        time.sleep(0.1)
+        
+        with token.on_cancel(limiter.wake):
+            token.cancel()
+        thread.join(timeout=1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(limiter.stats()['in_flight'], 1)
+    
+    def test_throttling_halves_limit_and_pauses(self):
+        """Test a 429 cuts concurrency once and holds requests for Retry-After"""
+        limiter = RateLimiter(max_concurrency=8)
+        for _ in range(3):
+            limiter.acquire()
+        for _ in range(3):
+            limiter.release(throttled=True, retry_after=0.2)
+        self.assertEqual(limiter.limit, 4)
+        
+        start = time.perf_counter()
+        limiter.acquire()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.15)
+    
+    def test_server_retry_after_is_capped(self):
+        """Test a Retry-After longer than max_backoff pauses requests for max_backoff only"""
+        limiter = RateLimiter(max_backoff=0.2)
+        limiter.acquire()
+        limiter.release(throttled=True, retry_after=3600)
+        self.assertLessEqual(limiter.stats()['paused_for'], 0.2)
+        
+        start = time.perf_counter()
+        limiter.acquire()
+        self.assertLess(time.perf_counter() - start, 1)
+    
+    def test_limit_adapts_to_latency(self):
+        """Test slow responses lower the limit and fast ones restore it"""
+        limiter = RateLimiter(max_concurrency=4)
+        for latency in [0.05] + [0.5] * 20:
+            limiter.acquire()
+            limiter.release(latency=latency)
+        self.assertEqual(limiter.limit, 1)
+        
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(latency=0.05)
+        self.assertEqual(limiter.limit, 4)
+    
+    def test_jittery_latency_keeps_the_limit(self):
+        """Test latency that varies around a steady level does not lower the limit"""
+        import math
+        import random
+        rng = random.Random(1)
+        limiter = RateLimiter(max_concurrency=8)
+        for _ in range(2000):
+            limiter.acquire()
+            limiter.release(latency=rng.lognormvariate(math.log(0.05), 0.5))
+        self.assertGreaterEqual(limiter.limit, 7)
+        self.assertEqual(limiter.stats()['throttled'], 0)
+    
+    def test_parse_retry_after(self):
+        """Test Retry-After in seconds and as an HTTP date"""
+        from datetime import datetime, timezone
+        now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+        
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("Mon, 01 Jan 2024 12:00:05 GMT", now), 5.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+    
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
+    def test_provider_queues_throttled_request(self, mock_get, mock_settings):
+        """Test a 429 is waited out per Retry-After and the request sent again"""
+        configure_settings(mock_settings)
+        
+        throttled = Mock(status_code=429, headers={'Retry-After': '1'})
+        ok = Mock(status_code=200)
+        ok.raise_for_status.return_value = None
+        ok.json.return_value = {'code': 0, 'data': {
+            'item_id': 'ITEM123', 'item_url': 'https://example.com/item/123', 'title': 'Test Item'}}
+        mock_get.side_effect = [throttled, ok]
+        
+        provider = LotteFutureProvider()
+        start = time.perf_counter()
+        result = provider.parse("TEST123")
+        
+        self.assertEqual(result.item_id, "ITEM123")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.9)
+        self.assertEqual(provider.limiter.stats()['throttled'], 1)
+    
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
+    def test_provider_gives_up_after_repeated_throttling(self, mock_get, mock_settings):
+        """Test a request throttled on every attempt raises RateLimitedError"""
+        configure_settings(mock_settings)
+        
+        import requests
+        throttled = Mock(status_code=429, headers={'Retry-After': '0'})
+        throttled.raise_for_status.side_effect = requests.exceptions.HTTPError(response=throttled)
+        mock_get.return_value = throttled
+        
+        provider = LotteFutureProvider()
+        with self.assertRaises(RateLimitedError):
+            provider.parse("TEST123")
+        self.assertEqual(mock_get.call_count, LotteFutureProvider.MAX_THROTTLED_ATTEMPTS)
+
+class TestParseMany(unittest.TestCase):
+    """Test cases for batch parsing with parse_many"""
+    
+    def setUp(self):
+        patch_provider_settings(self)
+    
+    def batch_get(self, url, params=None, timeout=None, stream=False):
+        """Session.get stand-in for the multi-code endpoint"""
+        entries = {}
+        for code in params['codes'].split(','):
+            if code.startswith('BAD'):
+                entries[code] = {'code': 401, 'message': 'Authentication failed'}
+            elif not code.startswith('LOST'):
+                entries[code] = {'code': 0, 'data': {
+                    'item_id': code, 'item_url': f"https://example.com/{code}", 'title': code}}
+        response = Mock(status_code=200)
+        response.raise_for_status.return_value = None
+        response.json.return_value = {'code': 0, 'data': entries}
+        return response
+    
+    def test_default_parse_many_is_concurrent(self):
+        """Test the default parse_many overlaps calls and keeps input order"""
+        inner = SlowProvider(delay=0.1)
+        codes = [f"CODE{i}" for i in range(8)]
+        
+        start = time.perf_counter()
+        outcomes = inner.parse_many(codes)
+        
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual([code for code, _ in outcomes], codes)
+        self.assertEqual([result.item_id for _, result in outcomes], codes)
+    
+    def test_parse_all_limit_takes_codes_as_calls_finish(self):
+        """Test parse_all with a limit runs that many calls at once, taking codes as calls finish"""
+        inner = SlowProvider(delay=0.05)
+        taken = []
+        
+        def codes():
+            for i in range(5):
+                taken.append(f"CODE{i}")
+                yield f"CODE{i}"
+        
+        async def run():
+            outcomes = []
+            async for code, _ in inner.parse_all(codes(), limit=2):
+                # The next code is taken only once a call has finished
+                outcomes.append((code, list(taken)))
+            return outcomes
+        
+        outcomes = asyncio.run(run())
+        self.assertEqual(sorted(code for code, _ in outcomes), [f"CODE{i}" for i in range(5)])
+        self.assertEqual(outcomes[0][1], ["CODE0", "CODE1", "CODE2"])
+        self.assertEqual(inner.cancelled, 0)
+    
+    def test_default_parse_many_reports_errors_per_code(self):
+        """Test an error for one code comes back in that code's slot"""
+        inner = FakeProvider({
+            'CODE1': ParseResult('1', 'https://example.com/1', 'One', 'Fake'),
+            'EXPIRED': ExpiredTokenError("Token has expired"),
+        })
+        outcomes = dict(inner.parse_many(['CODE1', 'EXPIRED']))
+        
+        self.assertEqual(outcomes['CODE1'].item_id, '1')
+        self.assertIsInstance(outcomes['EXPIRED'], ExpiredTokenError)
+    
+    def test_chunked_requests(self):
+        """Test codes go out batch_size per request with per-code outcomes"""
+        codes = ['CODE1', 'BAD1', 'CODE2', 'LOST1', 'CODE3', 'CODE4', 'CODE5']
+        provider = LotteFutureProvider(batch_size=3)
+        
+        with patch('app.providers.lottefuture.requests.Session.get', side_effect=self.batch_get) as mock_get:
+            outcomes = provider.parse_many(codes)
+        
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual([code for code, _ in outcomes], codes)
+        outcomes = dict(outcomes)
+        self.assertEqual(outcomes['CODE5'].item_id, 'CODE5')
+        self.assertIsInstance(outcomes['BAD1'], ExpiredTokenError)
+        self.assertIsInstance(outcomes['LOST1'], ProviderError)
+    
+    def test_failed_chunk_fails_each_code(self):
+        """Test a request error is reported for every code in its chunk"""
+        import requests
+        provider = LotteFutureProvider(batch_size=5)
+        
+        with patch('app.providers.lottefuture.requests.Session.get',
+                   side_effect=requests.exceptions.ConnectionError()):
+            outcomes = provider.parse_many(['CODE1', 'CODE2'])
+        
+        self.assertEqual(len(outcomes), 2)
+        self.assertTrue(all(isinstance(error, NetworkError) for _, error in outcomes))
+    
+    def test_async_parse_all_batches_codes(self):
+        """Test codes parsed together through parse_all share requests"""
+        codes = [f"CODE{i}" for i in range(7)] + ['BAD1']
+        provider = AsyncLotteFutureProvider(batch_size=3)
+        
+        async def run():
+            return [outcome async for outcome in provider.parse_all(codes)]
+        
+        with patch('app.providers.lottefuture.requests.Session.get', side_effect=self.batch_get) as mock_get:
+            outcomes = dict(asyncio.run(run()))
+        
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(sorted(outcomes), sorted(codes))
+        self.assertIsInstance(outcomes['BAD1'], ExpiredTokenError)
+        self.assertEqual(outcomes['CODE6'].title, 'CODE6')
+    
+    def test_batching_through_cache_and_coalescing(self):
+        """Test the parse service's provider stack still batches misses"""
+        codes = [f"CODE{i}" for i in range(6)]
+        provider = CachingProvider(CoalescingProvider(AsyncLotteFutureProvider(batch_size=3)),
+                                   max_entries=10, ttl=60, stale_ttl=60, negative_ttl=10)
+        
+        async def run():
+            return [outcome async for outcome in provider.parse_all(codes + codes[:2])]
+        
+        with patch('app.providers.lottefuture.requests.Session.get', side_effect=self.batch_get) as mock_get:
+            outcomes = asyncio.run(run())
+        
+        self.assertEqual(len(outcomes), 8)
+        self.assertEqual(mock_get.call_count, 2)
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Minimal HTTP/1.1 handler that keeps connections open"""
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        body = b'{"code": 0}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+class TestPooledAdapter(unittest.TestCase):
+    """Test cases for connection pre-warming, DNS caching and reuse statistics"""
+    
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://localhost:{self.server.server_address[1]}/"
+        self.verify = requests.Session().merge_environment_settings(self.url, {}, None, None, None)['verify']
+        
+        self.adapter = PooledAdapter(pool_size=2)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.addCleanup(self.session.close)
+    
+    def test_warmed_connection_is_reused(self):
+        """Test the first request after warm() goes out on the pre-opened socket"""
+        self.assertEqual(self.adapter.warm(self.url, verify=self.verify), 1)
+        self.session.get(self.url, timeout=5)
+        self.session.get(self.url, timeout=5)
+        
+        stats = self.adapter.stats()
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['reused'], 2)
+        self.assertEqual(stats['reuse_ratio'], 1.0)
+    
+    def test_cold_request_opens_connection(self):
+        """Test a request without pre-warming is counted on a new connection"""
+        self.session.get(self.url, timeout=5)
+        
+        stats = self.adapter.stats()
+        self.assertEqual(stats['new_connection_requests'], 1)
+        self.assertEqual(stats['reused'], 0)
+    
+    def test_warm_skips_live_connection(self):
+        """Test warming an already warm pool opens nothing"""
+        self.adapter.warm(self.url)
+        self.assertEqual(self.adapter.warm(self.url), 0)
+        self.assertEqual(self.adapter.stats()['connections'], 1)
+    
+    def test_new_connections_share_resolution(self):
+        """Test opening several connections resolves the host once"""
+        self.assertEqual(self.adapter.warm(self.url, connections=2), 2)
+        
+        stats = self.adapter.stats()
+        self.assertEqual(stats['dns_misses'], 1)
+        self.assertEqual(stats['dns_hits'], 1)
+    
+    def test_background_warm_up(self):
+        """Test warm_in_background opens a connection off the calling thread"""
+        self.adapter.warm_in_background(self.url)
+        self.adapter._warmer.join(timeout=5)
+        self.assertEqual(self.adapter.stats()['warmed'], 1)
+    
+    def test_unreachable_host_warms_nothing(self):
+        """Test a failed pre-warm is logged, not raised"""
+        # Bound but not listening, so connections are refused
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.addCleanup(closed.close)
+        self.assertEqual(self.adapter.warm(f"http://127.0.0.1:{closed.getsockname()[1]}/"), 0)
+    
+    def test_dns_entries_expire(self):
+        """Test a cached resolution is reused until its TTL runs out"""
+        now = [0.0]
+        cache = DNSCache(ttl=10, clock=lambda: now[0])
+        infos = [(None, None, None, '', ('10.0.0.1', 443))]
+        with patch('app.providers.pool.socket.getaddrinfo', return_value=infos) as mock_resolve:
+            self.assertEqual(cache.resolve('api.example.com', 443), ['10.0.0.1'])
+            now[0] = 9
+            cache.resolve('api.example.com', 443)
+            self.assertEqual(mock_resolve.call_count, 1)
+            now[0] = 11
+            cache.resolve('api.example.com', 443)
+            self.assertEqual(mock_resolve.call_count, 2)
+    
+    @patch('app.providers.lottefuture.settings')
+    def test_provider_pool_matches_concurrency(self, mock_settings):
+        """Test the provider sizes its connection pool from the concurrency setting"""
+        mock_settings.concurrency = 6
+        mock_settings.rate_limit = 0
+        mock_settings.batch_size = 1
+        mock_settings.breaker_threshold = 5
+        mock_settings.breaker_reset = 30
+        mock_settings.trace_file = ""
+        provider = AsyncLotteFutureProvider()
+        self.addCleanup(provider.close)
+        
+        self.assertEqual(provider.adapter._pool_maxsize, 6)
+        self.assertEqual(provider.limiter.max_concurrency, 6)
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the circuit breaker"""
+    
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=lambda: self.now)
+        self.states = []
+        self.breaker.set_listener(self.states.append)
+    
+    def fail(self, error=None):
+        """Run one request through the breaker that raises error"""
+        try:
+            with self.breaker:
+                raise error or NetworkError("Connection failed")
+        except (NetworkError, ProviderError):
+            pass
+    
+    def test_opens_after_consecutive_network_failures(self):
+        """Test the circuit opens on the threshold and then rejects without running the request"""
+        for _ in range(3):
+            self.fail()
+        self.assertEqual(self.breaker.state, 'open')
+        
+        ran = []
+        with self.assertRaises(CircuitOpenError):
+            with self.breaker:
+                ran.append(True)
+        self.assertEqual(ran, [])
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+    
+    def test_answers_reset_the_count(self):
+        """Test an API error or success between network failures keeps the circuit closed"""
+        self.fail()
+        self.fail()
+        self.fail(ProviderError("API error 500: Internal"))
+        self.fail()
+        self.fail()
+        self.assertEqual(self.breaker.state, 'closed')
+    
+    def test_half_open_probe_closes_on_success(self):
+        """Test one probe goes through after the reset timeout and closes the circuit"""
+        for _ in range(3):
+            self.fail()
+        self.now = 30
+        
+        with self.breaker:
+            self.assertEqual(self.breaker.state, 'half_open')
+            # Only the probe is let through
+            with self.assertRaises(CircuitOpenError):
+                with self.breaker:
+                    pass
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.states, ['open', 'half_open', 'closed'])
+    
+    def test_failed_probe_reopens(self):
+        """Test a failed probe opens the circuit for another reset timeout"""
+        for _ in range(3):
+            self.fail()
+        self.now = 30
+        self.fail()
+        self.assertEqual(self.breaker.state, 'open')
+        
+        self.now = 59
+        with self.assertRaises(CircuitOpenError):
+            with self.breaker:
+                pass
+        self.now = 60
+        with self.breaker:
+            pass
+        self.assertEqual(self.breaker.state, 'closed')
+    
+    def test_zero_threshold_never_opens(self):
+        """Test a threshold of 0 disables the breaker"""
+        breaker = CircuitBreaker(failure_threshold=0)
+        for _ in range(10):
+            try:
+                with breaker:
+                    raise NetworkError("Connection failed")
+            except NetworkError:
+                pass
+        self.assertEqual(breaker.state, 'closed')
+    
+    @patch('app.providers.lottefuture.settings')
+    @patch('app.providers.lottefuture.requests.Session.get')
+    def test_provider_fails_fast_when_open(self, mock_get, mock_settings):
+        """Test the provider stops sending requests once the circuit opens"""
+        configure_settings(mock_settings, breaker_threshold=2)
+        
+        import requests
+        mock_get.side_effect = requests.exceptions.ConnectionError()
+        provider = LotteFutureProvider()
+        states = []
+        provider.set_state_listener(states.append)
+        
+        for _ in range(2):
+            with self.assertRaises(NetworkError):
+                provider.parse("TEST123")
+        with self.assertRaises(CircuitOpenError):
+            provider.parse("TEST123")
+        
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(states, ['open'])
+
+class TestHedgingProvider(unittest.TestCase):
+    """Test cases for hedged parsing"""
+    
+    def hedger(self, providers, **kwargs):
+        """HedgingProvider whose providers have a 50ms p95 on record"""
+        kwargs.setdefault('max_extra', 1.0)
+        hedger = HedgingProvider(providers, min_samples=1, **kwargs)
+        for tracker in hedger._latencies:
+            for _ in range(100):
+                tracker.record(0.05)
+        return hedger
+    
+    def test_slow_call_is_hedged_to_next_provider(self):
+        """Test the backup answers when the primary runs past its percentile"""
+        primary, backup = SlowProvider(delay=2.0), SlowProvider(delay=0.01)
+        hedger = self.hedger([primary, backup])
+        
+        start = time.perf_counter()
+        result = asyncio.run(hedger.parse_async("CODE1"))
+        
+        self.assertEqual(result.item_id, "CODE1")
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(len(backup.calls), 1)
+        self.assertEqual(primary.cancelled, 1)
+        self.assertEqual(hedger.stats()['hedge_wins'], 1)
+    
+    def test_fast_call_is_not_hedged(self):
+        """Test a call answering within the percentile sends nothing extra"""
+        primary, backup = SlowProvider(delay=0.01), SlowProvider(delay=0.01)
+        hedger = self.hedger([primary, backup])
+        
+        asyncio.run(hedger.parse_async("CODE1"))
+        self.assertEqual(len(backup.calls), 0)
+        self.assertEqual(hedger.stats()['hedges'], 0)
+    
+    def test_lone_provider_is_hedged_with_itself(self):
+        """Test a single provider gets a second request for a slow code"""
+        provider = SlowProvider(delay=0.3)
+        hedger = self.hedger([provider])
+        
+        asyncio.run(hedger.parse_async("CODE1"))
+        self.assertEqual(len(provider.calls), 2)
+        self.assertEqual(hedger.stats()['hedges'], 1)
+    
+    def test_no_hedging_without_samples(self):
+        """Test nothing is hedged until a provider has enough latencies on record"""
+        primary, backup = SlowProvider(delay=0.2), SlowProvider(delay=0.01)
+        hedger = HedgingProvider([primary, backup], max_extra=1.0, min_samples=5)
+        
+        asyncio.run(hedger.parse_async("CODE1"))
+        self.assertEqual(len(backup.calls), 0)
+    
+    def test_extra_load_is_capped(self):
+        """Test hedges stop once they reach max_extra of the calls"""
+        primary, backup = SlowProvider(delay=0.2), SlowProvider(delay=0.01)
+        hedger = self.hedger([primary, backup], max_extra=0.5)
+        
+        async def run():
+            return [await hedger.parse_async(f"CODE{i}") for i in range(4)]
+        asyncio.run(run())
+        
+        stats = hedger.stats()
+        self.assertEqual(stats['hedges'], 2)
+        self.assertEqual(stats['denied'], 2)
+        self.assertEqual(len(backup.calls), 2)
+    
+    def test_failed_primary_waits_for_hedge(self):
+        """Test an error does not win while a hedge may still answer"""
+        primary = SlowProvider(delay=0.15, error=NetworkError("Connection failed"))
+        backup = SlowProvider(delay=0.2)
+        hedger = self.hedger([primary, backup])
+        
+        result = asyncio.run(hedger.parse_async("CODE1"))
+        self.assertEqual(result.item_id, "CODE1")
+    
+    def test_all_failed_raises_first_error(self):
+        """Test the first error comes back once every call has failed"""
+        primary = SlowProvider(delay=0.3, error=NetworkError("Connection failed"))
+        backup = SlowProvider(delay=0.01, error=ExpiredTokenError("Token has expired"))
+        hedger = self.hedger([primary, backup])
+        
+        with self.assertRaises(ExpiredTokenError):
+            asyncio.run(hedger.parse_async("CODE1"))
+    
+    def test_latency_percentile(self):
+        """Test percentiles come from the recorded window"""
+        tracker = LatencyTracker(window=100)
+        self.assertIsNone(tracker.percentile(95))
+        for latency in range(1, 101):
+            tracker.record(latency / 100)
+        self.assertEqual(tracker.percentile(50), 0.5)
+        self.assertEqual(tracker.percentile(95), 0.95)
+        self.assertIsNone(tracker.percentile(95, min_samples=101))
+
+class TestProviderRegistry(unittest.TestCase):
+    """Test cases for lazy provider registration and discovery"""
+    
+    def setUp(self):
+        # A provider module on disk, so importing it can be observed
+        directory = tempfile.mkdtemp()
+        with open(os.path.join(directory, 'tkl_test_provider.py'), 'w') as f:
+            f.write(
+                "from types import SimpleNamespace\n"
+                "class EchoProvider:\n"
+                "    def __init__(self, suffix=''):\n"
+                "        self.suffix = suffix\n"
+                "        self.listener = None\n"
+                "    def get_name(self):\n"
+                "        return 'Echo'\n"
+                "    def parse(self, code):\n"
+                "        return SimpleNamespace(item_id=code + self.suffix, provider='Echo')\n"
+                "    def warm_up(self):\n"
+                "        pass\n"
+                "    def set_state_listener(self, listener):\n"
+                "        self.listener = listener\n")
+        sys.path.insert(0, directory)
+        self.addCleanup(sys.path.remove, directory)
+        self.addCleanup(sys.modules.pop, 'tkl_test_provider', None)
+        self.registry = ProviderRegistry([('echo', 'tkl_test_provider:EchoProvider')])
+    
+    def test_imported_on_first_parse(self):
+        """Test a registered path is imported only when the provider is used"""
+        provider = self.registry.create('echo', suffix='!')
+        self.assertNotIn('tkl_test_provider', sys.modules)
+        self.assertEqual(provider.get_name(), 'echo')
+        
+        self.assertEqual(provider.parse("CODE1").item_id, "CODE1!")
+        self.assertIn('tkl_test_provider', sys.modules)
+        self.assertEqual(provider.get_name(), 'Echo')
+    
+    def test_listener_reaches_built_provider(self):
+        """Test a state listener set before the provider is built is passed on"""
+        provider = self.registry.create('echo')
+        listener = Mock()
+        provider.set_state_listener(listener)
+        provider.warm_up()
+        self.assertIs(provider.provider.listener, listener)
+    
+    def test_close_without_use_imports_nothing(self):
+        """Test closing a provider that was never used does not build it"""
+        self.registry.create('echo').close()
+        self.assertNotIn('tkl_test_provider', sys.modules)
+    
+    def test_entry_point_discovery(self):
+        """Test names not registered directly are found among entry points"""
+        from importlib.metadata import EntryPoint
+        entry_point = EntryPoint('plugin', 'tkl_test_provider:EchoProvider', 'tkl_float.providers')
+        with patch('importlib.metadata.entry_points', return_value=[entry_point]):
+            self.assertEqual(self.registry.names(), ['echo', 'plugin'])
+            provider = self.registry.create('plugin')
+        self.assertEqual(provider.parse("CODE1").provider, 'Echo')
+    
+    def test_unknown_and_duplicate_names(self):
+        """Test unknown names and re-registration are rejected"""
+        with patch('importlib.metadata.entry_points', return_value=[]):
+            with self.assertRaises(KeyError):
+                self.registry.create('missing')
+        with self.assertRaises(ValueError):
+            self.registry.register('echo', 'other:Provider')
+        with self.assertRaises(ValueError):
+            self.registry.register('bad', 'no_attribute')
+    
+    def test_factory_registration(self):
+        """Test a callable can be registered instead of a path"""
+        self.registry.register('fake', lambda: FakeProvider({}))
+        self.assertEqual(self.registry.create('fake').provider.get_name(), 'Fake')
+
+class TestStubServer(unittest.TestCase):
+    """Test cases for the provider against the local /api/parse stand-in"""
+    
+    def start(self, **config) -> StubServer:
+        server = StubServer(StubConfig(seed=1, **config)).start()
+        self.addCleanup(server.stop)
+        
+        patch_provider_settings(self, base_url=server.url, timeout=10, batch_size=5)
+        return server
+    
+    def provider(self) -> AsyncLotteFutureProvider:
+        provider = AsyncLotteFutureProvider()
+        self.addCleanup(provider.close)
+        return provider
+    
+    def test_parse_over_http(self):
+        """Test a single code is parsed from the stand-in's response"""
+        server = self.start(payload_size=64)
+        result = self.provider().parse("CODE1")
+        
+        self.assertEqual(result.title, "商品 CODE1")
+        self.assertIn(result.item_id, result.item_url)
+        self.assertEqual(server.stats()['ok'], 1)
+    
+    def test_batch_over_http(self):
+        """Test parse_many sends codes in batches and maps API errors per code"""
+        server = self.start(api_error_rate=0.5)
+        codes = [f"CODE{i}" for i in range(10)]
+        outcomes = self.provider().parse_many(codes)
+        
+        stats = server.stats()
+        self.assertEqual([code for code, _ in outcomes], codes)
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['codes'], 10)
+        errors = [outcome for _, outcome in outcomes if isinstance(outcome, ParseError)]
+        self.assertEqual(len(errors), stats['api_errors'])
+    
+    def test_throttle_burst_is_waited_out(self):
+        """Test a 429 burst pauses the provider until Retry-After, then succeeds"""
+        server = self.start(throttle=(60, 0.5))
+        
+        start = time.monotonic()
+        result = self.provider().parse("CODE1")
+        
+        self.assertEqual(result.title, "商品 CODE1")
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+        self.assertEqual(server.stats()['throttled'], 1)
+    
+    def test_latency_specs(self):
+        """Test latency specs are validated and sampled"""
+        import random
+        self.assertEqual(parse_latency('fixed:0.25')(random.Random()), 0.25)
+        low_high = parse_latency('uniform:0.1:0.2')(random.Random(1))
+        self.assertTrue(0.1 <= low_high <= 0.2)
+        with self.assertRaises(ValueError):
+            parse_latency('gamma:1')
+        with self.assertRaises(TypeError):
+            parse_latency('fixed:1:2')
+
+class TestRequestTracer(unittest.TestCase):
+    """Test cases for request phase tracing and latency histograms"""
+    
+    def test_nested_phases_are_exclusive(self):
+        """Test time in an inner phase is not counted again in the outer one"""
+        tracer = RequestTracer()
+        with tracer.trace('/api/parse') as trace:
+            attempt()
+            with phase('send'):
+                time.sleep(0.02)
+                with phase('connect'):
+                    time.sleep(0.05)
+        
+        self.assertGreaterEqual(trace.phases['connect'], 0.05)
+        self.assertLess(trace.phases['send'], 0.05)
+        self.assertGreaterEqual(trace.total, trace.phases['send'] + trace.phases['connect'])
+        self.assertEqual(tracer.stats()['/api/parse']['attempts'], 1)
+    
+    def test_phase_outside_trace_is_ignored(self):
+        """Test phases and attempts outside a traced request do nothing"""
+        with phase('dns'):
+            attempt()
+    
+    def test_errors_are_counted_by_type(self):
+        """Test a request leaving with an error records its error type"""
+        tracer = RequestTracer()
+        with self.assertRaises(NetworkError):
+            with tracer.trace('/api/parse'):
+                raise NetworkError("Connection failed")
+        
+        self.assertEqual(tracer.stats()['/api/parse']['errors'], {'network_error': 1})
+        self.assertEqual(tracer.recent()[0]['error'], 'network_error')
+    
+    def test_histogram_percentiles(self):
+        """Test percentiles are interpolated within buckets and bounded by the samples"""
+        histogram = LatencyHistogram(bounds=(10, 100, 1000))
+        for ms in [5] * 50 + [50] * 40 + [500] * 10:
+            histogram.record(ms)
+        
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(90), 50)
+        self.assertEqual(histogram.percentile(99), 500)
+        self.assertEqual(histogram.percentile(100), 500)
+        self.assertIsNone(LatencyHistogram().percentile(50))
+        self.assertEqual(histogram.to_dict()['buckets'], {'le_10': 50, 'le_100': 90, 'le_1000': 100, 'le_inf': 100})
+    
+    def test_percentile_between_samples_in_bucket(self):
+        """Test a percentile is interpolated between the samples in its bucket, not its bounds"""
+        histogram = LatencyHistogram()
+        for ms in [0.2] * 3 + [0.4]:
+            histogram.record(ms)
+        
+        self.assertAlmostEqual(histogram.percentile(50), 0.3)
+        self.assertLess(histogram.percentile(50), histogram.max)
+        self.assertEqual(histogram.percentile(0), 0.2)
+    
+    def start(self, **config) -> StubServer:
+        server = StubServer(StubConfig(seed=1, **config)).start()
+        self.addCleanup(server.stop)
+        
+        self.mock_settings = patch_provider_settings(self, base_url=server.url, timeout=10, concurrency=2)
+        return server
+    
+    def test_provider_request_phases(self):
+        """Test a real request is broken into connection, server and decode phases"""
+        self.start(latency='fixed:0.05')
+        provider = AsyncLotteFutureProvider()
+        self.addCleanup(provider.close)
+        provider.parse("CODE1")
+        provider.parse("CODE2")
+        
+        stats = provider.request_stats()['/api/parse']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['attempts'], 2)
+        self.assertEqual(stats['retries'], 0)
+        self.assertEqual(stats['statuses'], {200: 2})
+        latency = stats['latency_ms']
+        self.assertGreaterEqual(latency['wait']['min'], 50)
+        self.assertEqual(latency['wait']['count'], 2)
+        # Only the request that opened a connection has dns and connect samples
+        self.assertEqual(latency['connect']['count'], 1)
+        self.assertEqual(latency['dns']['count'], 1)
+        # The second request reuses the first one's connection
+        first, second = provider.tracer.recent()
+        self.assertGreater(first['phases_ms']['connect'], 0)
+        self.assertEqual(second['phases_ms']['connect'], 0)
+        self.assertEqual(second['phases_ms']['dns'], 0)
+    
+    def test_throttled_attempts_are_counted(self):
+        """Test a request queued again after a 429 counts both attempts"""
+        self.start(throttle=(60, 0.5))
+        provider = AsyncLotteFutureProvider()
+        self.addCleanup(provider.close)
+        provider.parse("CODE1")
+        
+        stats = provider.request_stats()['/api/parse']
+        self.assertEqual(stats['attempts'], 2)
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['throttled'], 1)
+        self.assertGreaterEqual(stats['latency_ms']['queue']['max'], 900)
+    
+    def test_traces_written_on_close(self):
+        """Test closing a provider with a trace file writes stats and recent traces"""
+        import json
+        self.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'logs', 'traces.json')
+            self.mock_settings.trace_file = path
+            provider = AsyncLotteFutureProvider()
+            provider.parse("CODE1")
+            provider.close()
+            
+            with open(path, encoding='utf-8') as f:
+                report = json.load(f)
+        self.assertEqual(report['endpoints']['/api/parse']['requests'], 1)
+        self.assertEqual(len(report['recent']), 1)
+        self.assertEqual(report['recent'][0]['status'], 200)
+
+class TestCancellation(unittest.TestCase):
+    """Test cases for aborting requests in flight against a slow server"""
+    
+    def setUp(self):
+        self.server = StubServer(StubConfig(latency='fixed:5')).start()
+        self.addCleanup(self.server.stop)
+        
+        patch_provider_settings(self, base_url=self.server.url, concurrency=1, breaker_threshold=1)
+        self.provider = AsyncLotteFutureProvider()
+        self.addCleanup(self.provider.close)
+    
+    def test_cancelled_parse_frees_request_thread(self):
+        """Test cancelling parse_async aborts its request instead of waiting for the server"""
+        async def cancel_in_flight():
+            task = asyncio.ensure_future(self.provider.parse_async("SLOW1"))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        asyncio.run(cancel_in_flight())
+        
+        # The only request thread is free again long before the server answers
+        start = time.monotonic()
+        self.provider._executor.submit(lambda: None).result(timeout=2)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.provider.request_stats()['/api/parse']['errors'], {'cancelled': 1})
+    
+    def test_close_aborts_blocking_parse(self):
+        """Test close() makes a blocked synchronous parse raise at once"""
+        errors = []
+        def parse():
+            try:
+                self.provider.parse("SLOW1")
+            except ParseError as e:
+                errors.append(e)
+        thread = threading.Thread(target=parse)
+        thread.start()
+        time.sleep(0.3)
+        
+        start = time.monotonic()
+        self.provider.close()
+        thread.join(timeout=2)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertIsInstance(errors[0], RequestCancelledError)
+    
+    def test_close_aborts_parse_queued_in_limiter(self):
+        """Test close() stops a parse waiting for the rate limiter instead of leaving it queued"""
+        self.provider.limiter.acquire()
+        errors = []
+        def parse():
+            try:
+                self.provider.parse("QUEUED1")
+            except ParseError as e:
+                errors.append(e)
+        thread = threading.Thread(target=parse)
+        thread.start()
+        time.sleep(0.2)
+        
+        start = time.monotonic()
+        self.provider.close()
+        thread.join(timeout=2)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertIsInstance(errors[0], RequestCancelledError)
+    
+    def test_cancelled_request_is_not_a_failure(self):
+        """Test an aborted request does not count towards opening the circuit"""
+        async def cancel_in_flight():
+            task = asyncio.ensure_future(self.provider.parse_async("SLOW1"))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        asyncio.run(cancel_in_flight())
+        self.provider._executor.submit(lambda: None).result(timeout=2)
+        
+        self.assertEqual(self.provider.breaker.state, 'closed')
+        self.assertEqual(self.provider.breaker.stats()['failures'], 0)
+
+class TestDeadline(unittest.TestCase):
+    """Test cases for batch deadlines capping requests to a slow server"""
+    
+    def setUp(self):
+        self.server = StubServer(StubConfig(latency='fixed:5')).start()
+        self.addCleanup(self.server.stop)
+        
+        patch_provider_settings(self, base_url=self.server.url, concurrency=1, breaker_threshold=1)
+        self.provider = AsyncLotteFutureProvider()
+        self.addCleanup(self.provider.close)
+    
+    def test_deadline_caps_read_timeout(self):
+        """Test a parse gives up at its deadline instead of waiting for the server"""
+        async def parse_within_deadline():
+            with deadline(0.5):
+                await self.provider.parse_async("SLOW1")
+        
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            asyncio.run(parse_within_deadline())
+        self.assertLess(time.monotonic() - start, 1.5)
+        
+        # Running out of time says nothing about the service
+        self.assertEqual(self.provider.breaker.state, 'closed')
+        self.assertEqual(self.provider.request_stats()['/api/parse']['errors'], {'deadline_exceeded': 1})
+    
+    def test_queued_parse_fails_once_deadline_passed(self):
+        """Test a parse queued behind a slow one fails at its deadline without being sent"""
+        async def parse_two():
+            with deadline(0.5):
+                return await asyncio.gather(self.provider.parse_async("SLOW1"),
+                                            self.provider.parse_async("SLOW2"),
+                                            return_exceptions=True)
+        
+        outcomes = asyncio.run(parse_two())
+        self.assertTrue(all(isinstance(outcome, DeadlineExceededError) for outcome in outcomes))
+        self.provider._executor.submit(lambda: None).result(timeout=2)
+        self.assertEqual(self.server.stats()['requests'], 1)
+    
+    def test_retry_backoff_past_deadline_is_not_attempted(self):
+        """Test urllib3 retries stop when the backoff would overrun the deadline"""
+        retry = ServerErrorRetry(total=3, backoff_factor=1)
+        retry = retry.increment('GET', '/api/parse').increment('GET', '/api/parse')
+        self.assertGreater(retry.get_backoff_time(), 0.5)
+        
+        with CancelToken(deadline=time.monotonic() + 0.5).bound():
+            with self.assertRaises(DeadlineExceededError):
+                retry.get_backoff_time()
+        # Without a deadline the backoff is unchanged
+        self.assertEqual(retry.get_backoff_time(), 2)
+    
+    def test_nested_deadline_never_extends(self):
+        """Test an inner deadline longer than the outer one keeps the outer"""
+        with deadline(1) as outer:
+            with deadline(10) as inner:
+                self.assertEqual(inner, outer)
+            with deadline(0.1) as inner:
+                self.assertLess(inner, outer)
+            with deadline(0) as inner:
+                self.assertEqual(inner, outer)
+        self.assertIsNone(current_deadline())
+        self.assertIsNone(CancelToken().remaining())
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,14 +1,24 @@
 import unittest
 import sys
 import os
+import time
 from unittest.mock import Mock, patch
 
-# Add the app directory to the Python path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+# Import the app as a package, as its modules use relative imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
 
 from PySide6.QtWidgets import QApplication
 from PySide6.QtCore import QTimer
-from ui import MainWindow
+from app.ui import MainWindow
+from app.settings import settings
+from app.worker import ParseService, INTERACTIVE, BACKGROUND
+from app.parser import ParseResult
+from app.providers.cache import CachingProvider
+from app.providers.coalesce import CoalescingProvider
+from app.providers.lottefuture import AsyncLotteFutureProvider
+from stub_server import StubServer, StubConfig
+from tests.helpers import SlowProvider, patch_provider_settings
 
 class TestUISmoke(unittest.TestCase):
     """UI smoke test - launch and close application"""
@@ -23,6 +33,10 @@ class TestUISmoke(unittest.TestCase):
     
     def setUp(self):
         """Set up test case"""
+        # Results parsed by one run must not be answered from disk in the next
+        patcher = patch.object(settings, 'cache_persist', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         self.window = MainWindow()
     
     def tearDown(self):
@@ -111,12 +125,244 @@ class TestUISmoke(unittest.TestCase):
             ("rate_limited", "请求过于频繁，请稍后再试"),
             ("network_error", "网络连接错误"),
             ("provider_error", "服务提供商错误"),
+            ("deadline_exceeded", "解析超时，未完成"),
             ("unknown_error", "unknown_error")  # Should return original message
         ]
         
         for error_type, expected in test_cases:
             result = self.window.get_user_friendly_error(error_type, "original message")
             self.assertEqual(result, expected)
+    
+    def test_unfinished_codes_are_listed(self):
+        """Test codes cut off by the batch deadline are shown and counted in the status"""
+        self.window.open_batches.add(7)
+        self.window.on_codes_unfinished(7, ["SLOW1", "SLOW2"])
+        self.window.on_parsing_finished(7)
+        
+        text = self.window.results_text.toPlainText()
+        self.assertIn("SLOW1", text)
+        self.assertIn("SLOW2", text)
+        self.assertEqual(self.window.status_label.text(), "已超时，2 个淘口令未完成")
+    
+    def test_clipboard_parse_leaves_parse_button_enabled(self):
+        """Test a background clipboard parse does not block parsing by hand"""
+        self.window.start_parsing(["CLIP1"], priority=BACKGROUND)
+        self.assertTrue(self.window.parse_button.isEnabled())
+        
+        self.window.start_parsing(["USER1"])
+        self.assertFalse(self.window.parse_button.isEnabled())
+        self.assertEqual(len(self.window.open_batches), 2)
+
+class TestParseServiceStop(unittest.TestCase):
+    """Stopping, superseding and batch deadlines must not wait for a slow server"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+    
+    def setUp(self):
+        self.server = StubServer(StubConfig(latency='fixed:10')).start()
+        self.addCleanup(self.server.stop)
+        
+        patch_provider_settings(self, base_url=self.server.url, concurrency=2)
+        
+        self.provider = AsyncLotteFutureProvider()
+        self.service = ParseService(CachingProvider(CoalescingProvider(self.provider)))
+        self.service.start()
+        self.addCleanup(self.service.wait, 5000)
+        self.addCleanup(self.service.stop)
+    
+    def wait_for_requests(self, count: int):
+        """Process events until the server has count requests"""
+        deadline = time.monotonic() + 5
+        while self.server.stats()['requests'] < count and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertEqual(self.server.stats()['requests'], count)
+    
+    def test_stop_latency_is_bounded(self):
+        """Test stop() returns at once and the service exits well before the server answers"""
+        self.service.submit(["SLOW1", "SLOW2"])
+        self.wait_for_requests(2)
+        
+        start = time.monotonic()
+        self.service.stop()
+        self.assertLess(time.monotonic() - start, 0.1)
+        
+        self.assertTrue(self.service.wait(2000))
+        self.assertLess(time.monotonic() - start, 2)
+        # The request threads were freed too, not left waiting on the server
+        self.provider._executor.shutdown(wait=True)
+        self.assertLess(time.monotonic() - start, 2)
+    
+    def test_superseding_batch_does_not_block(self):
+        """Test submitting over a batch in flight returns at once"""
+        first = self.service.submit(["SLOW1"])
+        self.wait_for_requests(1)
+        
+        start = time.monotonic()
+        second = self.service.submit(["SLOW2"])
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertGreater(second, first)
+    
+    def test_batch_deadline_returns_partial_results(self):
+        """Test a batch finishes at its deadline with the codes left marked unfinished"""
+        results, unfinished, finished = [], [], []
+        self.service.result_ready.connect(lambda batch_id, result: results.append(result))
+        self.service.codes_unfinished.connect(lambda batch_id, codes: unfinished.extend(codes))
+        self.service.batch_finished.connect(finished.append)
+        local = ParseResult("123", "https://item.taobao.com/item.htm?id=123", "Local item", "local")
+        
+        with patch('app.worker.settings') as mock_settings:
+            mock_settings.batch_deadline = 0.5
+            mock_settings.concurrency = 2
+            start = time.monotonic()
+            batch_id = self.service.submit(["SLOW1", "SLOW2", "SLOW3"], [local])
+            while not finished and time.monotonic() - start < 5:
+                self.app.processEvents()
+                time.sleep(0.01)
+        
+        self.assertEqual(finished, [batch_id])
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual(results, [local])
+        self.assertEqual(sorted(unfinished), ["SLOW1", "SLOW2", "SLOW3"])
+
+class TestParseServiceWarmUp(unittest.TestCase):
+    """The provider is warmed up once startup is over, not while the app launches"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+    
+    def test_warm_up_waits_for_startup(self):
+        """Test warm_up runs WARM_UP_DELAY after the service starts"""
+        provider = SlowProvider(0)
+        with patch.object(provider, 'warm_up') as warm_up, patch('app.worker.WARM_UP_DELAY', 0.3):
+            service = ParseService(provider)
+            start = time.monotonic()
+            service.start()
+            self.addCleanup(service.wait, 5000)
+            self.addCleanup(service.stop)
+            
+            time.sleep(0.1)
+            warm_up.assert_not_called()
+            while not warm_up.called and time.monotonic() - start < 5:
+                time.sleep(0.01)
+        
+        warm_up.assert_called_once_with()
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+class TestParseScheduling(unittest.TestCase):
+    """Interactive batches go first, background ones resume, duplicates merge"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+    
+    def setUp(self):
+        self.provider = SlowProvider(0.3)
+        self.service = ParseService(self.provider)
+        self.results = []
+        self.finished = []
+        self.service.result_ready.connect(lambda batch_id, result: self.results.append((batch_id, result.item_id)))
+        self.service.batch_finished.connect(self.finished.append)
+        self.service.start()
+        self.addCleanup(self.service.wait, 5000)
+        self.addCleanup(self.service.stop)
+    
+    def wait_for_batches(self, *batch_ids):
+        """Process events until every batch has finished"""
+        deadline = time.monotonic() + 5
+        while not set(batch_ids) <= set(self.finished) and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertLessEqual(set(batch_ids), set(self.finished))
+    
+    def results_of(self, batch_id: int):
+        return sorted(code for result_batch, code in self.results if result_batch == batch_id)
+    
+    def test_interactive_preempts_background_which_resumes(self):
+        """Test an interactive batch runs ahead of a clipboard batch, which then finishes its codes"""
+        with patch.object(settings, 'concurrency', 2):
+            background = self.service.submit(["BG1", "BG2", "BG3", "BG4"], priority=BACKGROUND)
+            time.sleep(0.1)
+            interactive = self.service.submit(["UI1"], priority=INTERACTIVE)
+            self.wait_for_batches(background, interactive)
+        
+        self.assertEqual(self.finished, [interactive, background])
+        self.assertEqual(self.results_of(interactive), ["UI1"])
+        self.assertEqual(self.results_of(background), ["BG1", "BG2", "BG3", "BG4"])
+        # Calls in flight when paused finish and are reported to the paused
+        # batch; none is cancelled or sent again
+        self.assertEqual(self.provider.calls, ["BG1", "BG2", "UI1", "BG3", "BG4"])
+        self.assertEqual(self.provider.cancelled, 0)
+        self.assertEqual(self.results.index((interactive, "UI1")), 2)
+    
+    def test_queued_duplicates_are_merged(self):
+        """Test codes already waiting in a batch are not parsed again for a later one"""
+        first = self.service.submit(["A", "B"], priority=BACKGROUND)
+        second = self.service.submit(["B", "C"], priority=BACKGROUND)
+        third = self.service.submit(["A"], priority=BACKGROUND)
+        self.wait_for_batches(first, second, third)
+        
+        self.assertEqual(sorted(self.provider.calls), ["A", "B", "C"])
+        self.assertEqual(self.results_of(first), ["A", "B"])
+        self.assertEqual(self.results_of(second), ["C"])
+        self.assertEqual(self.results_of(third), [])
+        # Fully merged, so it finished before the batches that hold its code
+        self.assertEqual(self.finished[0], third)
+    
+    def test_interactive_takes_over_queued_codes(self):
+        """Test an interactive batch resolves a code a queued clipboard batch was waiting on"""
+        running = self.service.submit(["A"], priority=BACKGROUND)
+        queued = self.service.submit(["B", "C"], priority=BACKGROUND)
+        interactive = self.service.submit(["C"], priority=INTERACTIVE)
+        self.wait_for_batches(running, queued, interactive)
+        
+        self.assertEqual(self.provider.calls.count("C"), 1)
+        self.assertEqual(self.results_of(interactive), ["C"])
+        self.assertEqual(self.results_of(queued), ["B"])
+        self.assertEqual(self.results_of(running), ["A"])
+        self.assertEqual(self.finished, [interactive, running, queued])
+    
+    def test_batch_left_with_taken_codes_waits_for_them(self):
+        """Test a clipboard batch whose codes were all taken over finishes once they are reported"""
+        running = self.service.submit(["A"], priority=BACKGROUND)
+        queued = self.service.submit(["B"], priority=BACKGROUND)
+        interactive = self.service.submit(["B"], priority=INTERACTIVE)
+        self.wait_for_batches(running, queued, interactive)
+        
+        self.assertEqual(self.provider.calls.count("B"), 1)
+        self.assertEqual(self.results_of(interactive), ["B"])
+        self.assertEqual(self.results_of(queued), [])
+        self.assertEqual(self.finished, [queued, interactive, running])
+    
+    def test_taken_codes_return_when_superseded(self):
+        """Test codes taken over from a clipboard batch go back to it when the interactive batch is replaced"""
+        running = self.service.submit(["A"], priority=BACKGROUND)
+        queued = self.service.submit(["B"], priority=BACKGROUND)
+        first = self.service.submit(["B"], priority=INTERACTIVE)
+        time.sleep(0.1)
+        second = self.service.submit(["C"], priority=INTERACTIVE)
+        self.wait_for_batches(running, queued, first, second)
+        
+        self.assertEqual(self.results_of(first), [])
+        self.assertEqual(self.results_of(second), ["C"])
+        self.assertEqual(self.results_of(running), ["A"])
+        self.assertEqual(self.results_of(queued), ["B"])
+        self.assertEqual(self.finished, [first, second, running, queued])
+    
+    def test_invalid_codes_are_reported_and_the_rest_parsed(self):
+        """Test a code failing validation is reported without dropping the batch"""
+        errors = []
+        self.service.error_occurred.connect(lambda batch_id, error_type, message: errors.append((batch_id, error_type)))
+        batch = self.service.submit(["A", "￥淘宝abc￥", "B"])
+        invalid = self.service.submit(["￥淘宝abc￥"])
+        self.wait_for_batches(batch, invalid)
+        
+        self.assertEqual(self.results_of(batch), ["A", "B"])
+        self.assertEqual(sorted(self.provider.calls), ["A", "B"])
+        self.assertEqual(errors, [(batch, "invalid_input"), (invalid, "invalid_input")])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file